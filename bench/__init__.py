@@ -0,0 +1,17 @@
+"""
+Benchmarks for TLEup (run the modules with "python -m bench.<name>" from the
+repository root).
+
+    stages       per stage timings, throughput and peak memory on synthetic
+                 corpora of 1k to 1M TLEs
+    pipeline     full runs against the mock celestrak server
+    fetch        sequential vs. concurrent per ID downloads
+    propagate    SGP4 verification vectors, perigee/apogee heights of the
+                 vectors, batched vs. per object propagation
+    startup      import and command line start up times, lazily imported
+                 modules
+    service      query service answers against TleFilter selection, cached vs.
+                 uncached queries
+    consistency  fixed column vs. regex decoding, strict vs. tolerant and
+                 parallel vs. sequential parsing, write_tles vs. __bytes__
+"""
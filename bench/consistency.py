@@ -0,0 +1,88 @@
+"""
+Consistency of the fast paths with the plain ones on synthetic corpora: the
+fixed column line decoders against the tolerant patterns, strict against
+tolerant parsing, parallel against sequential parsing, write_tles (of tles
+and of a TleTable) against tle.__bytes__, parse/write round trips and the
+SATCAT entries of intact lines with and without malformed lines around.
+Exits with an error if any of them differ.
+"""
+
+import io
+import sys
+import argparse
+
+from bench import corpus
+import tle_up
+
+def fields(tles):
+    return [t.fields() for t in tles]
+
+def is_subsequence(a,b):
+    """Whether all items of a are in b in the same order"""
+    it=iter(b)
+    return all(x in it for x in a)
+
+def checks(good,bad,workers,satcat_good,satcat_bad):
+    """(name, whether it holds) of every check"""
+    res=[]
+    lines=[l.decode("ascii") for l in good.splitlines()]
+    res.append(("fixed vs regex line 1",all(tle_up._fixed_line1(l)==
+            tle_up._regex_line1(l) for l in lines if l[:2]=="1 ")))
+    res.append(("fixed vs regex line 2",all(tle_up._fixed_line2(l)==
+            tle_up._regex_line2(l) for l in lines if l[:2]=="2 ")))
+    tles=tle_up.parse_tle_bytes(good)
+    res.append(("strict vs tolerant",fields(tle_up.parse_tle_bytes(good,True))==
+            fields(tles)))
+    res.append(("strict in tolerant (malformed)",is_subsequence(
+            fields(tle_up.parse_tle_bytes(bad,True)),
+            fields(tle_up.parse_tle_bytes(bad)))))
+    min_size=tle_up._parallel_min_size
+    tle_up._parallel_min_size=0
+    try:
+        for strict in (False,True):
+            seq=fields(tle_up.parse_tle_bytes(bad,strict))
+            for n in workers:
+                res.append(("parallel %d%s" % (n," strict" if strict else ""),
+                        fields(tle_up.parse_tle_bytes(bad,strict,n))==seq))
+    finally:
+        tle_up._parallel_min_size=min_size
+    out=b"".join(bytes(t) for t in tles)
+    f=io.BytesIO()
+    tle_up.write_tles(tles,f)
+    res.append(("write_tles vs __bytes__",f.getvalue()==out))
+    f=io.BytesIO()
+    tle_up.write_tles(tle_up.TleTable.from_tles(tles),f)
+    res.append(("write_tles table vs __bytes__",f.getvalue()==out))
+    res.append(("round trip",out==good))
+    intact=set(satcat_good.splitlines(True))
+    res.append(("satcat malformed lines",is_subsequence(
+            tle_up.Satcat.from_lines([l for l in satcat_bad.splitlines(True)
+                if l in intact]).entries,
+            tle_up.Satcat.from_lines(satcat_bad.splitlines(True)).entries)))
+    return res
+
+if __name__=="__main__":
+    ap=argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--size",type=int,default=20000,
+            help="number of TLEs in the corpus")
+    ap.add_argument("--bad",type=float,default=0.05,
+            help="share of malformed TLE records and SATCAT lines of the "\
+            "second corpora")
+    ap.add_argument("--workers",type=str,default="2,3",
+            help="comma separated numbers of parse processes")
+    ns=ap.parse_args()
+    tle_up._quiet=True
+
+    objs=corpus.synthetic_objects(ns.size)
+    failed=[]
+    for name,ok in checks(corpus.tle_corpus(objs,0),
+            corpus.tle_corpus(objs,ns.bad),
+            [int(s) for s in ns.workers.split(",")],
+            corpus.satcat_corpus(objs,bad=0),
+            corpus.satcat_corpus(objs,bad=ns.bad)):
+        print("%-32s %s" % (name,"ok" if ok else "DIFFERS"))
+        if not ok:
+            failed.append(name)
+    if failed:
+        print("ERROR: "+", ".join(failed)+" differ!",file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,135 @@
+"""
+Deterministic synthetic TLE and SATCAT corpora of realistic shape.
+
+Objects are spread over LEO, MEO, GEO and HEO orbits with typical name
+families; corpora larger than the 5 digit NORAD ID range repeat objects
+with later epochs (like an element history). TLE text has valid checksums
+except for a share of malformed records, SATCAT lines use the fixed column
+layout of celestrak's satcat.txt.
+"""
+
+import random
+
+import tle_up
+
+_families=("STARLINK-%d","COSMOS %d DEB","ONEWEB-%04d","FENGYUN 1C DEB %d",
+        "IRIDIUM %d","NOAA %d","SL-16 R/B %d","OBJECT %d","GPS BIIR-%d",
+        "ISS DEB %d")
+
+# (share, mean motion range, eccentricity range, inclination range)
+_orbits=((0.75,(11.,16.4),(0.,0.02),(0.,110.)),
+        (0.10,(1.8,2.2),(0.,0.02),(50.,65.)),
+        (0.08,(0.99,1.01),(0.,0.001),(0.,15.)),
+        (0.07,(2.,8.),(0.5,0.75),(60.,65.)))
+
+def synthetic_objects(n,seed=0):
+    """n tle objects (NORAD IDs repeat with later epochs above 99999)"""
+    r=random.Random(seed)
+    shares=[o[0] for o in _orbits]
+    objs=[]
+    for i in range(n):
+        nid=i%99999+1
+        orbit=r.choices(_orbits,shares)[0]
+        t=tle_up.tle()
+        t.name=r.choice(_families) % (nid%5000)
+        t.id=nid
+        t.desig_year=r.randint(1957,2025)%100
+        t.desig_launch=r.randint(1,300)
+        t.desig_object=r.choice(("A","B","C","AB","ZZ","ABC"))
+        t.epoch_year=25
+        t.epoch_day=round(r.uniform(1.,300.)+i//99999,8)
+        t.fdmm=round(r.uniform(-1.e-3,1.e-3),8)
+        t.sdmm=r.choice((0.,0.,round(r.uniform(-1.e-4,1.e-4),9)))
+        t.bstar=r.choice((0.,round(r.uniform(-1.e-3,1.e-3),8)))
+        t.nr=r.randint(0,9999)
+        t.inc=round(r.uniform(*orbit[3]),4)
+        t.raan=round(r.uniform(0.,359.9999),4)
+        t.ecc=round(r.uniform(*orbit[2]),7)
+        t.aop=round(r.uniform(0.,359.9999),4)
+        t.ma=round(r.uniform(0.,359.9999),4)
+        t.mm=round(r.uniform(*orbit[1]),8)
+        t.revol=r.randint(0,99999)
+        objs.append(t)
+    return objs
+
+def tle_corpus(objs,bad=0.01,seed=0):
+    """TLE text of the objects, a share of bad records is malformed (garbage
+    or truncated lines, wrong checksums, stray whitespace and blank lines)"""
+    r=random.Random(seed)
+    out=[]
+    for t in objs:
+        b=bytes(t)
+        if r.random()<bad:
+            ls=b.split(b"\r\n")
+            k=r.randrange(5)
+            if k==0:
+                ls[r.choice((1,2))]=b"garbage line"
+            elif k==1:
+                ls[2]=ls[2][:40]
+            elif k==2:
+                ls[1]=ls[1][:-1]+(b"0" if ls[1][-1:]!=b"0" else b"1")
+            elif k==3:
+                ls[1]=ls[1].replace(b" ",b"  ",1)
+            else:
+                ls.insert(1,b"")
+            b=b"\r\n".join(ls)
+        out.append(b)
+    return b"".join(out)
+
+def satcat_line(t,decayed=False):
+    """SATCAT line (fixed columns) of a tle object"""
+    year=t.desig_year+(2000 if t.desig_year<57 else 1900)
+    peri,apo=tle_up.peri_apo_from_mm_ecc(t.mm,t.ecc)
+    l=bytearray(b" "*132)
+    for col,s in ((0,"%04d-%03d%s" % (year,t.desig_launch,t.desig_object)),
+            (13,"%05d" % t.id),(21,"D" if decayed else "+"),(23,t.name[:24]),
+            (49,"US"),(56,"%04d-01-01" % year),(68,"AFETR"),
+            (75,"2020-01-01" if decayed else ""),(87,"%7.1f" % (1440./t.mm)),
+            (96,"%5.1f" % t.inc),(103,"%6d" % round(apo)),
+            (111,"%6d" % round(peri)),(119,"%8.4f" % 1.),
+            (129,"EA0" if decayed else "")):
+        l[col:col+len(s)]=s.encode("ascii")
+    return bytes(l).rstrip()
+
+def satcat_corpus(objs,decayed=0.3,bad=0.01,seed=0):
+    """SATCAT text with one line per NORAD ID, a share of them decayed and a
+    share of bad lines malformed (truncated, bad numeric fields, garbage
+    lines and blank lines)"""
+    r=random.Random(seed)
+    seen=set()
+    out=[]
+    for t in objs:
+        if t.id in seen:
+            continue
+        seen.add(t.id)
+        l=satcat_line(t,r.random()<decayed)
+        if r.random()<bad:
+            k=r.randrange(5)
+            if k==0:
+                l=l[:r.randrange(len(l))]
+            elif k==1:
+                col,w=r.choice(((96,5),(103,6),(111,6)))
+                l=l[:col]+r.choice((b"12x.4",b"-?-",b"1.2.3",b"e+")).\
+                        rjust(w)+l[col+w:]
+            elif k==2:
+                l=l[:13]+b"1+2-3"+l[18:]
+            elif k==3:
+                l=b"garbage line"
+            else:
+                l=b""
+        out.append(l+b"\r\n")
+    return b"".join(out)
+
+def satcat_annex(objs,share=0.02,seed=0):
+    """SATCAT annex text with alternative names of a share of the objects"""
+    r=random.Random(seed)
+    ids=sorted(set(t.id for t in objs))
+    return b"".join(b"%d|ALT NAME %d|OTHER %d\n" % (i,i,i) for i in ids
+            if r.random()<share)
+
+def filter_lines(objs):
+    """A typical filter list: name families, ids, launches and ranges"""
+    lines=["STARLINK","NOAA 1","?IRIDIUM","~98067","~2019-0","%inc {97,99}",
+            "%apo {35700,35900}"]
+    lines.extend("$"+str(t.id) for t in objs[:len(objs):max(1,len(objs)//20)])
+    return lines
@@ -0,0 +1,43 @@
+"""
+Per ID TLE fetching: sequential urllib requests vs. the concurrent Fetcher,
+against the mock server with artificial latency.
+"""
+
+import sys
+import time
+import argparse
+import urllib.request as rq
+
+from bench.mock_server import MockCelestrak, synthetic_tle
+import tle_up
+
+if __name__=="__main__":
+    ap=argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--ids",type=int,default=100,help="number of IDs to fetch")
+    ap.add_argument("--latency",type=float,default=0.05,
+            help="artificial latency per request in seconds")
+    ap.add_argument("--workers",type=int,default=8)
+    ap.add_argument("--rate",type=float,default=0.)
+    ns=ap.parse_args()
+
+    ids=list(range(10000,10000+ns.ids))
+    with MockCelestrak([synthetic_tle(i) for i in ids],latency=ns.latency) as m:
+        urls=[m.url+"/cgi-bin/TLE.pl?CATNR="+str(i) for i in ids]
+        t=time.perf_counter()
+        seq=[]
+        for url in urls:
+            with rq.urlopen(url) as r:
+                seq.append(r.read())
+        tseq=time.perf_counter()-t
+
+        f=tle_up.Fetcher(ns.workers,ns.rate)
+        t=time.perf_counter()
+        con=f.get_all(urls)
+        tcon=time.perf_counter()-t
+        f.close()
+    if con!=seq:
+        print("ERROR: results differ!",file=sys.stderr)
+        sys.exit(1)
+    print("%d requests, %.0f ms latency" % (ns.ids,ns.latency*1000))
+    print("sequential urllib: %8.3f s" % tseq)
+    print("Fetcher (%d workers): %8.3f s (%.1fx)" % (ns.workers,tcon,tseq/tcon))
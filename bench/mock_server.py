@@ -0,0 +1,93 @@
+"""
+Local stand-in for the celestrak.com server with artificial latency.
+"""
+
+import threading
+import time
+import zlib
+import http.server
+import urllib.parse
+
+import tle_up
+
+def synthetic_tle(nid):
+    """Deterministic, well formed TLE for a NORAD ID"""
+    t=tle_up.tle()
+    t.name="OBJECT "+str(nid)
+    t.id=nid
+    t.desig_year=nid%60
+    t.desig_launch=nid%300+1
+    t.desig_object="ABC"[nid%3]
+    t.epoch_year=26
+    t.epoch_day=1.+(nid*7919)%36500/100.
+    t.fdmm=((nid*31)%2000-1000)*1.e-8
+    t.bstar=((nid*17)%20000-10000)*1.e-9
+    t.nr=nid%1000
+    t.inc=(nid*13)%18000/100.
+    t.raan=(nid*29)%36000/100.
+    t.ecc=(nid*37)%10000*1.e-7
+    t.aop=(nid*41)%36000/100.
+    t.ma=(nid*43)%36000/100.
+    t.mm=11.+(nid*47)%500/100.
+    t.revol=nid%100000
+    return t
+
+class MockCelestrak:
+    """Serves TLE.pl, bulk group files and the SATCAT for the given TLEs
+    (the files with an ETag, answering conditional requests with 304)"""
+
+    def __init__(self,tles,satcat=b"",satcat_annex=b"",groups=None,latency=0.):
+        self.tles={t.id:bytes(t) for t in tles}
+        self.files={"/pub/satcat.txt":satcat,
+                "/pub/satcat-annex.txt":satcat_annex}
+        for g, ids in (groups or {}).items():
+            self.files["/NORAD/elements/"+g+".txt"]=b"".join(self.tles[i]
+                    for i in ids)
+        self.latency=latency
+        self.requests=0
+        mock=self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version="HTTP/1.1"
+            disable_nagle_algorithm=True
+            def log_message(self,*args):
+                pass
+            def do_GET(self):
+                mock.requests+=1
+                time.sleep(mock.latency)
+                u=urllib.parse.urlsplit(self.path)
+                if u.path=="/cgi-bin/TLE.pl":
+                    nid=int(urllib.parse.parse_qs(u.query)["CATNR"][0])
+                    body=b"<html><body><pre>\n"+mock.tles.get(nid,
+                            b"No TLE found")+b"</pre></body></html>"
+                elif u.path in mock.files:
+                    body=mock.files[u.path]
+                    etag='"%x"' % zlib.crc32(body)
+                    if self.headers.get("If-None-Match")==etag:
+                        self.send_response(304)
+                        self.send_header("ETag",etag)
+                        self.send_header("Content-Length","0")
+                        self.end_headers()
+                        return
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                if u.path in mock.files:
+                    self.send_header("ETag",etag)
+                self.send_header("Content-Length",str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server=http.server.ThreadingHTTPServer(("127.0.0.1",0),Handler)
+        self.server.daemon_threads=True
+        self.url="http://127.0.0.1:"+str(self.server.server_address[1])
+        self.thread=threading.Thread(target=self.server.serve_forever,daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self,*exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,73 @@
+"""
+Full TLEup runs (as a subprocess, with the start up) against the mock
+celestrak server on a synthetic corpus: per ID downloads, bulk downloads,
+with a warm HTTP cache and incremental, so network bound changes can be
+compared reproducibly.
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from bench import corpus
+from bench.mock_server import MockCelestrak
+import tle_up
+
+# name, extra arguments, whether the cache and output of the previous run
+# are kept (the synthetic epochs are old, incremental treats them as recent)
+runs=(("per id",[],False),
+        ("bulk",["-b","active"],False),
+        ("bulk, warm cache",["-b","active"],True),
+        ("incremental",["-b","active","--incremental","--max-epoch-age","1e9"],
+                True))
+
+if __name__=="__main__":
+    ap=argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--size",type=int,default=10000,
+            help="number of objects in the corpus")
+    ap.add_argument("--latency",type=float,default=0.02,
+            help="artificial latency per request in seconds")
+    ap.add_argument("--max-connections",type=int,default=8)
+    ap.add_argument("--run",action="append",default=[],
+            help="only do this run (can be given multiple times)")
+    ns=ap.parse_args()
+
+    objs=corpus.synthetic_objects(ns.size)
+    satcat=corpus.satcat_corpus(objs)
+    ids=set(t.id for t in objs)
+    active=[int(l[13:18]) for l in satcat.splitlines() if l[21:22]!=b"D" and
+            l[13:18].isdigit() and int(l[13:18]) in ids]
+    script=os.path.join(os.path.dirname(os.path.abspath(tle_up.__file__)),
+            "tle_up.py")
+    with tempfile.TemporaryDirectory() as tmpdir, MockCelestrak(objs,satcat,
+            corpus.satcat_annex(objs),{"active":active},ns.latency) as m:
+        ffn=os.path.join(tmpdir,"filter.txt")
+        with open(ffn,"wt") as ff:
+            ff.write("\n".join(corpus.filter_lines(objs))+"\n")
+        out=os.path.join(tmpdir,"tles.txt")
+        cache=os.path.join(tmpdir,"cache")
+        print("%d objects, %.0f ms latency" % (ns.size,ns.latency*1000))
+        for name,args,keep in runs:
+            if ns.run and name not in ns.run:
+                continue
+            if not keep:
+                shutil.rmtree(cache,ignore_errors=True)
+                if os.path.exists(out):
+                    os.remove(out)
+            reqs=m.requests
+            t=time.perf_counter()
+            p=subprocess.run([sys.executable,script,"-q","-f",ffn,"-o",out,
+                    "--source-url",m.url,"--cache-dir",cache,"--rate","0",
+                    "--max-connections",str(ns.max_connections)]+args)
+            t=time.perf_counter()-t
+            if p.returncode!=0:
+                print("ERROR: run \""+name+"\" failed!",file=sys.stderr)
+                sys.exit(1)
+            with open(out,"rb") as of:
+                cnt=of.read().count(b"\n")//3
+            print("%-18s %8.3f s %6d requests %7d TLEs" % (name,t,
+                    m.requests-reqs,cnt))
@@ -0,0 +1,166 @@
+"""
+SGP4 propagation: checks tle_sgp4 against published verification vectors
+(Vallado et al., "Revisiting Spacetrack Report #3", a subset is included,
+--vectors reads SGP4-VER.TLE and tcppver.out of the full set), the perigee
+and apogee heights of tle_up.orbit_parameters against the heights of the
+osculating orbits of the vectors and times the batched propagation of N
+objects at T times against one object at a time.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+from bench import corpus
+import tle_up
+import tle_sgp4
+
+# name, tle lines, (minutes since epoch, x, y, z, vx, vy, vz)
+vectors=(("near earth, high eccentricity",
+        "1 00005U 58002B   00179.78495062  .00000023  00000-0  28098-4 0  4753",
+        "2 00005  34.2682 348.7242 1859667 331.7664  19.3264 10.82419157413667",
+        ((0.,7022.46529266,-1400.08296755,0.03995155,1.893841015,6.405893759,
+                4.534807250),
+        (4320.,-9060.47373569,4658.70952502,813.68673153,-2.232832783,
+                -4.110453490,-3.157345433))),
+        ("near earth, drag",
+        "1 06251U 62025E   06176.82412014  .00008885  00000-0  12808-3 0  3985",
+        "2 06251  58.0579  54.0425 0030035 139.1568 221.1854 15.56387291  6774",
+        ((0.,3988.31022699,5498.96657235,0.90055879,-3.290032738,2.357652820,
+                6.496623475),
+        (2880.,1159.27802897,5056.60175495,4353.49418579,-5.968060341,
+                -2.314790406,4.230722669))),
+        ("12 h resonance",
+        "1 08195U 75081A   06176.33215444  .00000099  00000-0  11873-3 0   813",
+        "2 08195  64.1586 279.0717 6877146 264.7651  20.2257  2.00491383225656",
+        ((0.,2349.89483350,-14785.93811562,0.02119378,2.721488096,-3.256811655,
+                4.498416672),
+        (2880.,3417.20931586,-16038.79510665,1894.74934058,2.585515864,
+                -2.596818146,4.456882556))),
+        ("synchronous, Lyddane",
+        "1 14128U 83058A   06176.02844893 -.00000158  00000-0  10000-3 0  9627",
+        "2 14128  11.4384  35.2134 0011562  26.4582 333.5652  0.98870114 46093",
+        ((0.,34747.57932696,24502.37114079,-1.32832986,-1.731642662,
+                2.452772615,0.608510081),
+        (2880.,37802.25393045,19433.57330019,-1198.66634226,-1.359930580,
+                2.677830903,0.602507466))),
+        ("near earth, polar",
+        "1 28057U 03049A   06177.78615833  .00000060  00000-0  35940-4 0  1836",
+        "2 28057  98.4283 247.6961 0000884  88.1964 271.9322 14.35478080140550",
+        ((0.,-2715.28237486,-6619.26436889,-0.01341443,-1.008587273,
+                0.422782003,7.385272942),
+        (1440.,688.16056594,4124.87618964,5794.55994449,2.810973665,
+                5.479585563,-4.224866316))))
+
+def read_vectors(dirname):
+    """vectors (named by catalog number) from SGP4-VER.TLE and tcppver.out
+    in a directory (objects tle_up does not parse are skipped)"""
+    lines={}
+    with open(os.path.join(dirname,"SGP4-VER.TLE")) as f:
+        for l in f:
+            if l[:2] in ("1 ","2 "):
+                lines.setdefault(int(l[2:7]),[]).append(l[:69])
+    res={}
+    with open(os.path.join(dirname,"tcppver.out")) as f:
+        for l in f:
+            p=l.split()
+            if len(p)==2 and p[1]=="xx":
+                cur=res.setdefault(int(p[0]),[])
+            elif len(p)>=7:
+                cur.append(tuple(float(x) for x in p[:7]))
+    return [(str(nid),)+tuple(lines[nid][:2])+(tuple(res[nid]),)
+            for nid in res if nid in lines]
+
+def check(vectors):
+    """Largest position (km) and velocity (km/s) error over the vectors"""
+    dr,dv=0.,0.
+    for name,l1,l2,ref in vectors:
+        try:
+            tles=tle_up.parse_tle_bytes(("X\n"+l1+"\n"+l2+"\n").encode(),True)
+        except ValueError:
+            continue
+        if len(tles)!=1:
+            continue
+        ref=np.array(ref)
+        err,r,v=tle_sgp4.Sgp4Batch(tles).propagate(ref[None,:,0])
+        ok=err[0]==0
+        dr=max(dr,np.abs(r[0][ok]-ref[ok,1:4]).max(initial=0.))
+        dv=max(dv,np.abs(v[0][ok]-ref[ok,4:7]).max(initial=0.))
+    return dr,dv
+
+def check_heights(vectors):
+    """Largest difference of the perigee and apogee heights (and period) of
+    orbit_parameters from the ones of the osculating orbits of the vectors,
+    relative to the semi-major axis (period); the mean elements differ from
+    the osculating ones by the short periodic terms (J2 ~ 0.1 %)"""
+    dh,dp=0.,0.
+    for name,l1,l2,ref in vectors:
+        try:
+            tles=tle_up.parse_tle_bytes(("X\n"+l1+"\n"+l2+"\n").encode(),True)
+        except ValueError:
+            continue
+        if len(tles)!=1:
+            continue
+        a,peri,apo,period=(float(x) for x in tle_up.orbit_parameters(
+                tles[0].mm,tles[0].ecc))
+        heights=((peri,apo),tle_up.peri_apo_from_mm_ecc(tles[0].mm,tles[0].ecc))
+        for st in ref:
+            r=np.array(st[1:4])
+            v=np.array(st[4:7])
+            rn=np.linalg.norm(r)
+            osc_a=1./(2./rn-v@v/tle_sgp4._mu)
+            e=np.linalg.norm(((v@v-tle_sgp4._mu/rn)*r-(r@v)*v)/tle_sgp4._mu)
+            for peri,apo in heights:
+                dh=max(dh,abs(osc_a*(1-e)-tle_sgp4._radius-peri)/a,
+                        abs(osc_a*(1+e)-tle_sgp4._radius-apo)/a)
+            dp=max(dp,abs(2*np.pi*np.sqrt(osc_a**3/tle_sgp4._mu)/60.-period)/
+                    period)
+    return dh,dp
+
+if __name__=="__main__":
+    ap=argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--objects",type=int,default=2000)
+    ap.add_argument("--times",type=int,default=1440,
+            help="number of times (one per minute)")
+    ap.add_argument("--loop",type=int,default=200,
+            help="objects propagated one at a time for the comparison")
+    ap.add_argument("--vectors",type=str,
+            help="directory with SGP4-VER.TLE and tcppver.out")
+    ns=ap.parse_args()
+    tle_up._quiet=True
+
+    vecs=read_vectors(ns.vectors) if ns.vectors else vectors
+    dr,dv=check(vecs)
+    print("vectors: max error %.1e km %.1e km/s" % (dr,dv))
+    if dr>1e-5 or dv>1e-8:
+        print("ERROR: propagation differs from the vectors!",file=sys.stderr)
+        sys.exit(1)
+    dh,dp=check_heights(vecs)
+    print("heights: max difference %.2f %% of a, period %.2f %%" % (dh*100,
+            dp*100))
+    if dh>3e-3 or dp>3e-3:
+        print("ERROR: perigee/apogee heights differ from the vectors!",
+                file=sys.stderr)
+        sys.exit(1)
+
+    tles=corpus.synthetic_objects(ns.objects)
+    ts=np.broadcast_to(np.arange(ns.times,dtype=float),(len(tles),ns.times))
+    t=time.perf_counter()
+    batch=tle_sgp4.Sgp4Batch(tles)
+    tinit=time.perf_counter()-t
+    t=time.perf_counter()
+    batch.propagate(ts)
+    tbatch=time.perf_counter()-t
+    t=time.perf_counter()
+    for tle in tles[:ns.loop]:
+        tle_sgp4.Sgp4Batch([tle]).propagate(ts[:1])
+    tloop=(time.perf_counter()-t)*len(tles)/min(len(tles),ns.loop)
+    n=len(tles)*ns.times
+    print("%d objects x %d times" % (len(tles),ns.times))
+    print("init        %9.4f s" % tinit)
+    print("batched     %9.4f s %12.0f /s" % (tbatch,n/tbatch))
+    print("per object  %9.4f s %12.0f /s (estimated from %d objects)" % (tloop,
+            n/tloop,min(len(tles),ns.loop)))
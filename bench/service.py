@@ -0,0 +1,106 @@
+"""
+Query service: starts TleService on an ephemeral localhost port, checks the
+answers (TLE text and JSON) to filter queries against TleFilter.select_tles
+(and Satcat selection with a published SATCAT), that invalid filters are
+answered with 400 and their messages (nothing printed) and that altitude
+queries are not cached, then times uncached and cached queries.
+"""
+
+import io
+import sys
+import json
+import time
+import argparse
+import contextlib
+import urllib.error
+import urllib.parse
+import urllib.request as rq
+
+from bench import corpus
+import tle_up
+
+def get(url,lines,fmt="txt"):
+    """(status, content type, body) of a query"""
+    q=urllib.parse.urlencode([("q",l) for l in lines]+[("format",fmt)])
+    try:
+        with rq.urlopen(url+"/tles?"+q) as r:
+            return r.status,r.headers["Content-Type"],r.read()
+    except urllib.error.HTTPError as he:
+        return he.code,he.headers["Content-Type"],he.read()
+
+def expected(tles,satcat,lines):
+    """The tles a query should answer with (all without filter lines)"""
+    if not lines:
+        return list(tles)
+    flt=tle_up.TleFilter.parse(lines)
+    ids=set(t.id for t in flt.select_tles(tles))
+    if satcat is not None:
+        ids.update(e["nid"] for e in flt.select(satcat,altitudes=False))
+    return [t for t in tles if t.id in ids]
+
+def checks(service,tles,satcat,queries):
+    """(name, whether it holds) of every check"""
+    res=[]
+    for sc in (None,satcat):
+        service.publish(tles,sc)
+        for lines in queries:
+            exp=expected(tles,sc,lines)
+            bf=io.BytesIO()
+            tle_up.write_tles(exp,bf)
+            name="%s%s" % (" ".join(lines)[:24] or "all",
+                    " (satcat)" if sc else "")
+            status,_,body=get(service.url,lines)
+            res.append(("txt "+name,status==200 and body==bf.getvalue()))
+            status,_,body=get(service.url,lines,"json")
+            res.append(("json "+name,status==200 and json.loads(body)==
+                    [tle_up.tle_dict(t) for t in exp]))
+    err=io.StringIO()
+    with contextlib.redirect_stderr(err):
+        status,ctype,body=get(service.url,["STARLINK","$12x","%inc {1,"])
+    res.append(("invalid filters",status==400 and ctype.startswith(
+            "text/plain") and b"12x" in body and b"%inc {1," in body and
+            err.getvalue()==""))
+    lines=["%alt {400,600}"]
+    status,_,_=get(service.url,lines)
+    res.append(("altitude not cached",status==200 and
+            (tuple(lines),"txt") not in service._cache))
+    return res
+
+if __name__=="__main__":
+    ap=argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--size",type=int,default=20000,
+            help="number of TLEs published")
+    ap.add_argument("--repeat",type=int,default=20,
+            help="cached queries timed")
+    ns=ap.parse_args()
+    tle_up._quiet=True
+
+    tles=corpus.synthetic_objects(ns.size)
+    satcat=tle_up.load_satcat(corpus.satcat_corpus(tles),
+            corpus.satcat_annex(tles))
+    flines=corpus.filter_lines(tles)
+    queries=[[],flines[:1],flines[:5],flines[5:],["$"+str(tles[7].id)],
+            ["NO SUCH OBJECT"]]
+    service=tle_up.TleService("127.0.0.1",0)
+    service.start()
+    try:
+        failed=[]
+        for name,ok in checks(service,tles,satcat,queries):
+            print("%-40s %s" % (name,"ok" if ok else "DIFFERS"))
+            if not ok:
+                failed.append(name)
+        service.publish(tles,satcat)
+        t=time.perf_counter()
+        get(service.url,flines)
+        tfirst=time.perf_counter()-t
+        t=time.perf_counter()
+        for _ in range(ns.repeat):
+            get(service.url,flines)
+        tcached=(time.perf_counter()-t)/ns.repeat
+    finally:
+        service.close()
+    if failed:
+        print("ERROR: "+", ".join(failed)+" differ!",file=sys.stderr)
+        sys.exit(1)
+    print("%d tles, %d filters: uncached %.1f ms, cached %.1f ms" % (len(tles),
+            len(flines),tfirst*1000,tcached*1000))
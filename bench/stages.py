@@ -0,0 +1,128 @@
+"""
+Per stage timings of TLEup on synthetic corpora: TLE parsing and writing,
+OMM CSV parsing (streamed and into a table) and writing,
+filter matching, SATCAT loading (text, snapshot and filtered while
+reading) and filtering, TLE archive inserts (of archived TLEs) and lookups.
+Reports the best time of some repetitions, the throughput and the peak
+memory allocated by each stage (measured in an extra run with tracemalloc).
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+from bench import corpus
+import tle_up
+
+def stages(objs,text,satcat,annex,lines,tmpdir):
+    """(name, function, bytes, items) of every stage"""
+    tles=tle_up.parse_tle_bytes(text)
+    flt=tle_up.TleFilter.parse(lines)
+    sc=tle_up.load_satcat(satcat,annex)
+    snap=os.path.join(tmpdir,"satcat.snapshot")
+    if os.path.exists(snap):
+        os.remove(snap)
+    tle_up.load_satcat(satcat,annex,snap)
+    arch=os.path.join(tmpdir,"tles.archive")
+    for fn in (arch,arch+".idx"):
+        if os.path.exists(fn):
+            os.remove(fn)
+    archive=tle_up.TleArchive(arch)
+    archive.add(tles)
+    mid=sorted(t.epoch_timestamp() for t in tles)[len(tles)//2]
+    out=sum(len(bytes(t)) for t in objs[:1000])*len(objs)//min(len(objs),1000)
+    omm=io.BytesIO()
+    tle_up.write_omm(tles,omm,"csv")
+    omm=omm.getvalue()
+    return [("parse",lambda:tle_up.parse_tle_bytes(text),len(text),len(objs)),
+            ("parse strict",lambda:tle_up.parse_tle_bytes(text,True),len(text),
+                    len(objs)),
+            ("parse omm csv",lambda:list(tle_up.iter_omm_csv(omm)),len(omm),
+                    len(tles)),
+            ("omm csv table",lambda:tle_up.TleTable.from_omm(omm),len(omm),
+                    len(tles)),
+            ("tle.__bytes__",lambda:b"".join(bytes(t) for t in tles),out,
+                    len(tles)),
+            ("write_tles",lambda:tle_up.write_tles(tles,io.BytesIO()),out,
+                    len(tles)),
+            ("write_omm csv",lambda:tle_up.write_omm(tles,io.BytesIO()),len(omm),
+                    len(tles)),
+            ("filter tles",lambda:flt.select_tles(tles),0,len(tles)),
+            ("satcat parse",lambda:tle_up.load_satcat(satcat,annex),
+                    len(satcat),satcat.count(b"\n")),
+            ("satcat snapshot",lambda:tle_up.load_satcat(satcat,annex,snap),
+                    len(satcat),satcat.count(b"\n")),
+            ("satcat filtered",lambda:tle_up.load_satcat(satcat,annex,flt=flt),
+                    len(satcat),satcat.count(b"\n")),
+            ("filter satcat",lambda:flt.select(sc),0,len(sc)),
+            ("archive add",lambda:archive.add(tles),0,len(tles)),
+            ("archive nearest",lambda:[archive.nearest(t.id,mid) for t in tles],
+                    0,len(tles)),
+            ("archive as_of",lambda:archive.as_of(mid),0,len(archive))]
+
+def measure(func,repeat,memory=True):
+    """(best time in s, peak allocated bytes or None) of a function (after
+    a warm-up call)"""
+    func()
+    best=None
+    for _ in range(repeat):
+        t=time.perf_counter()
+        func()
+        t=time.perf_counter()-t
+        best=t if best is None else min(best,t)
+    peak=None
+    if memory:
+        tracemalloc.start()
+        func()
+        peak=tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return best,peak
+
+if __name__=="__main__":
+    ap=argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--sizes",type=str,default="1000,10000,100000",
+            help="comma separated corpus sizes (number of TLEs, default is "\
+                    "1000,10000,100000; add 1000000 for the large corpus)")
+    ap.add_argument("--repeat",type=int,default=3,
+            help="repetitions per stage (the best time is reported)")
+    ap.add_argument("--bad",type=float,default=0.01,
+            help="share of malformed TLE records and SATCAT lines")
+    ap.add_argument("--stage",action="append",default=[],
+            help="only run this stage (can be given multiple times)")
+    ap.add_argument("--no-memory",action="store_true",
+            help="do not measure the peak memory (saves a run per stage)")
+    ap.add_argument("--json",action="store_true",help="print JSON records")
+    ns=ap.parse_args()
+    tle_up._quiet=True
+
+    results=[]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n in (int(s) for s in ns.sizes.split(",")):
+            objs=corpus.synthetic_objects(n)
+            text=corpus.tle_corpus(objs,ns.bad)
+            satcat=corpus.satcat_corpus(objs,bad=ns.bad)
+            annex=corpus.satcat_annex(objs)
+            for name,func,nbytes,items in stages(objs,text,satcat,annex,
+                    corpus.filter_lines(objs),tmpdir):
+                if ns.stage and name not in ns.stage:
+                    continue
+                t,peak=measure(func,ns.repeat,not ns.no_memory)
+                results.append({"size":n, "stage":name, "seconds":t,
+                        "items_per_s":items/t, "mb_per_s":nbytes/t/2**20,
+                        "peak_mib":peak/2**20 if peak is not None else None})
+                if not ns.json:
+                    r=results[-1]
+                    print("%8d %-16s %9.4f s %12.0f /s %8.1f MiB/s %9s" % (n,
+                            name,t,r["items_per_s"],r["mb_per_s"],
+                            "%.1f MiB" % r["peak_mib"] if peak is not None \
+                            else "-"))
+                    sys.stdout.flush()
+            del objs,text,satcat,annex
+    if ns.json:
+        json.dump(results,sys.stdout,indent=1)
+        print()
@@ -0,0 +1,76 @@
+"""
+Start up: the time to import tle_up, to start the command line (as script,
+which is compiled every time, and with -m, which uses the cached bytecode)
+and of a small offline run (as subprocesses, best of some repetitions, with
+the bare interpreter start for comparison), the modules loaded by the import
+that are imported lazily (they should not be) and optionally the slowest
+imports (-X importtime).
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+from bench import corpus
+import tle_up
+
+# modules only needed by some code paths
+lazy=("numpy","json","hashlib","calendar","html.parser","http.client","csv",
+        "argparse","tle_sgp4")
+
+def best(cmd,repeat,cwd):
+    """Best wall time in s of a command"""
+    res=None
+    for _ in range(repeat):
+        t=time.perf_counter()
+        subprocess.run(cmd,cwd=cwd,check=True,stdout=subprocess.DEVNULL)
+        t=time.perf_counter()-t
+        res=t if res is None else min(res,t)
+    return res
+
+def import_times(root):
+    """(cumulative us, module) of the imports of tle_up, slowest first"""
+    p=subprocess.run([sys.executable,"-X","importtime","-c","import tle_up"],
+            cwd=root,check=True,stderr=subprocess.PIPE,universal_newlines=True)
+    res=[]
+    for l in p.stderr.splitlines():
+        f=l.split("|")
+        if len(f)==3 and f[1].strip().isdigit():
+            res.append((int(f[1]),f[2].strip()))
+    return sorted(res,reverse=True)
+
+if __name__=="__main__":
+    ap=argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--repeat",type=int,default=10,
+            help="repetitions (the best time is reported)")
+    ap.add_argument("--size",type=int,default=100,
+            help="number of user TLEs of the offline run")
+    ap.add_argument("--importtime",type=int,default=0,metavar="N",
+            help="show the N slowest imports")
+    ns=ap.parse_args()
+
+    root=os.path.dirname(os.path.abspath(tle_up.__file__))
+    py=sys.executable
+    with tempfile.TemporaryDirectory() as tmpdir:
+        ufn=os.path.join(tmpdir,"user.txt")
+        with open(ufn,"wb") as uf:
+            uf.write(corpus.tle_corpus(corpus.synthetic_objects(ns.size),0))
+        for name,cmd in (("interpreter",[py,"-c","pass"]),
+                ("import tle_up",[py,"-c","import tle_up"]),
+                ("tle_up.py --help",[py,"tle_up.py","--help"]),
+                ("-m tle_up --help",[py,"-m","tle_up","--help"]),
+                ("offline run",[py,"-m","tle_up","--no-online","-q","-u",ufn,
+                        "-o",os.path.join(tmpdir,"tles.txt")])):
+            print("%-18s %8.1f ms" % (name,best(cmd,ns.repeat,root)*1000))
+    p=subprocess.run([py,"-c","import sys,tle_up\nprint(' '.join(m for m in "\
+            "sys.argv[1:] if m in sys.modules))"]+list(lazy),cwd=root,
+            check=True,stdout=subprocess.PIPE,universal_newlines=True)
+    loaded=p.stdout.split()
+    print("lazy modules loaded by the import: "+(" ".join(loaded) or "none"))
+    for us,m in import_times(root)[:ns.importtime]:
+        print("%8.1f ms %s" % (us/1000,m))
+    if loaded:
+        sys.exit(1)
@@ -0,0 +1,737 @@
+"""
+Vectorised SGP4 propagation of many tles at once (needs NumPy)
+
+A port of the revised SGP4 of Vallado et al. ("Revisiting Spacetrack Report
+#3", AIAA 2006-6753) with the WGS-72 constants in the improved operation
+mode, including the deep space (SDP4) lunar-solar terms and resonances for
+periods of 225 min and more. All satellites and times are computed as array
+operations, in blocks of a limited number of elements; positions and
+velocities are in the TEME frame (km and km/s).
+
+Error codes (per satellite and time, positions and velocities are nan for
+1 to 4): 1 mean eccentricity out of range, 2 mean motion not positive,
+3 perturbed eccentricity out of range, 4 semi-latus rectum negative,
+6 the satellite has decayed.
+"""
+
+import numpy as np
+from math import pi, sqrt
+from types import SimpleNamespace
+
+# WGS-72 constants (the ones the element sets are fitted with)
+_radius=6378.135 # km
+_mu=398600.8 # km^3/s^2
+_xke=60./sqrt(_radius*_radius*_radius/_mu)
+_j2=0.001082616
+_j3=-0.00000253881
+_j4=-0.00000165597
+_j3oj2=_j3/_j2
+_vkmpersec=_radius*_xke/60.
+_twopi=2.*pi
+_x2o3=2./3.
+_rptim=4.37526908801129966e-3 # earth rotation (rad/min)
+
+_block_size=1<<16 # elements (satellites x times) computed at once
+
+def gstime(jd):
+    """Greenwich sidereal time (rad) of Julian dates (UT1)"""
+    tut1=(jd-2451545.)/36525.
+    temp=-6.2e-6*tut1*tut1*tut1+0.093104*tut1*tut1+\
+            (876600.*3600+8640184.812866)*tut1+67310.54841
+    temp=np.fmod(temp*(pi/180.)/240.,_twopi)
+    return np.where(temp<0.,temp+_twopi,temp)
+
+def _init(no_kozai,ecco,inclo,nodeo,argpo,mo,bstar,epoch):
+    """SGP4 constants of arrays of elements (rad, rad/min, epoch in days
+    since 1949-12-31 0h); the terms of the full drag model are zero for
+    the objects using the simplified one"""
+    # un-kozai the mean motion
+    eccsq=ecco*ecco
+    omeosq=1.-eccsq
+    rteosq=np.sqrt(omeosq)
+    cosio=np.cos(inclo)
+    cosio2=cosio*cosio
+    ak=np.power(_xke/no_kozai,_x2o3)
+    d1=0.75*_j2*(3.*cosio2-1.)/(rteosq*omeosq)
+    del_=d1/(ak*ak)
+    adel=ak*(1.-del_*del_-del_*(1./3.+134.*del_*del_/81.))
+    del_=d1/(adel*adel)
+    no=no_kozai/(1.+del_)
+    ao=np.power(_xke/no,_x2o3)
+    sinio=np.sin(inclo)
+    po=ao*omeosq
+    con42=1.-5.*cosio2
+    con41=-con42-cosio2-cosio2
+    posq=po*po
+    rp=ao*(1.-ecco)
+    gsto=gstime(epoch+2433281.5)
+
+    # for perigees below 156 km s and qoms2t are altered
+    ss=78./_radius+1.
+    qzms2t=(120.-78.)/_radius
+    qzms2t=qzms2t*qzms2t*qzms2t*qzms2t
+    perige=(rp-1.)*_radius
+    sfour=np.where(perige<98.,20.,perige-78.)
+    qzms24=(120.-sfour)/_radius
+    qzms24=np.where(perige<156.,qzms24*qzms24*qzms24*qzms24,qzms2t)
+    sfour=np.where(perige<156.,sfour/_radius+1.,ss)
+    pinvsq=1./posq
+    tsi=1./(ao-sfour)
+    eta=ao*ecco*tsi
+    etasq=eta*eta
+    eeta=ecco*eta
+    psisq=np.abs(1.-etasq)
+    coef=qzms24*np.power(tsi,4.)
+    coef1=coef/np.power(psisq,3.5)
+    cc2=coef1*no*(ao*(1.+1.5*etasq+eeta*(4.+etasq))+0.375*_j2*tsi/psisq*\
+            con41*(8.+3.*etasq*(8.+etasq)))
+    cc1=bstar*cc2
+    cc3=np.where(ecco>1.e-4,-2.*coef*tsi*_j3oj2*no*sinio/ecco,0.)
+    x1mth2=1.-cosio2
+    cc4=2.*no*coef1*ao*omeosq*(eta*(2.+0.5*etasq)+ecco*(0.5+2.*etasq)-\
+            _j2*tsi/(ao*psisq)*(-3.*con41*(1.-2.*eeta+etasq*(1.5-0.5*eeta))+\
+            0.75*x1mth2*(2.*etasq-eeta*(1.+etasq))*np.cos(2.*argpo)))
+    cc5=2.*coef1*ao*omeosq*(1.+2.75*(etasq+eeta)+eeta*etasq)
+    cosio4=cosio2*cosio2
+    temp1=1.5*_j2*pinvsq*no
+    temp2=0.5*temp1*_j2*pinvsq
+    temp3=-0.46875*_j4*pinvsq*pinvsq*no
+    mdot=no+0.5*temp1*rteosq*con41+0.0625*temp2*rteosq*\
+            (13.-78.*cosio2+137.*cosio4)
+    argpdot=-0.5*temp1*con42+0.0625*temp2*(7.-114.*cosio2+395.*cosio4)+\
+            temp3*(3.-36.*cosio2+49.*cosio4)
+    xhdot1=-temp1*cosio
+    nodedot=xhdot1+(0.5*temp2*(4.-19.*cosio2)+2.*temp3*(3.-7.*cosio2))*cosio
+    omgcof=bstar*cc3*np.cos(argpo)
+    xmcof=np.where(ecco>1.e-4,-_x2o3*coef*bstar/eeta,0.)
+    delmo=1.+eta*np.cos(mo)
+    cc1sq=cc1*cc1
+    d2=4.*ao*tsi*cc1sq
+    temp=d2*tsi*cc1/3.
+    d3=(17.*ao+sfour)*temp
+    d4=0.5*temp*ao*tsi*(221.*ao+31.*sfour)*cc1
+    c=dict(no=no,ecco=ecco,inclo=inclo,nodeo=nodeo,argpo=argpo,mo=mo,
+            bstar=bstar,epoch=epoch,gsto=gsto,con41=con41,x1mth2=x1mth2,
+            x7thm1=7.*cosio2-1.,cc1=cc1,cc4=cc4,cc5=cc5,eta=eta,mdot=mdot,
+            argpdot=argpdot,nodedot=nodedot,omgcof=omgcof,xmcof=xmcof,
+            nodecf=3.5*omeosq*xhdot1*cc1,t2cof=1.5*cc1,
+            xlcof=-0.25*_j3oj2*sinio*(3.+5.*cosio)/np.where(
+                np.abs(cosio+1.)>1.5e-12,1.+cosio,1.5e-12),
+            aycof=-0.5*_j3oj2*sinio,delmo=delmo*delmo*delmo,sinmao=np.sin(mo),
+            d2=d2,d3=d3,d4=d4,t3cof=d2+2.*cc1sq,
+            t4cof=0.25*(3.*d3+cc1*(12.*d2+10.*cc1sq)),
+            t5cof=0.2*(3.*d4+12.*cc1*d3+6.*d2*d2+15.*cc1sq*(2.*d2+cc1sq)))
+    deep=_twopi/no>=225.
+    simple=(rp<220./_radius+1.)|deep
+    for k in ("omgcof","xmcof","cc5","d2","d3","d4","t3cof","t4cof","t5cof"):
+        c[k]=np.where(simple,0.,c[k])
+    return c,deep,xhdot1,eccsq
+
+def _dscom_terms(zcosg,zsing,zcosi,zsini,zcosh,zsinh,cc,cosim,sinim,cosomm,
+        sinomm,em,emsq,betasq,rtemsq,xnoi):
+    """The solar or lunar terms of dscom"""
+    a1=zcosg*zcosh+zsing*zcosi*zsinh
+    a3=-zsing*zcosh+zcosg*zcosi*zsinh
+    a7=-zcosg*zsinh+zsing*zcosi*zcosh
+    a8=zsing*zsini
+    a9=zsing*zsinh+zcosg*zcosi*zcosh
+    a10=zcosg*zsini
+    a2=cosim*a7+sinim*a8
+    a4=cosim*a9+sinim*a10
+    a5=-sinim*a7+cosim*a8
+    a6=-sinim*a9+cosim*a10
+    x1=a1*cosomm+a2*sinomm
+    x2=a3*cosomm+a4*sinomm
+    x3=-a1*sinomm+a2*cosomm
+    x4=-a3*sinomm+a4*cosomm
+    x5=a5*sinomm
+    x6=a6*sinomm
+    x7=a5*cosomm
+    x8=a6*cosomm
+    t=SimpleNamespace()
+    t.z31=12.*x1*x1-3.*x3*x3
+    t.z32=24.*x1*x2-6.*x3*x4
+    t.z33=12.*x2*x2-3.*x4*x4
+    z1=3.*(a1*a1+a2*a2)+t.z31*emsq
+    z2=6.*(a1*a3+a2*a4)+t.z32*emsq
+    z3=3.*(a3*a3+a4*a4)+t.z33*emsq
+    t.z11=-6.*a1*a5+emsq*(-24.*x1*x7-6.*x3*x5)
+    t.z12=-6.*(a1*a6+a3*a5)+emsq*(-24.*(x2*x7+x1*x8)-6.*(x3*x6+x4*x5))
+    t.z13=-6.*a3*a6+emsq*(-24.*x2*x8-6.*x4*x6)
+    t.z21=6.*a2*a5+emsq*(24.*x1*x5-6.*x3*x7)
+    t.z22=6.*(a4*a5+a2*a6)+emsq*(24.*(x2*x5+x1*x6)-6.*(x4*x7+x3*x8))
+    t.z23=6.*a4*a6+emsq*(24.*x2*x6-6.*x4*x8)
+    t.z1=z1+z1+betasq*t.z31
+    t.z2=z2+z2+betasq*t.z32
+    t.z3=z3+z3+betasq*t.z33
+    t.s3=cc*xnoi
+    t.s2=-0.5*t.s3/rtemsq
+    t.s4=t.s3*rtemsq
+    t.s1=-15.*em*t.s4
+    t.s5=x1*x3+x2*x4
+    t.s6=x2*x3+x1*x4
+    t.s7=x2*x4-x1*x3
+    return t
+
+def _dscom(epoch,ecco,argpo,inclo,nodeo,no):
+    """Deep space common terms at the epoch: (solar terms, lunar terms) and
+    the periodics coefficients (dict)"""
+    zes=0.01675
+    zel=0.05490
+    snodm=np.sin(nodeo)
+    cnodm=np.cos(nodeo)
+    emsq=ecco*ecco
+    betasq=1.-emsq
+    rtemsq=np.sqrt(betasq)
+    day=epoch+18261.5
+    xnodce=np.fmod(4.5236020-9.2422029e-4*day,_twopi)
+    stem=np.sin(xnodce)
+    ctem=np.cos(xnodce)
+    zcosil=0.91375164-0.03568096*ctem
+    zsinil=np.sqrt(1.-zcosil*zcosil)
+    zsinhl=0.089683511*stem/zsinil
+    zcoshl=np.sqrt(1.-zsinhl*zsinhl)
+    gam=5.8351514+0.0019443680*day
+    zx=np.arctan2(0.39785416*stem/zsinil,zcoshl*ctem+0.91744867*zsinhl*stem)
+    zx=gam+zx-xnodce
+    common=(np.cos(inclo),np.sin(inclo),np.cos(argpo),np.sin(argpo),ecco,
+            emsq,betasq,rtemsq,1./no)
+    s=_dscom_terms(0.1945905,-0.98088458,0.91744867,0.39785416,cnodm,snodm,
+            2.9864797e-6,*common)
+    l=_dscom_terms(np.cos(zx),np.sin(zx),zcosil,zsinil,
+            zcoshl*cnodm+zsinhl*snodm,snodm*zcoshl-cnodm*zsinhl,4.7968065e-7,
+            *common)
+    p=dict(zmol=np.fmod(4.7199672+0.22997150*day-gam,_twopi),
+            zmos=np.fmod(6.2565837+0.017201977*day,_twopi),
+            se2=2.*s.s1*s.s6,se3=2.*s.s1*s.s7,
+            si2=2.*s.s2*s.z12,si3=2.*s.s2*(s.z13-s.z11),
+            sl2=-2.*s.s3*s.z2,sl3=-2.*s.s3*(s.z3-s.z1),
+            sl4=-2.*s.s3*(-21.-9.*emsq)*zes,
+            sgh2=2.*s.s4*s.z32,sgh3=2.*s.s4*(s.z33-s.z31),sgh4=-18.*s.s4*zes,
+            sh2=-2.*s.s2*s.z22,sh3=-2.*s.s2*(s.z23-s.z21),
+            ee2=2.*l.s1*l.s6,e3=2.*l.s1*l.s7,
+            xi2=2.*l.s2*l.z12,xi3=2.*l.s2*(l.z13-l.z11),
+            xl2=-2.*l.s3*l.z2,xl3=-2.*l.s3*(l.z3-l.z1),
+            xl4=-2.*l.s3*(-21.-9.*emsq)*zel,
+            xgh2=2.*l.s4*l.z32,xgh3=2.*l.s4*(l.z33-l.z31),xgh4=-18.*l.s4*zel,
+            xh2=-2.*l.s2*l.z22,xh3=-2.*l.s2*(l.z23-l.z21))
+    return s,l,p
+
+def _dsinit(c,s,l,xhdot1,eccsq):
+    """Deep space secular rates and resonance terms (dict)"""
+    znl=1.5835218e-4
+    zns=1.19459e-5
+    no=c["no"]
+    ecco=c["ecco"]
+    inclo=c["inclo"]
+    cosim=np.cos(inclo)
+    sinim=np.sin(inclo)
+    emsq=ecco*ecco
+    irez=np.zeros(len(no),dtype=np.int8)
+    irez[(0.0034906585<no)&(no<0.0052359877)]=1
+    irez[(8.26e-3<=no)&(no<=9.24e-3)&(ecco>=0.5)]=2
+
+    # solar and lunar terms (no node terms for inclinations near 0 and 180 deg)
+    ses=s.s1*zns*s.s5
+    sis=s.s2*zns*(s.z11+s.z13)
+    sls=-zns*s.s3*(s.z1+s.z3-14.-6.*emsq)
+    sghs=s.s4*zns*(s.z31+s.z33-6.)
+    shs=-zns*s.s2*(s.z21+s.z23)
+    polar=(inclo<5.2359877e-2)|(inclo>pi-5.2359877e-2)
+    shs=np.where(polar,0.,shs)
+    nonzero=sinim!=0.
+    sinim_=np.where(nonzero,sinim,1.)
+    shs=np.where(nonzero,shs/sinim_,shs)
+    sgs=sghs-cosim*shs
+    d=dict(irez=irez)
+    d["dedt"]=ses+l.s1*znl*l.s5
+    d["didt"]=sis+l.s2*znl*(l.z11+l.z13)
+    d["dmdt"]=sls-znl*l.s3*(l.z1+l.z3-14.-6.*emsq)
+    sghl=l.s4*znl*(l.z31+l.z33-6.)
+    shll=np.where(polar,0.,-znl*l.s2*(l.z21+l.z23))
+    d["domdt"]=np.where(nonzero,sgs+sghl-cosim/sinim_*shll,sgs+sghl)
+    d["dnodt"]=np.where(nonzero,shs+shll/sinim_,shs)
+    theta=np.fmod(c["gsto"],_twopi)
+    aonv=np.power(no/_xke,_x2o3)
+
+    # geopotential resonance for 12 hour orbits
+    em=ecco
+    eoc=em*eccsq
+    emsq=eccsq
+    g201=-0.306-(em-0.64)*0.440
+    low=em<=0.65
+    g211=np.where(low,3.616-13.2470*em+16.2900*emsq,
+            -72.099+331.819*em-508.738*emsq+266.724*eoc)
+    g310=np.where(low,-19.302+117.3900*em-228.4190*emsq+156.5910*eoc,
+            -346.844+1582.851*em-2415.925*emsq+1246.113*eoc)
+    g322=np.where(low,-18.9068+109.7927*em-214.6334*emsq+146.5816*eoc,
+            -342.585+1554.908*em-2366.899*emsq+1215.972*eoc)
+    g410=np.where(low,-41.122+242.6940*em-471.0940*emsq+313.9530*eoc,
+            -1052.797+4758.686*em-7193.992*emsq+3651.957*eoc)
+    g422=np.where(low,-146.407+841.8800*em-1629.014*emsq+1083.4350*eoc,
+            -3581.690+16178.110*em-24462.770*emsq+12422.520*eoc)
+    g520=np.where(low,-532.114+3017.977*em-5740.032*emsq+3708.2760*eoc,
+            np.where(em>0.715,-5149.66+29936.92*em-54087.36*emsq+31324.56*eoc,
+            1464.74-4664.75*em+3763.64*emsq))
+    low=em<0.7
+    g533=np.where(low,-919.22770+4988.6100*em-9064.7700*emsq+5542.21*eoc,
+            -37995.780+161616.52*em-229838.20*emsq+109377.94*eoc)
+    g521=np.where(low,-822.71072+4568.6173*em-8491.4146*emsq+5337.524*eoc,
+            -51752.104+218913.95*em-309468.16*emsq+146349.42*eoc)
+    g532=np.where(low,-853.66600+4690.2500*em-8624.7700*emsq+5341.4*eoc,
+            -40023.880+170470.89*em-242699.48*emsq+115605.82*eoc)
+    cosisq=cosim*cosim
+    sini2=sinim*sinim
+    f220=0.75*(1.+2.*cosim+cosisq)
+    f221=1.5*sini2
+    f321=1.875*sinim*(1.-2.*cosim-3.*cosisq)
+    f322=-1.875*sinim*(1.+2.*cosim-3.*cosisq)
+    f441=35.*sini2*f220
+    f442=39.3750*sini2*sini2
+    f522=9.84375*sinim*(sini2*(1.-2.*cosim-5.*cosisq)+
+            0.33333333*(-2.+4.*cosim+6.*cosisq))
+    f523=sinim*(4.92187512*sini2*(-2.-4.*cosim+10.*cosisq)+
+            6.56250012*(1.+2.*cosim-3.*cosisq))
+    f542=29.53125*sinim*(2.-8.*cosim+cosisq*(-12.+8.*cosim+10.*cosisq))
+    f543=29.53125*sinim*(-2.-8.*cosim+cosisq*(12.+8.*cosim-10.*cosisq))
+    half=irez==2
+    temp1=3.*(no*no)*(aonv*aonv)
+    temp=temp1*1.7891679e-6
+    d["d2201"]=np.where(half,temp*f220*g201,0.)
+    d["d2211"]=np.where(half,temp*f221*g211,0.)
+    temp1=temp1*aonv
+    temp=temp1*3.7393792e-7
+    d["d3210"]=np.where(half,temp*f321*g310,0.)
+    d["d3222"]=np.where(half,temp*f322*g322,0.)
+    temp1=temp1*aonv
+    temp=2.*temp1*7.3636953e-9
+    d["d4410"]=np.where(half,temp*f441*g410,0.)
+    d["d4422"]=np.where(half,temp*f442*g422,0.)
+    temp1=temp1*aonv
+    temp=temp1*1.1428639e-7
+    d["d5220"]=np.where(half,temp*f522*g520,0.)
+    d["d5232"]=np.where(half,temp*f523*g532,0.)
+    temp=2.*temp1*2.1765803e-9
+    d["d5421"]=np.where(half,temp*f542*g521,0.)
+    d["d5433"]=np.where(half,temp*f543*g533,0.)
+    xlamo=np.fmod(c["mo"]+c["nodeo"]+c["nodeo"]-theta-theta,_twopi)
+    xfact=c["mdot"]+d["dmdt"]+2.*(c["nodedot"]+d["dnodt"]-_rptim)-no
+
+    # synchronous resonance terms
+    g200=1.+emsq*(-2.5+0.8125*emsq)
+    g310=1.+2.*emsq
+    g300=1.+emsq*(-6.+6.60937*emsq)
+    f220=0.75*(1.+cosim)*(1.+cosim)
+    f311=0.9375*sinim*sinim*(1.+3.*cosim)-0.75*(1.+cosim)
+    f330=1.+cosim
+    f330=1.875*f330*f330*f330
+    del1=3.*no*no*aonv*aonv
+    sync=irez==1
+    d["del2"]=np.where(sync,2.*del1*f220*g200*1.7891679e-6,0.)
+    d["del3"]=np.where(sync,3.*del1*f330*g300*2.2123015e-7*aonv,0.)
+    d["del1"]=np.where(sync,del1*f311*g310*2.1460748e-6*aonv,0.)
+    d["xlamo"]=np.where(sync,np.fmod(c["mo"]+c["nodeo"]+c["argpo"]-theta,
+            _twopi),np.where(half,xlamo,0.))
+    d["xfact"]=np.where(sync,c["mdot"]+(c["argpdot"]+c["nodedot"])-_rptim+\
+            d["dmdt"]+d["domdt"]+d["dnodt"]-no,np.where(half,xfact,0.))
+    return d
+
+def _dpper(c,t,ep,inclp,nodep,argpp,mp):
+    """Apply the lunar-solar periodics"""
+    zm=c.zmos+1.19459e-5*t
+    zf=zm+2.*0.01675*np.sin(zm)
+    sinzf=np.sin(zf)
+    f2=0.5*sinzf*sinzf-0.25
+    f3=-0.5*sinzf*np.cos(zf)
+    ses=c.se2*f2+c.se3*f3
+    sis=c.si2*f2+c.si3*f3
+    sls=c.sl2*f2+c.sl3*f3+c.sl4*sinzf
+    sghs=c.sgh2*f2+c.sgh3*f3+c.sgh4*sinzf
+    shs=c.sh2*f2+c.sh3*f3
+    zm=c.zmol+1.5835218e-4*t
+    zf=zm+2.*0.05490*np.sin(zm)
+    sinzf=np.sin(zf)
+    f2=0.5*sinzf*sinzf-0.25
+    f3=-0.5*sinzf*np.cos(zf)
+    pe=ses+c.ee2*f2+c.e3*f3
+    pinc=sis+c.xi2*f2+c.xi3*f3
+    pl=sls+c.xl2*f2+c.xl3*f3+c.xl4*sinzf
+    pgh=sghs+c.xgh2*f2+c.xgh3*f3+c.xgh4*sinzf
+    ph=shs+c.xh2*f2+c.xh3*f3
+    inclp=inclp+pinc
+    ep=ep+pe
+    sinip=np.sin(inclp)
+    cosip=np.cos(inclp)
+
+    # directly for inclinations of 0.2 rad and more, with the Lyddane
+    # modification below
+    high=inclp>=0.2
+    ph_=ph/np.where(high,sinip,1.)
+    pgh_=pgh-cosip*ph_
+    sinop=np.sin(nodep)
+    cosop=np.cos(nodep)
+    alfdp=sinip*sinop+(ph*cosop+pinc*cosip*sinop)
+    betdp=sinip*cosop+(-ph*sinop+pinc*cosip*cosop)
+    xnoh=np.fmod(nodep,_twopi)
+    xls=mp+argpp+pl+pgh+(cosip-pinc*sinip)*xnoh
+    mp=mp+pl
+    nodel=np.arctan2(alfdp,betdp)
+    nodel=np.where(np.abs(xnoh-nodel)>pi,np.where(nodel<xnoh,nodel+_twopi,
+            nodel-_twopi),nodel)
+    argpp=np.where(high,argpp+pgh_,xls-mp-cosip*nodel)
+    nodep=np.where(high,nodep+ph_,nodel)
+    return ep,inclp,nodep,argpp,mp
+
+def _resonance_dots(c,xli,xni,atime,irez):
+    """(xndt, xldot, xnddt) of the resonance integration"""
+    if irez==1:
+        xndt=c.del1*np.sin(xli-0.13130908)+\
+                c.del2*np.sin(2.*(xli-2.8843198))+\
+                c.del3*np.sin(3.*(xli-0.37448087))
+        xnddt=c.del1*np.cos(xli-0.13130908)+\
+                2.*c.del2*np.cos(2.*(xli-2.8843198))+\
+                3.*c.del3*np.cos(3.*(xli-0.37448087))
+    else:
+        xomi=c.argpo+c.argpdot*atime
+        x2omi=xomi+xomi
+        x2li=xli+xli
+        xndt=c.d2201*np.sin(x2omi+xli-5.7686396)+\
+                c.d2211*np.sin(xli-5.7686396)+\
+                c.d3210*np.sin(xomi+xli-0.95240898)+\
+                c.d3222*np.sin(-xomi+xli-0.95240898)+\
+                c.d4410*np.sin(x2omi+x2li-1.8014998)+\
+                c.d4422*np.sin(x2li-1.8014998)+\
+                c.d5220*np.sin(xomi+xli-1.0508330)+\
+                c.d5232*np.sin(-xomi+xli-1.0508330)+\
+                c.d5421*np.sin(xomi+x2li-4.4108898)+\
+                c.d5433*np.sin(-xomi+x2li-4.4108898)
+        xnddt=c.d2201*np.cos(x2omi+xli-5.7686396)+\
+                c.d2211*np.cos(xli-5.7686396)+\
+                c.d3210*np.cos(xomi+xli-0.95240898)+\
+                c.d3222*np.cos(-xomi+xli-0.95240898)+\
+                c.d5220*np.cos(xomi+xli-1.0508330)+\
+                c.d5232*np.cos(-xomi+xli-1.0508330)+\
+                2.*(c.d4410*np.cos(x2omi+x2li-1.8014998)+\
+                c.d4422*np.cos(x2li-1.8014998)+\
+                c.d5421*np.cos(xomi+x2li-4.4108898)+\
+                c.d5433*np.cos(-xomi+x2li-4.4108898))
+    xldot=xni+c.xfact
+    return xndt,xldot,xnddt*xldot
+
+def _resonance(c,t,irez):
+    """(xni, xli, xndt, xldot, xnddt, ft) of the resonance integration (from
+    the epoch in 720 min steps) for the satellites with resonance irez
+
+    The steps are the same for all times of a satellite, so they are done
+    once per satellite and direction; each time takes the state of the step
+    it ends at."""
+    xli=np.empty(t.shape)
+    xni=np.empty(t.shape)
+    atime=np.empty(t.shape)
+    for forward in (True,False):
+        todo=t>0. if forward else t<=0.
+        delt=720. if forward else -720.
+        sxli=c.xlamo
+        sxni=c.no
+        satime=np.zeros(c.no.shape)
+        if not todo.any():
+            continue
+        # the rows' nearest time, only checked against the steps reaching it
+        near=np.where(todo,np.abs(t),np.inf).min(axis=1)
+        while True:
+            if (np.abs(satime)>near-720.).any():
+                done=todo&(np.abs(t-satime)<720.)
+                xli[done]=np.broadcast_to(sxli,t.shape)[done]
+                xni[done]=np.broadcast_to(sxni,t.shape)[done]
+                atime[done]=np.broadcast_to(satime,t.shape)[done]
+                todo&=~done
+                if not todo.any():
+                    break
+                near=np.where(todo,np.abs(t),np.inf).min(axis=1)
+            xndt,xldot,xnddt=_resonance_dots(c,sxli,sxni,satime,irez)
+            sxli=sxli+xldot*delt+xndt*259200.
+            sxni=sxni+xndt*delt+xnddt*259200.
+            satime=satime+delt
+    xndt,xldot,xnddt=_resonance_dots(c,xli,xni,atime,irez)
+    return xni,xli,xndt,xldot,xnddt,t-atime
+
+def _dspace(c,t,em,argpm,inclm,mm,nodem):
+    """Deep space secular effects and resonances: (em, argpm, inclm, mm,
+    nodem, nm)"""
+    theta=np.fmod(c.gsto+t*_rptim,_twopi)
+    em=em+c.dedt*t
+    inclm=inclm+c.didt*t
+    argpm=argpm+c.domdt*t
+    nodem=nodem+c.dnodt*t
+    mm=mm+c.dmdt*t
+    nm=np.broadcast_to(c.no,t.shape)
+    for irez in (1,2):
+        rows=np.flatnonzero(c.irez[:,0]==irez)
+        if len(rows)==0:
+            continue
+        r=SimpleNamespace(**{k:v[rows] for k,v in vars(c).items()})
+        xni,xli,xndt,xldot,xnddt,ft=_resonance(r,t[rows],irez)
+        nmr=xni+xndt*ft+xnddt*ft*ft*0.5
+        xl=xli+xldot*ft+xndt*ft*ft*0.5
+        if irez==1:
+            mmr=xl-nodem[rows]-argpm[rows]+theta[rows]
+        else:
+            mmr=xl-2.*nodem[rows]+2.*theta[rows]
+        mm=mm.copy()
+        mm[rows]=mmr
+        nm=np.array(nm)
+        nm[rows]=r.no+(nmr-r.no)
+    return em,argpm,inclm,mm,nodem,nm
+
+def _sgp4(c,t,deep):
+    """(error codes, r, v) of a block: c holds the constants of its
+    satellites as (n, 1) arrays, t the minutes since epoch as (n, m) array"""
+    # secular gravity and atmospheric drag
+    xmdf=c.mo+c.mdot*t
+    argpdf=c.argpo+c.argpdot*t
+    nodedf=c.nodeo+c.nodedot*t
+    t2=t*t
+    nodem=nodedf+c.nodecf*t2
+    tempa=1.-c.cc1*t
+    tempe=c.bstar*c.cc4*t
+    templ=c.t2cof*t2
+    if deep:
+        mm=xmdf
+        argpm=argpdf
+        em,argpm,inclm,mm,nodem,nm=_dspace(c,t,c.ecco,argpm,c.inclo,mm,nodem)
+    else:
+        delmtemp=1.+c.eta*np.cos(xmdf)
+        temp=c.omgcof*t+c.xmcof*(delmtemp*delmtemp*delmtemp-c.delmo)
+        mm=xmdf+temp
+        argpm=argpdf-temp
+        t3=t2*t
+        t4=t3*t
+        tempa=tempa-c.d2*t2-c.d3*t3-c.d4*t4
+        tempe=tempe+c.bstar*c.cc5*(np.sin(mm)-c.sinmao)
+        templ=templ+c.t3cof*t3+t4*(c.t4cof+t*c.t5cof)
+        em=c.ecco
+        inclm=c.inclo
+        nm=c.no
+    err=np.zeros(t.shape,dtype=np.int8)
+    err[np.broadcast_to(nm<=0.,t.shape)]=2
+    am=np.power(_xke/nm,_x2o3)*tempa*tempa
+    nm=_xke/np.power(am,1.5)
+    em=em-tempe
+    err[(err==0)&((em>=1.)|(em<-0.001))]=1
+    em=np.where(em<1.e-6,1.e-6,em)
+    mm=mm+c.no*templ
+    xlm=mm+argpm+nodem
+    nodem=np.fmod(nodem,_twopi)
+    argpm=np.fmod(argpm,_twopi)
+    xlm=np.fmod(xlm,_twopi)
+    mm=np.fmod(xlm-argpm-nodem,_twopi)
+
+    # lunar-solar periodics
+    if deep:
+        ep,xincp,nodep,argpp,mp=_dpper(c,t,em,inclm,nodem,argpm,mm)
+        neg=xincp<0.
+        xincp=np.where(neg,-xincp,xincp)
+        nodep=np.where(neg,nodep+pi,nodep)
+        argpp=np.where(neg,argpp-pi,argpp)
+        err[(err==0)&((ep<0.)|(ep>1.))]=3
+        sinip=np.sin(xincp)
+        cosip=np.cos(xincp)
+        aycof=-0.5*_j3oj2*sinip
+        xlcof=-0.25*_j3oj2*sinip*(3.+5.*cosip)/np.where(
+                np.abs(cosip+1.)>1.5e-12,1.+cosip,1.5e-12)
+    else:
+        ep,xincp,nodep,argpp,mp=em,inclm,nodem,argpm,mm
+        sinip=np.sin(xincp)
+        cosip=np.cos(xincp)
+        aycof=c.aycof
+        xlcof=c.xlcof
+
+    # long period periodics
+    axnl=ep*np.cos(argpp)
+    temp=1./(am*(1.-ep*ep))
+    aynl=ep*np.sin(argpp)+temp*aycof
+    xl=mp+argpp+nodep+temp*xlcof*axnl
+
+    # Kepler's equation (sin and cos of the last but one estimate are used)
+    u=np.fmod(xl-nodep,_twopi)
+    eo1=u
+    tem5=np.ones(t.shape)
+    sineo1=coseo1=None
+    for _ in range(10):
+        todo=np.abs(tem5)>=1.e-12
+        if not todo.any():
+            break
+        s=np.sin(eo1)
+        co=np.cos(eo1)
+        d=(u-aynl*co+axnl*s-eo1)/(1.-co*axnl-s*aynl)
+        d=np.clip(d,-0.95,0.95)
+        if sineo1 is None or todo.all():
+            sineo1,coseo1,tem5=s,co,d
+        else:
+            sineo1=np.where(todo,s,sineo1)
+            coseo1=np.where(todo,co,coseo1)
+            tem5=np.where(todo,d,0.)
+        eo1=eo1+tem5
+
+    # short period preliminary quantities
+    ecose=axnl*coseo1+aynl*sineo1
+    esine=axnl*sineo1-aynl*coseo1
+    el2=axnl*axnl+aynl*aynl
+    pl=am*(1.-el2)
+    err[(err==0)&(pl<0.)]=4
+    rl=am*(1.-ecose)
+    rdotl=np.sqrt(am)*esine/rl
+    rvdotl=np.sqrt(pl)/rl
+    betal=np.sqrt(1.-el2)
+    temp=esine/(1.+betal)
+    sinu=am/rl*(sineo1-aynl-axnl*temp)
+    cosu=am/rl*(coseo1-axnl+aynl*temp)
+    su=np.arctan2(sinu,cosu)
+    sin2u=(cosu+cosu)*sinu
+    cos2u=1.-2.*sinu*sinu
+    temp=1./pl
+    temp1=0.5*_j2*temp
+    temp2=temp1*temp
+
+    # short period periodics
+    if deep:
+        cosisq=cosip*cosip
+        con41=3.*cosisq-1.
+        x1mth2=1.-cosisq
+        x7thm1=7.*cosisq-1.
+    else:
+        con41,x1mth2,x7thm1=c.con41,c.x1mth2,c.x7thm1
+    mrt=rl*(1.-1.5*temp2*betal*con41)+0.5*temp1*x1mth2*cos2u
+    su=su-0.25*temp2*x7thm1*sin2u
+    xnode=nodep+1.5*temp2*cosip*sin2u
+    xinc=xincp+1.5*temp2*cosip*sinip*cos2u
+    mvt=rdotl-nm*temp1*x1mth2*sin2u/_xke
+    rvdot=rvdotl+nm*temp1*(x1mth2*cos2u+1.5*con41)/_xke
+
+    # orientation vectors, position and velocity
+    sinsu=np.sin(su)
+    cossu=np.cos(su)
+    snod=np.sin(xnode)
+    cnod=np.cos(xnode)
+    sini=np.sin(xinc)
+    cosi=np.cos(xinc)
+    xmx=-snod*cosi
+    xmy=cnod*cosi
+    ux=xmx*sinsu+cnod*cossu
+    uy=xmy*sinsu+snod*cossu
+    uz=sini*sinsu
+    vx=xmx*cossu-cnod*sinsu
+    vy=xmy*cossu-snod*sinsu
+    vz=sini*cossu
+    mr=mrt*_radius
+    r=np.stack((mr*ux,mr*uy,mr*uz),axis=-1)
+    v=np.stack(((mvt*ux+rvdot*vx)*_vkmpersec,(mvt*uy+rvdot*vy)*_vkmpersec,
+            (mvt*uz+rvdot*vz)*_vkmpersec),axis=-1)
+    err[(err==0)&(mrt<1.)]=6
+    failed=(err>0)&(err<6)
+    r[failed]=np.nan
+    v[failed]=np.nan
+    return err,r,v
+
+class Sgp4Batch:
+    """SGP4 of a list of tles, initialised once on construction
+
+    The satellites are propagated in two groups (near earth and deep space)
+    in blocks of rows (satellites) and columns (times); results are in the
+    order of the tles."""
+
+    def __init__(self,tles):
+        self.tles=list(tles)
+        n=len(self.tles)
+        f=np.array([(t.mm,t.ecc,t.inc,t.raan,t.aop,t.ma,t.bstar,
+                t.epoch_timestamp()) for t in self.tles],dtype=float).\
+                reshape(n,8)
+        self.epoch=f[:,7]
+        deg=pi/180.
+        with np.errstate(all="ignore"):
+            c,deep,xhdot1,eccsq=_init(f[:,0]*(_twopi/1440.),f[:,1],f[:,2]*deg,
+                    f[:,3]*deg,f[:,4]*deg,f[:,5]*deg,f[:,6],
+                    self.epoch/86400.+7306.)
+            self._groups=[]
+            for sel,isdeep in ((~deep,False),(deep,True)):
+                idx=np.flatnonzero(sel)
+                if len(idx)==0:
+                    continue
+                g={k:v[idx] for k,v in c.items()}
+                if isdeep:
+                    s,l,p=_dscom(g["epoch"],g["ecco"],g["argpo"],g["inclo"],
+                            g["nodeo"],g["no"])
+                    g.update(p)
+                    g.update(_dsinit(g,s,l,xhdot1[idx],eccsq[idx]))
+                    # resonant satellites integrate from their epoch, keep
+                    # them in as few blocks as possible
+                    order=np.argsort(g["irez"],kind="stable")
+                    idx=idx[order]
+                    g={k:v[order] for k,v in g.items()}
+                self._groups.append((idx,g,isdeep))
+
+    def __len__(self):
+        return len(self.tles)
+
+    def _blocks(self,ncols,tsince):
+        """(rows, column slice, error codes, r, v) of all blocks, tsince(rows,
+        cols) gives the minutes since epoch of a block"""
+        nt=max(1,min(ncols,_block_size))
+        nr=max(1,_block_size//nt)
+        for idx,g,deep in self._groups:
+            for r0 in range(0,len(idx),nr):
+                rows=idx[r0:r0+nr]
+                c=SimpleNamespace(**{k:v[r0:r0+nr,None] for k,v in g.items()})
+                for c0 in range(0,ncols,nt):
+                    cols=slice(c0,min(c0+nt,ncols))
+                    with np.errstate(all="ignore"):
+                        yield (rows,cols)+_sgp4(c,tsince(rows,cols),deep)
+
+    def _collect(self,ncols,tsince):
+        err=np.zeros((len(self),ncols),dtype=np.int8)
+        r=np.empty((len(self),ncols,3))
+        v=np.empty((len(self),ncols,3))
+        for rows,cols,e,rb,vb in self._blocks(ncols,tsince):
+            err[rows,cols]=e
+            r[rows,cols]=rb
+            v[rows,cols]=vb
+        return err,r,v
+
+    def propagate(self,tsince):
+        """(error codes, r, v) at minutes since epoch: tsince of shape (N,)
+        gives arrays of shape (N,) and (N, 3), of shape (N, T) ones of (N, T)
+        and (N, T, 3)"""
+        tsince=np.asarray(tsince,dtype=float)
+        flat=tsince.ndim==1
+        tsince=tsince.reshape(len(self),-1)
+        err,r,v=self._collect(tsince.shape[1],lambda rows,cols:
+                tsince[rows,cols])
+        if flat:
+            return err[:,0],r[:,0],v[:,0]
+        return err,r,v
+
+    def at(self,timestamps):
+        """(error codes, r, v) at Unix timestamps (T,) as arrays of shape
+        (N, T) and (N, T, 3)"""
+        ts=np.asarray(timestamps,dtype=float).reshape(-1)
+        return self._collect(len(ts),lambda rows,cols:
+                (ts[None,cols]-self.epoch[rows,None])/60.)
+
+    def altitude_mask(self,ranges,timestamps):
+        """Boolean array of the satellites with an altitude (km above a
+        sphere of the equatorial radius, like the SATCAT apogee and perigee)
+        in one of the (low, high) ranges at one of the Unix timestamps"""
+        ts=np.asarray(timestamps,dtype=float).reshape(-1)
+        mask=np.zeros(len(self),dtype=bool)
+        for rows,cols,err,r,_ in self._blocks(len(ts),lambda rows,cols:
+                (ts[None,cols]-self.epoch[rows,None])/60.):
+            alt=np.sqrt((r*r).sum(axis=-1))-_radius
+            hit=np.zeros(alt.shape,dtype=bool)
+            for lo,hi in ranges:
+                hit|=(alt>=lo)&(alt<=hi)
+            mask[rows]|=hit.any(axis=1)
+        return mask
+
+def propagate(tles,timestamps):
+    """(error codes, r, v) of tles at Unix timestamps (see Sgp4Batch.at)"""
+    return Sgp4Batch(tles).at(timestamps)
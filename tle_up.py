@@ -11,22 +11,82 @@ user provided manual TLE data.
 """
 
 import sys
-import urllib.request as rq
+import os
 import re
-from math import *
-import copy
+import io
+import struct
+import stat
+import mmap
+import time
+import threading
+import contextlib
+import functools
+import types
+from math import ceil,log,pi,pow
 
 _verbose=False
 _quiet=False
+_numpy_min=64 # fewer objects are filtered without importing NumPy
+
+class RunStats:
+    """Timers and counters of a run (thread safe)
+
+    Timers add up the seconds spent per phase (phases may nest, e.g. parsing
+    within downloading), counters add up events like fetched bytes or TLEs
+    with wrong checksums."""
+
+    def __init__(self):
+        self._lock=threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.timers={}
+            self.counters={}
+
+    def count(self,name,n=1):
+        with self._lock:
+            self.counters[name]=self.counters.get(name,0)+n
+
+    def add_time(self,name,seconds):
+        with self._lock:
+            self.timers[name]=self.timers.get(name,0.)+seconds
+
+    @contextlib.contextmanager
+    def timer(self,name):
+        """Context manager adding the time spent in it to a timer"""
+        t=time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name,time.perf_counter()-t)
+
+    def as_dict(self):
+        with self._lock:
+            return {"timers":dict(self.timers), "counters":dict(self.counters)}
+
+    def __str__(self):
+        d=self.as_dict()
+        return "\n".join(["%-24s %10.4f s" % i for i in sorted(d["timers"].items())]+\
+                ["%-24s %10d" % i for i in sorted(d["counters"].items())])
+
+stats=RunStats()
 
 class tle:
+    __slots__=("line1valid","line2valid","name","id","desig_year","desig_launch",
+            "desig_object","epoch_year","epoch_day","fdmm","sdmm","bstar","nr",
+            "inc","raan","ecc","aop","ma","mm","revol")
+
     def __init__(self):
         self.line1valid=False
         self.line2valid=False
         self.name=""
         self.id=0
-        self.desig={"year":0, "launch":0, "object":"A"}
-        self.epoch={"year":0, "day":0.}
+        self.desig_year=0
+        self.desig_launch=0
+        self.desig_object="A"
+        self.epoch_year=0
+        self.epoch_day=0.
         self.fdmm=0.
         self.sdmm=0.
         self.bstar=0.
@@ -39,149 +99,3112 @@ class tle:
         self.mm=0.
         self.revol=0
 
-    def __bytes__(self):
-        """Creates the propper TLE formating"""
-        line1=self.name.encode("ascii").ljust(24,b" ")
-        line2=b"1 %05dU %02d%03d%-3b %02d%012.8f %c.%08d %c%05d%+01d %c%05d%+01d 0 %04d" %\
-                (self.id,self.desig["year"]%100,self.desig["launch"],\
-                self.desig["object"].encode("ascii"),self.epoch["year"]%100,\
-                self.epoch["day"],b"-" if self.fdmm<0 else b" ",abs(self.fdmm*1.e8),\
-                b"-" if self.sdmm<0 else b" ",\
-                abs(self.sdmm*pow(10,5-(ceil(log(abs(self.sdmm),10)) if \
-                abs(self.sdmm)>0 else 0))),\
-                (ceil(log(abs(self.sdmm),10)) if abs(self.sdmm)>0 else 0),\
-                b"-" if self.bstar<0 else b" ",\
-                abs(self.bstar*pow(10,5-(ceil(log(abs(self.bstar),10)) if \
-                abs(self.bstar)>0 else 0))),\
-                (ceil(log(abs(self.bstar),10)) if abs(self.bstar)>0 else 0),\
-                self.nr,)
-        line3=b"2 %05d %08.4f %08.4f %07d %08.4f %08.4f %011.8f%05d" %\
-                (self.id,self.inc,self.raan,self.ecc*1.e7,self.aop,\
-                self.ma,self.mm,self.revol,)
-        l2cs=0
-        for c in line2:
-            bc=bytes([c])
-            if bc.isdigit():
-                l2cs+=int(bc.decode("ascii"))
-            elif bc==b"-":
-                l2cs+=1
-        l2cs%=10
-
-        l3cs=0
-        for c in line3:
-            bc=bytes([c])
-            if bc.isdigit():
-                l3cs+=int(bc.decode("ascii"))
-            elif bc==b"-":
-                l3cs+=1
-        l3cs%=10
-        return line1+b"\r\n"+line2+str(l2cs).encode("ascii")+b"\r\n"+line3+\
-                str(l3cs).encode("ascii")+b"\r\n"
-    
-    def __str__(self):
-        return bytes(self).decode("ascii")
+    @property
+    def desig(self):
+        """International designator as read-only mapping (a snapshot of the
+        flat fields, assign a dict to change them)"""
+        return types.MappingProxyType({"year":self.desig_year,
+                "launch":self.desig_launch, "object":self.desig_object})
+
+    @desig.setter
+    def desig(self,d):
+        self.desig_year=d["year"]
+        self.desig_launch=d["launch"]
+        self.desig_object=d["object"]
+
+    @property
+    def epoch(self):
+        """Epoch as read-only mapping (a snapshot of the flat fields, assign a
+        dict to change them)"""
+        return types.MappingProxyType({"year":self.epoch_year,
+                "day":self.epoch_day})
+
+    @epoch.setter
+    def epoch(self,e):
+        self.epoch_year=e["year"]
+        self.epoch_day=e["day"]
+
+    def epoch_timestamp(self):
+        """Epoch as seconds since 1970-01-01 UTC"""
+        y=self.epoch_year
+        if y<100:
+            y+=2000 if y<57 else 1900
+        return _year_start(y)+(self.epoch_day-1.)*86400.
+
+    def fields(self):
+        """Values of all slots as tuple (in order)"""
+        return (self.line1valid,self.line2valid,self.name,self.id,
+                self.desig_year,self.desig_launch,self.desig_object,
+                self.epoch_year,self.epoch_day,self.fdmm,self.sdmm,self.bstar,
+                self.nr,self.inc,self.raan,self.ecc,self.aop,self.ma,self.mm,
+                self.revol)
+
+    def __reduce__(self):
+        return (_tle_from_fields,self.fields())
+
+    def __bytes__(self):
+        """Creates the propper TLE formating"""
+        return _format_tle(self,_tle_exp(self.sdmm),_tle_exp(self.bstar))
+
+    def __str__(self):
+        return bytes(self).decode("ascii")
+
+def _year_start(y):
+    """Unix timestamp of January 1st of a year (like calendar.timegm)"""
+    y-=1
+    return (y*365+y//4-y//100+y//400-719162)*86400
+
+def _tle_from_fields(*fields):
+    """tle from the values of its slots (in order, used for pickling)"""
+    t=tle.__new__(tle)
+    (t.line1valid,t.line2valid,t.name,t.id,t.desig_year,t.desig_launch,
+            t.desig_object,t.epoch_year,t.epoch_day,t.fdmm,t.sdmm,t.bstar,t.nr,
+            t.inc,t.raan,t.ecc,t.aop,t.ma,t.mm,t.revol)=fields
+    return t
+
+_re_tle_line1=re.compile(r"^\s*(1)\s+(\d{1,5})(\w)\s+"\
+        r"(\d{2})(\d{3})(\w{0,3})\s+(\d{2})(\s{0,2}\d{1,3}\.\d{8})\s+"\
+        r"([-+ 0]\.\d{8})\s+([-+ ]\d{5}[-+]\d)\s+([-+ ]\d{5}[-+]\d)\s+"\
+        r"(0)\s+(\d{1,4})(\d)\s*$")
+_re_tle_line2=re.compile(r"^\s*(2)\s+(\d{1,5})\s+"\
+        r"(\d{1,3}\.\d{4})\s+(\d{1,3}\.\d{4})\s+(\d{1,7})\s+"\
+        r"(\d{1,3}\.\d{4})\s+(\d{1,3}\.\d{4})\s+"\
+        r"(\d{1,2}\.\d{8})(\s*\d{1,5})(\d)\s*$")
+
+# column layout check of well formed lines (fields are then decoded by offset)
+_re_tle_fixed1=re.compile(r"1 \d{5}\w \d{5}(?:\w{3}|\w\w |\w  |   ) "\
+        r"\d{5}\.\d{8} [-+ 0]\.\d{8} [-+ ]\d{5}[-+]\d [-+ ]\d{5}[-+]\d 0 "\
+        r"(?: {3}\d| {2}\d\d| \d{3}|\d{4})\d\s*")
+_re_tle_fixed2=re.compile(r"2 \d{5} (?:(?: {2}\d| \d\d|\d{3})\.\d{4} ){2}"\
+        r"\d{7} (?:(?: {2}\d| \d\d|\d{3})\.\d{4} ){2}(?: \d|\d\d)\.\d{8}"\
+        r"(?: {4}\d| {3}\d\d| {2}\d{3}| \d{4}|\d{5})\d\s*")
+
+# checksum value of every byte: digits count their value, "-" counts 1
+_cksum_values=bytes(c-0x30 if 0x30<=c<=0x39 else (1 if c==0x2d else 0)
+        for c in range(256))
+
+def tle_checksum(line):
+    """Calculate the modulo 10 checksum of a TLE line (without checksum digit)"""
+    return sum(line.translate(_cksum_values))%10
+
+def _tle_exp(x):
+    """Mantissa and exponent of a value for a TLE exponent field"""
+    if x==0:
+        return 0,0
+    e=ceil(log(abs(x),10))
+    m=round(abs(x*pow(10,5-e)))
+    # log is not exact at powers of ten, the mantissa has to fit 5 digits
+    if m>=100000:
+        m,e=round(abs(x*pow(10,4-e))),e+1
+    return m,e
+
+def _tle_exp_array(x):
+    """Mantissas and exponents (int arrays) of a float array for TLE exponent
+    fields, like _tle_exp"""
+    import numpy as np
+    ax=np.abs(x)
+    nz=ax!=0
+    with np.errstate(divide="ignore"):
+        e=np.where(nz,np.ceil(np.log(ax)/np.log(10.)),0.)
+    m=np.rint(np.abs(x*np.power(10.,5-e)))
+    over=m>=100000
+    m=np.where(over,np.rint(np.abs(x*np.power(10.,4-e))),m)
+    e=e+over
+    m[~nz]=0
+    e[~nz]=0
+    return m.astype(np.int64),e.astype(np.int64)
+
+# the lines of a TLE without checksum, all 68 characters if the values fit
+_tle_line1=b"1 %05dU %02d%03d%-3b %02d%012.8f %c.%08d %c%05d%+01d %c%05d%+01d "\
+        b"0 %04d"
+_tle_line2=b"2 %05d %08.4f %08.4f %07d %08.4f %08.4f %011.8f%05d"
+
+def _format_tle(t,sdmm_exp,bstar_exp):
+    """Format a tle with the already normalised exponent fields"""
+    line2=_tle_line1 % (t.id,t.desig_year%100,t.desig_launch,
+            t.desig_object.encode("ascii","replace"),t.epoch_year%100,t.epoch_day,
+            45 if t.fdmm<0 else 32,round(abs(t.fdmm*1.e8)),45 if t.sdmm<0 else 32,
+            sdmm_exp[0],sdmm_exp[1],45 if t.bstar<0 else 32,bstar_exp[0],
+            bstar_exp[1],t.nr)
+    line3=_tle_line2 % (t.id,t.inc,t.raan,round(t.ecc*1.e7),t.aop,t.ma,t.mm,t.revol)
+    return b"%b\r\n%b%d\r\n%b%d\r\n" % (t.name.encode("ascii","replace").ljust(24,b" "),
+            line2,sum(line2.translate(_cksum_values))%10,
+            line3,sum(line3.translate(_cksum_values))%10)
+
+def _tle_batch_columns(chunk):
+    """Columns (lists) of a list of tles for _format_tle_batch"""
+    from operator import attrgetter
+    return dict(zip(_tle_batch_fields,zip(*map(attrgetter(*_tle_batch_fields),
+            chunk))))
+
+def _table_batch_columns(table):
+    """Columns of a TleTable for _format_tle_batch"""
+    cols={k:table.data[k].tolist() for k in _tle_batch_fields if k!="name"}
+    cols["name"]=[table.names[i] for i in table.data["name"].tolist()]
+    return cols
+
+_tle_batch_fields=("name","id","desig_year","desig_launch","desig_object",
+        "epoch_year","epoch_day","fdmm","sdmm","bstar","nr","inc","raan","ecc",
+        "aop","ma","mm","revol")
+
+def _format_tle_batch(cols):
+    """TLE text of a batch given as columns (like __bytes__ of every tle), or
+    None if NumPy is missing or a record does not fit the fixed layout (like
+    a name longer than 24 characters)"""
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+    from itertools import chain
+    n=len(cols["id"])
+    try:
+        fdmm,sdmm,bstar,ecc=(np.array(cols[k],dtype=np.float64)
+                for k in ("fdmm","sdmm","bstar","ecc"))
+    except (TypeError,ValueError):
+        return None
+    if not all(np.isfinite(a).all() for a in (fdmm,sdmm,bstar,ecc)):
+        return None
+    sm,se=_tle_exp_array(sdmm)
+    bm,be=_tle_exp_array(bstar)
+    sign=lambda a:np.where(a<0,45,32).tolist()
+    l1=(_tle_line1*n) % tuple(chain.from_iterable(zip(cols["id"],
+            [y%100 for y in cols["desig_year"]],cols["desig_launch"],
+            [o.encode("ascii","replace") for o in cols["desig_object"]],
+            [y%100 for y in cols["epoch_year"]],cols["epoch_day"],sign(fdmm),
+            np.rint(np.abs(fdmm*1.e8)).astype(np.int64).tolist(),sign(sdmm),
+            sm.tolist(),se.tolist(),sign(bstar),bm.tolist(),be.tolist(),
+            cols["nr"])))
+    l2=(_tle_line2*n) % tuple(chain.from_iterable(zip(cols["id"],cols["inc"],
+            cols["raan"],np.rint(ecc*1.e7).astype(np.int64).tolist(),
+            cols["aop"],cols["ma"],cols["mm"],cols["revol"])))
+    names=b"".join([nm.encode("ascii","replace").ljust(24,b" ")
+            for nm in cols["name"]])
+    # every line is at least as long as the layout, so equal totals mean
+    # that all lines fit
+    if len(l1)!=68*n or len(l2)!=68*n or len(names)!=24*n:
+        return None
+    out=np.empty((n,168),dtype=np.uint8)
+    for col,data in ((0,names),(26,l1),(97,l2)):
+        w=24 if col==0 else 68
+        out[:,col:col+w]=np.frombuffer(data,dtype=np.uint8).reshape(n,w)
+        if col>0:
+            out[:,col+w]=np.frombuffer(data.translate(_cksum_values),
+                    dtype=np.uint8).reshape(n,w).sum(axis=1)%10+0x30
+    out[:,24:26]=out[:,95:97]=out[:,166:168]=(0x0d,0x0a)
+    return out.tobytes()
+
+def write_tles(records,f,batch=4096):
+    """Write tles (an iterable of tle objects or a TleTable) to a binary file
+
+    Records are written in batches with a single call each. The columns of a
+    batch are gathered once (a TleTable is used as is), the exponent fields,
+    signs and scaled integers are computed with NumPy and each line type is
+    formatted for the whole batch at once; small batches and the ones not
+    fitting the fixed layout are formatted per tle (like __bytes__)."""
+    if isinstance(records,TleTable):
+        for i in range(0,len(records),batch):
+            part=records[i:i+batch]
+            data=_format_tle_batch(_table_batch_columns(part)) \
+                    if len(part)>=_numpy_min else None
+            f.write(data if data is not None else \
+                    b"".join([bytes(t) for t in part]))
+        return
+    it=iter(records)
+    while True:
+        chunk=[t for _,t in zip(range(batch),it)]
+        if not chunk:
+            break
+        data=_format_tle_batch(_tle_batch_columns(chunk)) \
+                if len(chunk)>=_numpy_min else None
+        f.write(data if data is not None else \
+                b"".join([bytes(t) for t in chunk]))
+
+def map_file(f):
+    """Read-only mmap of an open binary file (b"" if it is empty, the file
+    itself if it is no regular file, like a pipe)"""
+    st=os.fstat(f.fileno())
+    if not stat.S_ISREG(st.st_mode):
+        return f
+    if st.st_size==0:
+        return b""
+    return mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+
+def _iter_mapped(mm,window=1<<24):
+    """Lines of an mmap (from its position); the pages already read are
+    released every window bytes, so the resident size does not grow with the
+    file"""
+    readline=mm.readline
+    dontneed=getattr(mmap,"MADV_DONTNEED",None)
+    done=mm.tell()-mm.tell()%mmap.PAGESIZE
+    while True:
+        l=readline()
+        if not l:
+            break
+        yield l
+        if dontneed is not None and mm.tell()-done>=window:
+            end=mm.tell()-mm.tell()%mmap.PAGESIZE
+            mm.madvise(dontneed,done,end-done)
+            done=end
+
+def _iter_lines(src):
+    """Iterate the lines of a bytes object, mmap, binary file or socket
+    without reading everything at once"""
+    if isinstance(src,(bytes,bytearray,memoryview)):
+        src=io.BytesIO(src)
+    elif isinstance(src,mmap.mmap):
+        src=_iter_mapped(src)
+    elif hasattr(src,"makefile") and not hasattr(src,"__iter__"):
+        # sockets are read through a (buffered) file object
+        src=src.makefile("rb")
+    for rl in src:
+        # files only split at "\n", split at "\r" too (like bytes.splitlines)
+        if b"\r" in rl.rstrip(b"\n")[:-1]:
+            yield from rl.splitlines()
+        else:
+            yield rl.rstrip(b"\r\n")
+
+def _check_tle_line(l,sl,cksum):
+    """Verify the checksum of a stripped TLE line and warn if it does not match"""
+    nsum=tle_checksum(l.strip(b" \r\n\t")[:-1])
+    if ((not _quiet) and (cksum!=nsum)):
+        print("WARNING: checksum did not match [check(\""+sl.strip(" \r\n\t")+\
+                "\")="+str(nsum)+"!="+str(cksum)+"]",file=sys.stderr)
+    return cksum==nsum
+
+def _exp_field(s):
+    """Convert a TLE exponent field (" 12345-4") to float"""
+    return float(s[0]+"0."+s[1:6]+"e"+s[6:])
+
+def _fixed_line1(s):
+    """Decode line 1 by column offsets, None if it is not in the fixed layout"""
+    if _re_tle_fixed1.fullmatch(s) is None:
+        return None
+    return (int(s[2:7]),int(s[9:11]),int(s[11:14]),s[14:17].rstrip(" "),
+            int(s[18:20]),float(s[20:32]),float(s[33]+"0"+s[34:43]),
+            _exp_field(s[44:52]),_exp_field(s[53:61]),int(s[64:68]),int(s[68]))
+
+def _regex_line1(s):
+    """Decode line 1 with the tolerant pattern, None if it does not match"""
+    m=_re_tle_line1.fullmatch(s)
+    if m is None:
+        return None
+    fdmm_str=m.group(9)
+    return (int(m.group(2)),int(m.group(4)),int(m.group(5)),m.group(6),
+            int(m.group(7)),float(m.group(8)),float(fdmm_str[0]+"0"+fdmm_str[1:]),
+            _exp_field(m.group(10)),_exp_field(m.group(11)),int(m.group(13)),
+            int(m.group(14)))
+
+def _fixed_line2(s):
+    """Decode line 2 by column offsets, None if it is not in the fixed layout"""
+    if _re_tle_fixed2.fullmatch(s) is None:
+        return None
+    return (int(s[2:7]),float(s[8:16]),float(s[17:25]),float("0."+s[26:33]),
+            float(s[34:42]),float(s[43:51]),float(s[52:63]),int(s[63:68]),
+            int(s[68]))
+
+def _regex_line2(s):
+    """Decode line 2 with the tolerant pattern, None if it does not match"""
+    m=_re_tle_line2.fullmatch(s)
+    if m is None:
+        return None
+    return (int(m.group(2)),float(m.group(3)),float(m.group(4)),
+            float("0."+m.group(5)),float(m.group(6)),float(m.group(7)),
+            float(m.group(8)),int(m.group(9)),int(m.group(10)))
+
+def _tolerant_line1(s):
+    return _fixed_line1(s) or _regex_line1(s)
+
+def _tolerant_line2(s):
+    return _fixed_line2(s) or _regex_line2(s)
+
+def iter_tles(src,strict=False,_next_line=None):
+    """Read TLEs one after another from bytes, a binary file or a socket
+    (read through socket.makefile)
+
+    Lines are decoded by their fixed column layout; unless strict is set,
+    lines not in that layout are decoded by a more tolerant pattern (for hand
+    edited files) instead of being rejected."""
+    dec_line1,dec_line2=_line_decoders(strict)
+    ctle=None
+    state="none"
+    ntles=ncksum=npartial=nmismatch=0
+    try:
+        for l in _iter_lines(src):
+            sl=l.decode("ascii")
+            if state=="name":
+                f=dec_line1(sl)
+                if f is not None:
+                    ctle.line1valid=_check_tle_line(l,sl,f[10])
+                    if not ctle.line1valid:
+                        ncksum+=1
+                    ctle.id=f[0]
+                    ctle.desig_year=f[1]
+                    ctle.desig_launch=f[2]
+                    ctle.desig_object=f[3]
+                    ctle.epoch_year=f[4]
+                    ctle.epoch_day=f[5]
+                    ctle.fdmm=f[6]
+                    ctle.sdmm=f[7]
+                    ctle.bstar=f[8]
+                    ctle.nr=f[9]
+                    state="line1"
+                    continue
+            elif state=="line1":
+                f=dec_line2(sl)
+                if f is not None:
+                    line2valid=_check_tle_line(l,sl,f[8])
+                    if not line2valid:
+                        ncksum+=1
+                    state="none"
+                    if f[0]!=ctle.id:
+                        nmismatch+=1
+                        if not _quiet:
+                            print("ERROR: unexpeced id in second line, skipping!",
+                                    file=sys.stderr)
+                        ctle=None
+                        continue
+                    ctle.line2valid=line2valid
+                    ctle.inc=f[1]
+                    ctle.raan=f[2]
+                    ctle.ecc=f[3]
+                    ctle.aop=f[4]
+                    ctle.ma=f[5]
+                    ctle.mm=f[6]
+                    ctle.revol=f[7]
+                    if _verbose:
+                        print("Successfully read in TLE for \""+ctle.name+"\": "+\
+                                str(ctle.id),file=sys.stderr)
+                    ntles+=1
+                    yield ctle
+                    ctle=None
+                    continue
+            if state!="none":
+                npartial+=1
+                if not _quiet:
+                    print("WARNING: Non consecutive TLE line ("+str(l)+\
+                            "), discards partial TLE (\""+str(ctle.name)+"\":"+\
+                            str(ctle.id)+")",file=sys.stderr)
+                ctle=None
+                state="none"
+            name=sl.strip()
+            if name:
+                ctle=tle()
+                ctle.name=name
+                state="name"
+    # a chunk of a parallel parse ends like the line after it is read
+        if state!="none" and _next_line is not None:
+            npartial+=1
+            if not _quiet:
+                print("WARNING: Non consecutive TLE line ("+str(_next_line)+\
+                        "), discards partial TLE (\""+str(ctle.name)+"\":"+\
+                        str(ctle.id)+")",file=sys.stderr)
+    finally:
+        stats.count("tles_parsed",ntles)
+        stats.count("checksum_failures",ncksum)
+        stats.count("partial_tles_discarded",npartial)
+        stats.count("id_mismatches",nmismatch)
+
+def _line_decoders(strict):
+    return (_fixed_line1,_fixed_line2) if strict else \
+            (_tolerant_line1,_tolerant_line2)
+
+def parse_tle_bytes(f,strict=False,workers=1):
+    """Read TLEs from multible byte lines (bytes or a binary file), large
+    inputs in parallel by that many processes (0 for one per CPU)"""
+    with stats.timer("tle_parse"):
+        if workers!=1:
+            return _parse_parallel(f,strict,workers or os.cpu_count() or 1)
+        return list(iter_tles(f,strict))
+
+_parallel_min_size=1<<22 # smaller inputs are parsed in one process
+
+def _starts_record(l,dec_line1,dec_line2):
+    """Whether a line (without line break) starts a new record after any
+    line before: a name, which is neither a first nor a second TLE line"""
+    if b"\r" in l:
+        return False
+    sl=l.decode("ascii","replace")
+    return len(sl.strip())>0 and dec_line1(sl) is None and dec_line2(sl) is None
+
+def _chunk_bounds(buf,start,end,n,strict,scan=64):
+    """(start, end, line after the chunk or None) of up to n chunks of
+    buf[start:end], split at the beginning of lines which start a new record
+    (so the chunks parse independently)"""
+    dec_line1,dec_line2=_line_decoders(strict)
+    bounds=[(start,None)]
+    for k in range(1,n):
+        p=start+(end-start)*k//n
+        if p<=bounds[-1][0]:
+            continue
+        if buf[p-1:p]!=b"\n":
+            p=buf.find(b"\n",p,end)+1
+        for _ in range(scan):
+            if p<=0 or p>=end:
+                break
+            e=buf.find(b"\n",p,end)
+            l=buf[p:end if e<0 else e].rstrip(b"\r\n")
+            if _starts_record(l,dec_line1,dec_line2):
+                bounds.append((p,l))
+                break
+            p=e+1 if e>=0 else end
+    return [(s,e,l) for (s,_),(e,l) in zip(bounds,bounds[1:]+[(end,None)])]
+
+def _parse_chunk(src,start,end,next_line,strict,verbose,quiet):
+    """Parse buf[start:end] of a ("file", path) or ("shm", name) source in a
+    worker process, returns (tles, stderr output, counters)"""
+    global _verbose, _quiet
+    _verbose,_quiet=verbose,quiet
+    stats.reset()
+    kind,name=src
+    if kind=="file":
+        with open(name,"rb") as f, mmap.mmap(f.fileno(),0,
+                access=mmap.ACCESS_READ) as buf:
+            data=buf[start:end]
+    else:
+        from multiprocessing import shared_memory
+        shm=shared_memory.SharedMemory(name=name)
+        try:
+            data=bytes(shm.buf[start:end])
+        finally:
+            shm.close()
+    err=io.StringIO()
+    with contextlib.redirect_stderr(err):
+        tles=list(iter_tles(data,strict,next_line))
+    # field tuples pickle several times faster than objects
+    return [t.fields() for t in tles],err.getvalue(),stats.as_dict()["counters"]
+
+def _parse_parallel(f,strict,workers):
+    """parse_tle_bytes on chunks in a process pool; workers map the file or a
+    shared memory copy of the bytes, output and counters are merged in order"""
+    import concurrent.futures
+    path=getattr(f,"name",None)
+    if isinstance(f,(bytes,bytearray,memoryview)):
+        size=len(f)
+    elif isinstance(path,str) and os.path.isfile(path) and f.seekable():
+        size=os.fstat(f.fileno()).st_size
+    else:
+        f=f.read()
+        size=len(f)
+    if workers<2 or size<_parallel_min_size:
+        return list(iter_tles(f,strict))
+    shm=None
+    try:
+        if isinstance(f,(bytes,bytearray,memoryview)):
+            from multiprocessing import shared_memory
+            shm=shared_memory.SharedMemory(create=True,size=size)
+            shm.buf[:size]=f
+            chunks=_chunk_bounds(bytes(f),0,size,workers,strict)
+            source=("shm",shm.name)
+        else:
+            start=f.tell()
+            with mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ) as buf:
+                chunks=_chunk_bounds(buf,start,size,workers,strict)
+            f.seek(size)
+            source=("file",os.path.abspath(path))
+        with concurrent.futures.ProcessPoolExecutor(len(chunks)) as ex:
+            futures=[ex.submit(_parse_chunk,source,s,e,l,strict,_verbose,_quiet)
+                    for s,e,l in chunks]
+            tles=[]
+            for fut in futures:
+                fields,err,counters=fut.result()
+                tles.extend([_tle_from_fields(*f) for f in fields])
+                sys.stderr.write(err)
+                for name,n in counters.items():
+                    stats.count(name,n)
+        return tles
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+# OMM keys in the column order of Celestrak's CSV; tles have no
+# classification and ephemeris type, these are written as "U" and 0
+_omm_keys=("OBJECT_NAME","OBJECT_ID","EPOCH","MEAN_MOTION","ECCENTRICITY",
+        "INCLINATION","RA_OF_ASC_NODE","ARG_OF_PERICENTER","MEAN_ANOMALY",
+        "EPHEMERIS_TYPE","CLASSIFICATION_TYPE","NORAD_CAT_ID","ELEMENT_SET_NO",
+        "REV_AT_EPOCH","BSTAR","MEAN_MOTION_DOT","MEAN_MOTION_DDOT")
+# the keys read (in the order of the arguments of _omm_tle)
+_omm_read=tuple(k for k in _omm_keys if k not in ("EPHEMERIS_TYPE",
+        "CLASSIFICATION_TYPE"))
+# numeric OMM keys and their TleTable columns
+_omm_table_columns=(("MEAN_MOTION","mm"),("ECCENTRICITY","ecc"),
+        ("INCLINATION","inc"),("RA_OF_ASC_NODE","raan"),
+        ("ARG_OF_PERICENTER","aop"),("MEAN_ANOMALY","ma"),("NORAD_CAT_ID","id"),
+        ("ELEMENT_SET_NO","nr"),("REV_AT_EPOCH","revol"),("BSTAR","bstar"),
+        ("MEAN_MOTION_DOT","fdmm"),("MEAN_MOTION_DDOT","sdmm"))
+_month_days=(0,31,59,90,120,151,181,212,243,273,304,334)
+
+def _omm_epoch(s):
+    """(2 digit year, day of the year with fraction) of an OMM epoch like
+    "2024-01-15T12:34:56.789012" """
+    y=int(s[0:4])
+    m=int(s[5:7])
+    day=_month_days[m-1]+int(s[8:10])+\
+            (m>2 and y%4==0 and (y%100!=0 or y%400==0))
+    if len(s)>10:
+        day+=(int(s[11:13])*3600+int(s[14:16])*60+float(s[17:].rstrip("Z")))/\
+                86400.
+    return y%100,day
+
+def _omm_desig(s):
+    """(year, launch, object) of an OMM object id like "1998-067A" """
+    if not s or len(s)<9 or s[4]!="-":
+        return 0,0,""
+    return int(s[0:4])%100,int(s[5:8]),s[8:11]
+
+def _omm_tle(name,oid,epoch,mm,ecc,inc,raan,aop,ma,nid,nr,revol,bstar,fdmm,
+        sdmm):
+    """tle of the OMM values (strings or numbers) in the order of _omm_read"""
+    dy,dl,do=_omm_desig(oid)
+    ey,ed=_omm_epoch(epoch)
+    return _tle_from_fields(True,True,name,int(nid),dy,dl,do,ey,ed,float(fdmm),
+            float(sdmm),float(bstar),int(nr),float(inc),float(raan),float(ecc),
+            float(aop),float(ma),float(mm),int(revol))
+
+def _split_csv(lines):
+    """Fields of CSV lines; only lines with quotes go through the csv module
+    (records never span lines in OMM CSV)"""
+    import csv
+    for l in lines:
+        if '"' in l:
+            yield next(csv.reader((l,)))
+        else:
+            yield l.split(",") if l else []
+
+def _omm_csv_rows(lines):
+    """(header, row iterator) of OMM CSV (an iterable of str lines)"""
+    rows=_split_csv(lines)
+    header=next(rows,[])
+    if header:
+        header[0]=header[0].lstrip("\ufeff")
+    missing=[k for k in _omm_read if k not in header]
+    if missing:
+        raise ValueError("OMM CSV without "+", ".join(missing))
+    return header,rows
+
+def _read_all(src):
+    """All bytes of bytes, an mmap or a binary file"""
+    if isinstance(src,bytes):
+        return src
+    if isinstance(src,(bytearray,memoryview,mmap.mmap)):
+        return bytes(src)
+    return src.read()
+
+def _omm_json_records(data):
+    """The list of OMM dicts of JSON bytes, None if they are no OMM JSON (a
+    list of objects or one object)"""
+    import json
+    try:
+        data=json.loads(data)
+    except ValueError:
+        return None
+    recs=data if isinstance(data,list) else [data]
+    if not all(isinstance(d,dict) for d in recs):
+        return None
+    return recs
+
+def iter_omm_csv(src):
+    """Read tles one after another from OMM CSV (bytes or a binary file, the
+    first line names the columns like Celestrak's FORMAT=csv); rows with
+    missing or malformed values are skipped"""
+    header,rows=_omm_csv_rows(l.decode("utf-8") for l in _iter_lines(src))
+    cols=[header.index(k) for k in _omm_read]
+    ntles=nbad=0
+    try:
+        for r in rows:
+            if not r:
+                continue
+            try:
+                t=_omm_tle(*[r[c] for c in cols])
+            except (ValueError,IndexError):
+                nbad+=1
+                if not _quiet:
+                    print("WARNING: Malformed OMM row ("+",".join(r)+\
+                            "), skipping!",file=sys.stderr)
+                continue
+            ntles+=1
+            yield t
+    finally:
+        stats.count("tles_parsed",ntles)
+        stats.count("omm_rejected",nbad)
+
+def iter_omm_json(src):
+    """Read tles from OMM JSON (a list of objects like Celestrak's
+    FORMAT=json); objects with missing or malformed values are skipped
+    (raises ValueError if it is no OMM JSON)"""
+    recs=_omm_json_records(_read_all(src))
+    if recs is None:
+        raise ValueError("No OMM JSON data")
+    return _iter_omm_records(recs)
+
+def _iter_omm_records(recs):
+    import json
+    ntles=nbad=0
+    try:
+        for d in recs:
+            try:
+                t=_omm_tle(*[d[k] for k in _omm_read])
+            except (ValueError,TypeError,KeyError):
+                nbad+=1
+                if not _quiet:
+                    print("WARNING: Malformed OMM record ("+json.dumps(d)+\
+                            "), skipping!",file=sys.stderr)
+                continue
+            ntles+=1
+            yield t
+    finally:
+        stats.count("tles_parsed",ntles)
+        stats.count("omm_rejected",nbad)
+
+# a list of objects (or an empty one) or an object, TLE names may start with
+# brackets too
+_re_json_start=re.compile(rb"\[\s*[{\]]|{\s*[\"}]")
+
+def elements_format(src):
+    """Format of element set data by its first bytes: "json" or "csv" (OMM)
+    or "tle" (text); src is bytes, an mmap or a binary file (which is only
+    peeked at)"""
+    if isinstance(src,(bytes,bytearray,memoryview,mmap.mmap)):
+        head=bytes(src[:1024])
+    elif hasattr(src,"peek"):
+        head=src.peek(1024)[:1024]
+    else:
+        return "tle"
+    head=head.lstrip(b"\xef\xbb\xbf \t\r\n")
+    if _re_json_start.match(head) is not None:
+        return "json"
+    first=head.split(b"\n",1)[0]
+    if b"," in first and b"NORAD_CAT_ID" in first:
+        return "csv"
+    return "tle"
+
+def iter_elements(src,strict=False):
+    """Read tles from TLE text, OMM CSV or OMM JSON (see elements_format;
+    data that only starts like JSON is read as TLE text, raises ValueError
+    if OMM CSV lacks columns)"""
+    fmt=elements_format(src)
+    if fmt=="json":
+        data=_read_all(src)
+        recs=_omm_json_records(data)
+        if recs is not None:
+            return _iter_omm_records(recs)
+        return iter_tles(data,strict)
+    if fmt=="csv":
+        return iter_omm_csv(src)
+    return iter_tles(src,strict)
+
+def _omm_table_chunk(cols,nidx):
+    """Structured array (of _tle_columns) of OMM values by key, names are
+    added to the name pool index nidx"""
+    import numpy as np
+    data=np.zeros(len(cols["NORAD_CAT_ID"]),dtype=np.dtype(list(_tle_columns)))
+    data["line1valid"]=True
+    data["line2valid"]=True
+    for k,c in _omm_table_columns:
+        data[c]=np.array(cols[k],dtype=data.dtype[c])
+    epochs=np.array([str(e).rstrip("Z") for e in cols["EPOCH"]],
+            dtype="datetime64[us]")
+    years=epochs.astype("datetime64[Y]")
+    data["epoch_year"]=(years.astype(np.int64)+1970)%100
+    data["epoch_day"]=(epochs-years).astype(np.int64)/864e8+1.
+    # object ids ("1998-067A") as a matrix of bytes, malformed ones stay 0
+    oid=np.array([o or "" for o in cols["OBJECT_ID"]],dtype="S11")
+    ch=oid.view(np.uint8).reshape(len(oid),11)
+    digits=ch[:,[0,1,2,3,5,6,7]].astype(np.int32)-48
+    ok=(ch[:,4]==45)&((digits>=0)&(digits<=9)).all(axis=1)&(ch[:,8]>0)
+    data["desig_year"]=np.where(ok,digits[:,2]*10+digits[:,3],0)
+    data["desig_launch"]=np.where(ok,digits[:,4:]@[100,10,1],0)
+    data["desig_object"]=np.where(ok,np.ascontiguousarray(ch[:,8:]).\
+            view("S3").ravel(),b"").astype("U3")
+    data["name"]=[nidx.setdefault(n,len(nidx)) for n in cols["OBJECT_NAME"]]
+    return data
+
+def _omm_iso_epoch(t):
+    """Epoch of a tle in ISO 8601 (UTC, microseconds, without zone)"""
+    us=round(t.epoch_timestamp()*1e6)
+    return time.strftime("%Y-%m-%dT%H:%M:%S",time.gmtime(us//1000000))+\
+            ".%06d" % (us%1000000)
+
+def _omm_values(t):
+    """OMM values of a tle in the order of _omm_keys"""
+    return (t.name,"%04d-%03d%s" % (t.desig_year+(2000 if t.desig_year<57 else
+            1900),t.desig_launch,t.desig_object) if t.desig_launch>0 else "",
+            _omm_iso_epoch(t),t.mm,t.ecc,t.inc,t.raan,t.aop,t.ma,0,"U",t.id,t.nr,
+            t.revol,t.bstar,t.fdmm,t.sdmm)
+
+def write_omm(records,f,fmt="csv",batch=4096):
+    """Write tles (an iterable of tle objects or a TleTable) as OMM CSV or
+    JSON to a binary file (in batches, like write_tles)"""
+    import csv
+    import json
+    it=iter(records)
+    if fmt=="csv":
+        f.write((",".join(_omm_keys)+"\r\n").encode("ascii"))
+    else:
+        f.write(b"[")
+    sep=b""
+    while True:
+        chunk=[t for _,t in zip(range(batch),it)]
+        if not chunk:
+            break
+        if fmt=="csv":
+            buf=io.StringIO()
+            csv.writer(buf).writerows(_omm_values(t) for t in chunk)
+            f.write(buf.getvalue().encode("utf-8"))
+        else:
+            f.write(sep+b",\n".join(json.dumps(dict(zip(_omm_keys,_omm_values(
+                    t)))).encode("utf-8") for t in chunk))
+            sep=b",\n"
+    if fmt!="csv":
+        f.write(b"]\n")
+
+# columns of a TleTable (name is stored as index into the string pool)
+_tle_columns=(("id","i4"),("name","i4"),("line1valid","?"),("line2valid","?"),
+        ("desig_year","i2"),("desig_launch","i2"),("desig_object","U3"),
+        ("epoch_year","i2"),("epoch_day","f8"),("fdmm","f8"),("sdmm","f8"),
+        ("bstar","f8"),("nr","i4"),("inc","f8"),("raan","f8"),("ecc","f8"),
+        ("aop","f8"),("ma","f8"),("mm","f8"),("revol","i4"))
+
+def index_tles(*groups,prefer_first=False):
+    """Dict of tles by NORAD ID from one or more iterables of tles
+
+    Of repeated objects the tle with the newest epoch is kept, or with
+    prefer_first the one of the first group containing the object (the newest
+    one therein). Objects are in the order of their first appearance."""
+    idx={}
+    epochs={}
+    for g,tles in enumerate(groups):
+        for t in tles:
+            o=epochs.get(t.id)
+            if o is not None and prefer_first and o[0]<g:
+                continue
+            e=t.epoch_timestamp()
+            if o is None or e>o[1]:
+                idx[t.id]=t
+                epochs[t.id]=(g,e)
+    return idx
+
+def merge_tles(*groups,prefer_first=False):
+    """List of tles with one tle per NORAD ID (see index_tles)"""
+    return list(index_tles(*groups,prefer_first=prefer_first).values())
+
+class TleTable:
+    """Compact columnar store of TLEs backed by a NumPy structured array
+
+    Names are kept in a string pool shared by all tables derived from each
+    other; the "name" column holds the index into this pool."""
+
+    def __init__(self,data=None,names=None):
+        import numpy as np
+        self.data=data if data is not None else \
+                np.zeros(0,dtype=np.dtype(list(_tle_columns)))
+        self.names=names if names is not None else []
+
+    @classmethod
+    def from_tles(cls,tles):
+        """Create a table from an iterable of tle objects"""
+        import numpy as np
+        names=[]
+        nidx={}
+        rows=[]
+        for t in tles:
+            ni=nidx.get(t.name)
+            if ni is None:
+                ni=nidx[t.name]=len(names)
+                names.append(t.name)
+            rows.append((t.id,ni,t.line1valid,t.line2valid,t.desig_year,
+                    t.desig_launch,t.desig_object,t.epoch_year,t.epoch_day,t.fdmm,
+                    t.sdmm,t.bstar,t.nr,t.inc,t.raan,t.ecc,t.aop,t.ma,t.mm,
+                    t.revol))
+        return cls(np.array(rows,dtype=np.dtype(list(_tle_columns))),names)
+
+    @classmethod
+    def from_omm(cls,src,chunk=1<<14):
+        """Create a table from OMM CSV or JSON (bytes or a binary file), the
+        values are converted a column of chunk records at a time (raises
+        ValueError if a value is malformed)"""
+        import numpy as np
+        import itertools
+        nidx={}
+        parts=[]
+        if elements_format(src)=="json":
+            recs=_omm_json_records(_read_all(src))
+            if recs is None:
+                raise ValueError("No OMM JSON data")
+            for i in range(0,len(recs),chunk):
+                try:
+                    cols={k:[d[k] for d in recs[i:i+chunk]] for k in _omm_read}
+                except KeyError as ke:
+                    raise ValueError("OMM record without "+str(ke))
+                parts.append(_omm_table_chunk(cols,nidx))
+        else:
+            header,rows=_omm_csv_rows(_read_all(src).decode("utf-8").\
+                    splitlines())
+            pos=[header.index(k) for k in _omm_read]
+            while True:
+                block=list(itertools.islice(rows,chunk))
+                if not block:
+                    break
+                block=[r for r in block if r]
+                if any(len(r)!=len(header) for r in block):
+                    raise ValueError("OMM CSV row with a wrong number of columns")
+                values=list(zip(*block)) or [()]*len(header)
+                parts.append(_omm_table_chunk(dict(zip(_omm_read,
+                        (values[p] for p in pos))),nidx))
+        data=np.concatenate(parts) if parts else None
+        return cls(data,list(nidx))
+
+    def to_tles(self):
+        """Convert the table to a list of tle objects"""
+        return list(self)
+
+    def _tle(self,row):
+        t=tle()
+        (t.id,ni,t.line1valid,t.line2valid,t.desig_year,t.desig_launch,
+                t.desig_object,t.epoch_year,t.epoch_day,t.fdmm,t.sdmm,t.bstar,
+                t.nr,t.inc,t.raan,t.ecc,t.aop,t.ma,t.mm,t.revol)=row
+        t.name=self.names[ni]
+        return t
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        for row in self.data.tolist():
+            yield self._tle(row)
+
+    def __getitem__(self,key):
+        """Index with an int (tle object), a column name (array, names are
+        resolved to an object array) or a slice, index array or boolean mask
+        (TleTable sharing the name pool)"""
+        if isinstance(key,str):
+            if key=="name":
+                import numpy as np
+                return np.array(self.names,dtype=object)[self.data["name"]]
+            return self.data[key]
+        import numbers
+        if isinstance(key,numbers.Integral):
+            return self._tle(self.data[key].tolist())
+        return TleTable(self.data[key],self.names)
+
+# TLE archive: a header and fixed size records (the slots of a tle in order,
+# the name cut to 24 characters) in the log; the index file holds a header
+# and 8 byte aligned sections: the sorted NORAD IDs, the start of the entries
+# of every ID and the entries sorted by ID and epoch (columns of the epoch
+# timestamp, the record number and the element set number), followed by the
+# entries added since in log order
+_arch_header="<8sIII"
+_arch_magic=b"TLEUPAR\n"
+_arch_record="<??24sihh3shddddiddddddix"
+_arch_index_header="<8sIIII"
+_arch_index_entry="<idii" # NORAD ID, epoch timestamp, record, element set nr
+_arch_index_magic=b"TLEUPAI\n"
+_arch_version=1
+_arch_bom=0x01020304
+
+def _arch_pack(t):
+    f=list(t.fields())
+    f[2]=f[2].encode("ascii","replace")[:24]
+    f[6]=f[6].encode("ascii","replace")[:3]
+    return struct.pack(_arch_record,*f)
+
+def _arch_unpack(buf,off):
+    f=list(struct.unpack_from(_arch_record,buf,off))
+    f[2]=f[2].rstrip(b"\0").decode("ascii")
+    f[6]=f[6].rstrip(b"\0").decode("ascii")
+    return _tle_from_fields(*f)
+
+class TleArchive:
+    """Append-only archive of tles with an index by NORAD ID and epoch
+
+    Tles are appended to a log of fixed size records. The index (path+".idx",
+    memory mapped) lists the records of every object sorted by epoch, so the
+    tle of an object nearest to a time takes two binary searches and the tles
+    of all objects as of a time are read without parsing any text. Tles
+    already archived (same ID, epoch and element set number) are not added
+    again. The entries of added tles are appended to the index (and merged
+    with the sorted ones on lookups), it is only rewritten when they
+    outnumber the sorted ones or it is missing or does not fit the log; it is
+    brought up to date from the log when it is behind (e.g. after a crash).
+    Only one process may add at a time."""
+
+    def __init__(self,path):
+        self.path=path
+        self._rs=struct.calcsize(_arch_record)
+        hs=struct.calcsize(_arch_header)
+        self._start=hs+(-hs%8)
+        self._log=None
+        self._index=None
+        self._views=[]
+        if not os.path.exists(path):
+            with open(path,"wb") as af:
+                af.write(struct.pack(_arch_header,_arch_magic,_arch_version,
+                        _arch_bom,self._rs)+b"\0"*(self._start-hs))
+        with open(path,"rb") as af:
+            magic,version,bom,rs=struct.unpack(_arch_header,af.read(hs).ljust(hs,
+                    b"\0"))
+            if magic!=_arch_magic or version!=_arch_version or bom!=_arch_bom \
+                    or rs!=self._rs:
+                raise ValueError("Unsupported TLE archive format")
+            # a partial record at the end (of an interrupted add) is ignored
+            self._count=max(0,os.fstat(af.fileno()).st_size-self._start)//self._rs
+        self._map_log()
+        self._map_index()
+        if self._indexed<self._count:
+            self._write_index([(t.id,t.epoch_timestamp(),rec,t.nr) for rec,t in
+                    enumerate(self._tles(range(self._indexed,self._count)),
+                    self._indexed)])
+
+    def _map_log(self):
+        if self._log is not None:
+            self._log.close()
+            self._log=None
+        if self._count>0:
+            with open(self.path,"rb") as af:
+                self._log=mmap.mmap(af.fileno(),0,access=mmap.ACCESS_READ)
+
+    def _map_index(self):
+        import array
+        self._unmap_index()
+        self._ids=array.array("i")
+        self._starts=array.array("i",[0])
+        self._epochs=array.array("d")
+        self._recs=array.array("i")
+        self._nrs=array.array("i")
+        self._sorted=0
+        self._pending={} # nid -> sorted (epoch, record, nr) of the appended
+        self._end=None # end of the appended entries in the index file
+        self._indexed=0
+        try:
+            with open(self.path+".idx","rb") as xf:
+                mm=mmap.mmap(xf.fileno(),0,access=mmap.ACCESS_READ)
+        except (IOError,ValueError):
+            return
+        hs=struct.calcsize(_arch_index_header)
+        mv=memoryview(mm)
+        views=[]
+        try:
+            if len(mm)<hs:
+                raise ValueError("Truncated TLE archive index")
+            magic,version,bom,n,nids=struct.unpack_from(_arch_index_header,mm)
+            if magic!=_arch_index_magic or version!=_arch_version or \
+                    bom!=_arch_bom:
+                raise ValueError("TLE archive index does not fit the log")
+            off=hs+(-hs%8)
+            for cnt,fmt in ((nids,"i"),(nids+1,"i"),(n,"d"),(n,"i"),(n,"i")):
+                nbytes=cnt*struct.calcsize(fmt)
+                if off+nbytes>len(mv):
+                    raise ValueError("Truncated TLE archive index")
+                views.append(mv[off:off+nbytes].cast(fmt))
+                off+=nbytes+(-nbytes%8)
+            # a partial entry at the end (of an interrupted add) is ignored
+            es=struct.calcsize(_arch_index_entry)
+            napp=(len(mm)-off)//es
+            if n+napp>self._count:
+                raise ValueError("TLE archive index does not fit the log")
+            pending={}
+            for nid,e,rec,nr in struct.iter_unpack(_arch_index_entry,
+                    mm[off:off+napp*es]):
+                pending.setdefault(nid,[]).append((e,rec,nr))
+        except ValueError as e:
+            for v in views:
+                v.release()
+            mv.release()
+            mm.close()
+            if _verbose:
+                print("Rebuilding TLE archive index ("+str(e)+")",file=sys.stderr)
+            return
+        self._index=mm
+        self._views=views+[mv]
+        self._ids,self._starts,self._epochs,self._recs,self._nrs=views
+        for g in pending.values():
+            g.sort()
+        self._pending=pending
+        self._sorted=n
+        self._end=off+napp*es
+        self._indexed=n+napp
+
+    def _unmap_index(self):
+        for v in self._views:
+            v.release()
+        self._views=[]
+        if self._index is not None:
+            self._index.close()
+            self._index=None
+
+    def _write_index(self,new):
+        """Add new (id, epoch, record, nr) entries to the index, appended to
+        it or rewriting it with all entries sorted"""
+        import array
+        if self._end is not None and \
+                self._indexed-self._sorted+len(new)<=self._sorted:
+            with open(self.path+".idx","r+b") as xf:
+                xf.seek(self._end)
+                xf.write(b"".join([struct.pack(_arch_index_entry,*e)
+                        for e in new]))
+                xf.truncate()
+                self._end=xf.tell()
+            import bisect
+            for nid,e,rec,nr in new:
+                bisect.insort(self._pending.setdefault(nid,[]),(e,rec,nr))
+            self._indexed+=len(new)
+            return
+        groups={}
+        for nid,g in self._pending.items():
+            groups[nid]=list(g)
+        for nid,e,rec,nr in new:
+            groups.setdefault(nid,[]).append((e,rec,nr))
+        oids=self._ids.tolist()
+        ostarts=self._starts.tolist()
+        pos={nid:i for i,nid in enumerate(oids)}
+        old=(self._epochs,self._recs,self._nrs)
+        ids=array.array("i")
+        starts=array.array("i",[0])
+        cols=(array.array("d"),array.array("i"),array.array("i"))
+        for nid in sorted(pos.keys()|groups.keys()):
+            i=pos.get(nid)
+            s,e=(ostarts[i],ostarts[i+1]) if i is not None else (0,0)
+            g=groups.get(nid)
+            if g is None:
+                for c,o in zip(cols,old):
+                    c.frombytes(o[s:e].tobytes())
+            else:
+                g.extend(zip(*(o[s:e].tolist() for o in old)))
+                g.sort()
+                for c,v in zip(cols,zip(*g)):
+                    c.extend(v)
+            ids.append(nid)
+            starts.append(len(cols[0]))
+        sections=[ids,starts]+list(cols)
+        xfn=self.path+".idx"
+        with open(xfn+".tmp","wb") as xf:
+            head=struct.pack(_arch_index_header,_arch_index_magic,_arch_version,
+                    _arch_bom,len(cols[0]),len(ids))
+            xf.write(head+b"\0"*(-len(head)%8))
+            for sec in sections:
+                b=sec.tobytes()
+                xf.write(b)
+                xf.write(b"\0"*(-len(b)%8))
+        self._unmap_index()
+        os.replace(xfn+".tmp",xfn)
+        self._map_index()
+
+    def close(self):
+        self._unmap_index()
+        if self._log is not None:
+            self._log.close()
+            self._log=None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+    def __len__(self):
+        """Number of archived tles"""
+        return self._count
+
+    def _range(self,nid):
+        import bisect
+        k=bisect.bisect_left(self._ids,nid)
+        if k<len(self._ids) and self._ids[k]==nid:
+            return self._starts[k],self._starts[k+1]
+        return 0,0
+
+    def _entries(self,nid):
+        """Epochs, records and element set numbers of an object sorted by
+        epoch (the sorted and the appended entries)"""
+        lo,hi=self._range(nid)
+        cols=(self._epochs[lo:hi],self._recs[lo:hi],self._nrs[lo:hi])
+        g=self._pending.get(nid)
+        if g is None:
+            return cols
+        return tuple(zip(*sorted(list(zip(*cols))+g)))
+
+    def _tles(self,recs):
+        return [_arch_unpack(self._log,self._start+r*self._rs) for r in recs]
+
+    def __contains__(self,t):
+        """Whether a tle (same ID, epoch and element set number) is archived"""
+        import bisect
+        epochs,_,nrs=self._entries(t.id)
+        e=t.epoch_timestamp()
+        k=bisect.bisect_left(epochs,e)
+        while k<len(epochs) and epochs[k]==e:
+            if nrs[k]==t.nr:
+                return True
+            k+=1
+        return False
+
+    def add(self,tles):
+        """Append the tles not archived yet, returns how many were added"""
+        recs=[]
+        entries=[]
+        seen=set()
+        for t in tles:
+            key=(t.id,t.epoch_timestamp(),t.nr)
+            if key in seen or t in self:
+                continue
+            seen.add(key)
+            entries.append((key[0],key[1],self._count+len(recs),key[2]))
+            recs.append(_arch_pack(t))
+        if len(recs)==0:
+            return 0
+        with open(self.path,"r+b") as af:
+            af.seek(self._start+self._count*self._rs)
+            af.write(b"".join(recs))
+            af.truncate()
+        self._count+=len(recs)
+        self._map_log()
+        self._write_index(entries)
+        return len(recs)
+
+    def ids(self):
+        """Sorted NORAD IDs of the archived objects"""
+        if not self._pending:
+            return self._ids.tolist()
+        return sorted(set(self._ids.tolist())|self._pending.keys())
+
+    def history(self,nid):
+        """All archived tles of an object, sorted by epoch"""
+        return self._tles(list(self._entries(nid)[1]))
+
+    def nearest(self,nid,timestamp):
+        """The archived tle of an object with the epoch nearest to a Unix
+        timestamp (None if the object is not archived)"""
+        import bisect
+        epochs,recs,_=self._entries(nid)
+        if len(epochs)==0:
+            return None
+        k=bisect.bisect_left(epochs,timestamp)
+        if k==len(epochs) or k>0 and timestamp-epochs[k-1]<=\
+                epochs[k]-timestamp:
+            k-=1
+        return self._tles((recs[k],))[0]
+
+    def as_of(self,timestamp):
+        """The newest tle of every archived object with an epoch up to a
+        Unix timestamp (objects without one are left out)"""
+        import bisect
+        epochs=self._epochs
+        starts=self._starts.tolist()
+        ids=self._ids.tolist()
+        found=[]
+        for i in range(len(starts)-1):
+            if ids[i] in self._pending:
+                continue
+            k=bisect.bisect_right(epochs,timestamp,starts[i],starts[i+1])-1
+            if k>=starts[i]:
+                found.append((ids[i],self._recs[k]))
+        if self._pending:
+            for nid in self._pending:
+                ep,rs,_=self._entries(nid)
+                k=bisect.bisect_right(ep,timestamp)-1
+                if k>=0:
+                    found.append((nid,rs[k]))
+            found.sort()
+        return self._tles([rec for _,rec in found])
+
+class HttpCache:
+    """Persistent cache of HTTP response bodies in a directory, keyed by URL
+
+    Every entry consists of the body and a JSON file with the URL, the ETag
+    and Last-Modified headers and the times it was fetched and last used.
+    Entries younger than max_age seconds are fresh and used without asking
+    the server, if the total size exceeds max_size bytes the least recently
+    used entries are removed."""
+
+    def __init__(self,path,max_age=0.,max_size=100*2**20):
+        import json
+        self.path=path
+        self.max_age=max_age
+        self.max_size=max_size
+        self._lock=threading.Lock()
+        os.makedirs(path,exist_ok=True)
+        self._entries={} # hash -> [last used, size]
+        for fn in os.listdir(path):
+            if fn.endswith(".json"):
+                try:
+                    with open(os.path.join(path,fn),"rt") as mf:
+                        meta=json.load(mf)
+                    self._entries[fn[:-5]]=[meta["used"],meta["size"]]
+                except (IOError,ValueError,KeyError):
+                    pass
+
+    @staticmethod
+    def _key(url):
+        import hashlib
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def _files(self,key):
+        return os.path.join(self.path,key+".json"),\
+                os.path.join(self.path,key+".body")
+
+    def _write(self,fn,data):
+        tfn=fn+"."+str(threading.get_ident())+".tmp"
+        with open(tfn,"wb") as tf:
+            tf.write(data)
+        os.replace(tfn,fn)
+
+    def get(self,url,mapped=False):
+        """Cached (meta, body) of an URL or None (mapped returns the body as
+        mmap, to be closed by the caller)"""
+        import json
+        key=self._key(url)
+        mfn,bfn=self._files(key)
+        try:
+            with open(mfn,"rt") as mf:
+                meta=json.load(mf)
+            with open(bfn,"rb") as bf:
+                body=map_file(bf) if mapped else bf.read()
+        except (IOError,ValueError):
+            return None
+        if meta.get("url")!=url or meta.get("size")!=len(body):
+            if isinstance(body,mmap.mmap):
+                body.close()
+            return None
+        meta["used"]=time.time()
+        with self._lock:
+            self._entries[key]=[meta["used"],meta["size"]]
+        try:
+            self._write(mfn,json.dumps(meta).encode("utf-8"))
+        except IOError:
+            pass
+        return meta,body
+
+    def fresh(self,meta):
+        """Whether an entry can be used without revalidation"""
+        return time.time()-meta["fetched"]<=self.max_age
+
+    def revalidated(self,url,meta):
+        """Mark an entry as confirmed by the server (not modified)"""
+        import json
+        meta["fetched"]=time.time()
+        key=self._key(url)
+        self._write(self._files(key)[0],json.dumps(meta).encode("utf-8"))
+
+    def put(self,url,body,headers):
+        """Store a response body with its validators"""
+        import json
+        key=self._key(url)
+        mfn,bfn=self._files(key)
+        now=time.time()
+        meta={"url":url,"etag":headers.get("ETag"),
+                "last_modified":headers.get("Last-Modified"),
+                "fetched":now,"used":now,"size":len(body)}
+        self._write(bfn,body)
+        self._write(mfn,json.dumps(meta).encode("utf-8"))
+        with self._lock:
+            self._entries[key]=[now,len(body)]
+            total=sum(e[1] for e in self._entries.values())
+            evict=[]
+            for k in sorted(self._entries,key=lambda k:self._entries[k][0]):
+                if total<=self.max_size or k==key:
+                    break
+                total-=self._entries[k][1]
+                evict.append(k)
+            for k in evict:
+                del self._entries[k]
+        for k in evict:
+            for fn in self._files(k):
+                try:
+                    os.remove(fn)
+                except IOError:
+                    pass
+
+class Fetcher:
+    """Fetch URLs on a bounded thread pool
+
+    Keep-alive connections are reused per host, requests are started at most
+    rate times per second (0 disables the limit) and failed requests are
+    retried with exponential backoff. With a HttpCache fresh entries are used
+    directly and stale ones are revalidated with conditional requests; offline
+    only uses the cache."""
+
+    def __init__(self,max_workers=4,rate=5.,retries=3,backoff=0.5,timeout=30.,
+            cache=None,offline=False):
+        self.max_workers=max_workers
+        self.rate=rate
+        self.retries=retries
+        self.backoff=backoff
+        self.timeout=timeout
+        self.cache=cache
+        self.offline=offline
+        self._pool={}
+        self._lock=threading.Lock()
+        self._next_start=0.
+
+    def _wait_rate(self):
+        if self.rate<=0:
+            return
+        with self._lock:
+            now=time.monotonic()
+            start=max(now,self._next_start)
+            self._next_start=start+1./self.rate
+        if start>now:
+            time.sleep(start-now)
+
+    def _connection(self,scheme,host):
+        """(connection, whether it is an idle one being reused)"""
+        import http.client
+        with self._lock:
+            idle=self._pool.get((scheme,host))
+            if idle:
+                return idle.pop(),True
+        if scheme=="https":
+            return http.client.HTTPSConnection(host,timeout=self.timeout),False
+        return http.client.HTTPConnection(host,timeout=self.timeout),False
+
+    def _send(self,scheme,host,path,hdrs):
+        """Send a request and read the response, an idle connection the server
+        closed in the meantime is replaced by a new one right away (not counted
+        as retry); returns (connection, response, body)"""
+        import http.client
+        while True:
+            conn,reused=self._connection(scheme,host)
+            stats.count("requests")
+            resp=None
+            try:
+                conn.request("GET",path,headers=hdrs)
+                resp=conn.getresponse()
+                return conn,resp,resp.read()
+            except (IOError,http.client.HTTPException) as e:
+                conn.close()
+                # RemoteDisconnected is a ConnectionError too
+                if not reused or resp is not None or \
+                        not isinstance(e,ConnectionError):
+                    raise
+            stats.count("stale_connections")
+
+    def _release(self,scheme,host,conn):
+        with self._lock:
+            self._pool.setdefault((scheme,host),[]).append(conn)
+
+    def request(self,url,headers=None):
+        """Request an URL (following redirects), returns (status, headers, body)"""
+        import http.client
+        import urllib.parse
+        for redirect in range(6):
+            u=urllib.parse.urlsplit(url)
+            path=(u.path or "/")+("?"+u.query if u.query else "")
+            hdrs={"User-Agent":"TLEup"}
+            hdrs.update(headers or {})
+            for attempt in range(self.retries+1):
+                self._wait_rate()
+                if attempt>0:
+                    stats.count("retries")
+                try:
+                    conn,resp,body=self._send(u.scheme,u.netloc,path,hdrs)
+                    stats.count("bytes_fetched",len(body))
+                except (IOError,http.client.HTTPException) as e:
+                    if attempt>=self.retries:
+                        raise IOError("Failed to fetch "+url+" ("+str(e)+")")
+                else:
+                    if resp.will_close:
+                        conn.close()
+                    else:
+                        self._release(u.scheme,u.netloc,conn)
+                    if (resp.status<500 and resp.status!=429) or \
+                            attempt>=self.retries:
+                        break
+                time.sleep(self.backoff*2**attempt)
+            if resp.status in (301,302,303,307,308) and \
+                    resp.getheader("Location") is not None:
+                url=urllib.parse.urljoin(url,resp.getheader("Location"))
+                continue
+            return resp.status,resp.headers,body
+        raise IOError("Too many redirects for "+url)
+
+    def get(self,url,mapped=False):
+        """Fetch the body of an URL, raises IOError if it is not available
+        (mapped returns cached bodies as mmap, to be closed by the caller)"""
+        cached=self.cache.get(url,mapped) if self.cache is not None else None
+        if cached is not None and (self.offline or self.cache.fresh(cached[0])):
+            stats.count("cache_hits")
+            return cached[1]
+        if self.offline:
+            raise IOError("No cached copy of "+url+" (offline)")
+        headers={}
+        if cached is not None:
+            if cached[0]["etag"] is not None:
+                headers["If-None-Match"]=cached[0]["etag"]
+            if cached[0]["last_modified"] is not None:
+                headers["If-Modified-Since"]=cached[0]["last_modified"]
+        try:
+            status,rheaders,body=self.request(url,headers)
+        except IOError:
+            if cached is not None and isinstance(cached[1],mmap.mmap):
+                cached[1].close()
+            raise
+        if status==304 and cached is not None:
+            stats.count("not_modified")
+            self.cache.revalidated(url,cached[0])
+            return cached[1]
+        if cached is not None and isinstance(cached[1],mmap.mmap):
+            cached[1].close()
+        if status!=200:
+            raise IOError("Failed to fetch "+url+" (HTTP "+str(status)+")")
+        if self.cache is not None:
+            self.cache.put(url,body,rheaders)
+        return body
+
+    def get_all(self,urls,mapped=False):
+        """Fetch many URLs concurrently, returns the bodies (or the IOError of
+        a failed request) in the order of the URLs"""
+        def _get(url):
+            try:
+                return self.get(url,mapped)
+            except IOError as ioe:
+                return ioe
+        urls=list(urls)
+        if len(urls)<2 or self.max_workers<2:
+            return [_get(url) for url in urls]
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor(min(self.max_workers,
+                len(urls))) as ex:
+            return list(ex.map(_get,urls))
+
+    def close(self):
+        with self._lock:
+            for idle in self._pool.values():
+                for conn in idle:
+                    conn.close()
+            self._pool={}
+
+def fetch_bulk_tles(urls,ids,strict=False,fetcher=None,workers=1):
+    """Download whole TLE files (groups or the full catalogue, as TLE text or
+    OMM CSV or JSON) and keep only the TLEs with one of the given ids (dict
+    id->tle, first one found wins; workers as for parse_tle_bytes)"""
+    if fetcher is None:
+        fetcher=Fetcher()
+    found={}
+    if _verbose:
+        print("Fetching bulk TLEs from "+", ".join(urls)+" ...",file=sys.stderr)
+    for url, body in zip(urls,fetcher.get_all(urls)):
+        if isinstance(body,IOError):
+            if not _quiet:
+                print("WARNING: Failed to fetch bulk TLEs from "+url+"! ("+\
+                        str(body)+")",file=sys.stderr)
+            continue
+        try:
+            for t in iter_elements(body,strict) if workers==1 or \
+                    elements_format(body)!="tle" else \
+                    parse_tle_bytes(body,strict,workers):
+                if t.id in ids and t.id not in found:
+                    found[t.id]=t
+        except ValueError as ve:
+            if not _quiet:
+                print("WARNING: Failed to read bulk TLEs from "+url+"! ("+\
+                        str(ve)+")",file=sys.stderr)
+    return found
+
+_re_sc_launch=re.compile(r"\s*[-\+\d]+-[-\+\d]+")
+_re_sc_number=re.compile(r"\s*[-\+\d\.eE]+")
+
+def parse_satcat_annex(lines):
+    """Read the alternative names from the SATCAT annex (dict id->names)"""
+    altnames={}
+    for bl in lines:
+        le=bl.decode("ascii").rstrip("\r\n").split("|")
+        if len(le)>1 and le[0].isdigit():
+            altnames.setdefault(int(le[0]),[n.strip() for n in le[1:]])
+    return altnames
+
+def _satcat_names(name_s,nid,altnames):
+    names=[name_s.strip()]
+    if "&" in name_s:
+        names=[n.strip() for n in name_s.split("&")]
+    if nid in altnames:
+        names.extend(altnames[nid])
+    return names if len(names)>1 or len(names[0])>0 else None
+
+def _satcat_number(s,conv):
+    """Value of a numeric SATCAT field, None if it is empty or malformed"""
+    try:
+        return conv(s) if _re_sc_number.match(s) is not None else None
+    except ValueError:
+        return None
+
+def _parse_satcat_line(l,altnames):
+    """Decode a line of the SATCAT to an entry dict (of the raw fields only
+    the orbit comment is kept), the fields of malformed or truncated lines
+    are None"""
+    launch_s=l[0:11]
+    launch=None
+    if _re_sc_launch.match(launch_s) is not None:
+        try:
+            launch={"year":int(launch_s.split("-")[0]),
+                    "launch":int(launch_s.split("-")[1][0:3]),
+                    "object":launch_s.split("-")[1][3:].strip()}
+        except ValueError:
+            pass
+    nid=_satcat_number(l[13:18],int)
+    return {"raw":{"orbc":l[129:132]},
+            "launch":launch,
+            "nid":nid,
+            "names":_satcat_names(l[23:47],nid,altnames),
+            "inc":_satcat_number(l[96:101],float),
+            "apo":_satcat_number(l[103:109],int),
+            "peri":_satcat_number(l[111:117],int)}
+
+# columns of the orbit parameters in SATCAT lines
+_sc_range_columns=(("inc",96,101),("apo",103,109),("peri",111,117))
+
+def _satcat_value(s):
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+def _satcat_keys(l,altnames):
+    """(names, nid, launch designator) of a SATCAT line for filtering, taken
+    from the columns (only lines of an unusual format are parsed)"""
+    launch_s=l[0:11]
+    nid_s=l[13:18]
+    if launch_s[4:5]!="-" or not launch_s[0:4].isdigit() or \
+            not launch_s[5:8].isdigit() or not nid_s.isdigit():
+        e=_parse_satcat_line(l,altnames)
+        lc=e["launch"]
+        return (e["names"] or (),e["nid"],"%02d%03d%s" % (lc["year"]%100,
+                lc["launch"],lc["object"]) if lc is not None else None)
+    nid=int(nid_s)
+    return (_satcat_names(l[23:47],nid,altnames) or (),nid,
+            launch_s[2:4]+launch_s[5:8]+launch_s[8:].strip())
+
+class Satcat:
+    """Satellite catalogue indexed by NORAD ID, name prefix and launch
+
+    Lookups return the entries in catalogue order. Names (including the
+    alternative names) are matched upper case by prefix through a sorted
+    index; launches are indexed by year%100 and (year%100, launch). The
+    indices are built on first use."""
+
+    def __init__(self,entries=()):
+        self.entries=list(entries)
+        self._reset()
+
+    def close(self):
+        """Release the resources of the catalogue (nothing to release here,
+        see SatcatSnapshot)"""
+
+    def _reset(self):
+        self._by_id=None
+        self._by_launch=None
+        self._names=None
+        self._name_keys=None
+
+    @classmethod
+    def from_lines(cls,lines,altnames=None,flt=None,hits=None):
+        """Read the SATCAT from byte lines, discards decayed satellites (and
+        lines without a NORAD ID)
+
+        With a TleFilter only the matching entries are kept; the filter is
+        applied to the columns of every line and only the lines it selects
+        are parsed (the matched filters are added to hits)."""
+        entries=[]
+        altnames=altnames if altnames is not None else {}
+        for bl in lines:
+            l=bl.decode("ascii").rstrip("\r\n")
+            if l[21:22]=="D":
+                continue
+            if flt is not None and not flt.match_line(l,altnames,hits):
+                continue
+            e=_parse_satcat_line(l,altnames)
+            # lines without a NORAD ID (blank or malformed) are of no use
+            if e["nid"] is not None:
+                entries.append(e)
+        return cls(entries)
+
+    def add(self,entry):
+        self.entries.append(entry)
+        self._reset()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def _ids(self):
+        return [e["nid"] for e in self.entries]
+
+    def field_arrays(self):
+        """inc, apo and peri of all entries as float arrays (nan if unknown)"""
+        import numpy as np
+        return tuple(np.array([e[f] if e[f] is not None else np.nan
+                for e in self.entries],dtype=float) for f in ("inc","apo","peri"))
+
+    def rows(self):
+        """(names, nid, launch designator, inc, apo, peri) of every entry for
+        filtering (designator as in TLEs, like "98067A")"""
+        for e in self.entries:
+            l=e["launch"]
+            yield (e["names"] or (),e["nid"],"%02d%03d%s" % (l["year"]%100,
+                    l["launch"],l["object"]) if l is not None else None,
+                    e["inc"],e["apo"],e["peri"])
+
+    def _launches(self):
+        return [(e["launch"]["year"]%100,e["launch"]["launch"],
+                e["launch"]["object"]) if e["launch"] is not None else None
+                for e in self.entries]
+
+    def _name_index(self):
+        """Sorted upper case names and the positions of their entries"""
+        names=sorted((n.upper(),i) for i,e in enumerate(self.entries)
+                if e["names"] is not None for n in e["names"])
+        return [n for n,_ in names],[i for _,i in names]
+
+    def _id_position(self,nid):
+        if self._by_id is None:
+            self._by_id={}
+            for i,nid_ in enumerate(self._ids()):
+                if nid_ is not None:
+                    self._by_id.setdefault(nid_,i)
+        return self._by_id.get(nid)
+
+    def _name_positions(self,prefix):
+        import bisect
+        if self._names is None:
+            self._name_keys,self._names=self._name_index()
+        prefix=prefix.upper()
+        found=set()
+        for k in range(bisect.bisect_left(self._name_keys,prefix),
+                len(self._names)):
+            if not self._name_keys[k].startswith(prefix):
+                break
+            found.add(self._names[k])
+        return sorted(found)
+
+    def _launch_positions(self,key):
+        if self._by_launch is None:
+            self._launch_keys=self._launches()
+            self._by_launch={}
+            for i,l in enumerate(self._launch_keys):
+                if l is not None:
+                    self._by_launch.setdefault(l[0],[]).append(i)
+                    self._by_launch.setdefault(l[:2],[]).append(i)
+        return self._by_launch.get(key,[])
+
+    def _desig_positions(self,desig):
+        """Positions of the entries with a launch designator (as in TLEs, like
+        "98067A") starting with desig"""
+        found=self._launch_positions((int(desig[:2]),int(desig[2:5])) \
+                if len(desig)>=5 else int(desig[:2]))
+        return [i for i in found if ("%02d%03d%s" % self._launch_keys[i]).\
+                startswith(desig)]
+
+    def get_id(self,nid):
+        """Entry of a NORAD ID (the first one) or None"""
+        i=self._id_position(nid)
+        return self.entries[i] if i is not None else None
+
+    def find_name(self,prefix):
+        """Entries with a name starting with prefix (case insensitive)"""
+        return [self.entries[i] for i in self._name_positions(prefix)]
+
+    def find_launch(self,year,launch=None,obj=None):
+        """Entries of a launch designator (launch and obj None match all)"""
+        found=self._launch_positions(year%100 if launch is None else \
+                (year%100,launch))
+        if obj is not None:
+            found=[i for i in found if self._launch_keys[i][2]==obj]
+        return [self.entries[i] for i in found]
+
+    def save(self,path,source_hash):
+        """Write a binary snapshot of the catalogue (see SatcatSnapshot)"""
+        import array
+        strs=[]
+        sidx={}
+        def _s(s):
+            i=sidx.get(s)
+            if i is None:
+                i=sidx[s]=len(strs)
+                strs.append(s.encode("ascii"))
+            return i
+        none_i=_snap_none
+        cols={k:array.array("i") for k in ("nid","lyear","llaunch","lobject",
+                "names","nnames","apo","peri","orbc")}
+        inc=array.array("d")
+        names=array.array("i")
+        for e in self.entries:
+            l=e["launch"]
+            cols["nid"].append(e["nid"] if e["nid"] is not None else none_i)
+            cols["lyear"].append(l["year"] if l is not None else none_i)
+            cols["llaunch"].append(l["launch"] if l is not None else none_i)
+            cols["lobject"].append(_s(l["object"]) if l is not None else none_i)
+            cols["names"].append(len(names))
+            cols["nnames"].append(len(e["names"]) if e["names"] is not None \
+                    else none_i)
+            for n in e["names"] or ():
+                names.append(_s(n))
+            cols["apo"].append(e["apo"] if e["apo"] is not None else none_i)
+            cols["peri"].append(e["peri"] if e["peri"] is not None else none_i)
+            cols["orbc"].append(_s(e["raw"]["orbc"]))
+            inc.append(e["inc"] if e["inc"] is not None else float("nan"))
+        keys,pos=self._name_index()
+        skeys=array.array("i",[_s(k) for k in keys])
+        spos=array.array("i",pos)
+        offs=array.array("i",[0])
+        for s in strs:
+            offs.append(offs[-1]+len(s))
+        blob=b"".join(strs)
+        sections=[offs.tobytes(),blob]+[cols[k].tobytes() for k in _snap_columns]+\
+                [inc.tobytes(),names.tobytes(),skeys.tobytes(),spos.tobytes()]
+        with open(path+".tmp","wb") as sf:
+            sf.write(struct.pack(_snap_header,_snap_magic,_snap_version,
+                    _snap_bom,source_hash,len(self.entries),len(strs),len(blob),
+                    len(names),len(keys)))
+            for s in sections:
+                sf.write(s)
+                sf.write(b"\0"*(-len(s)%8))
+        os.replace(path+".tmp",path)
+
+# binary SATCAT snapshot: header, then 8 byte aligned sections: string offsets
+# and data, the int32 columns, inclination (float64), name string indices of
+# all entries and the sorted name index (string index, entry position)
+_snap_header="<8sII20sIIIII"
+_snap_magic=b"TLEUPSC\n"
+_snap_version=1
+_snap_bom=0x01020304
+_snap_none=-2**31
+_snap_columns=("nid","lyear","llaunch","lobject","names","nnames","apo","peri",
+        "orbc")
+
+class SatcatSnapshot(Satcat):
+    """Satcat memory mapped from a binary snapshot
+
+    The columns are used directly from the mapping and entry dicts are only
+    built for the entries actually looked up (their "raw" dict only holds
+    the orbit comment). close() (or the with statement) releases the
+    mapping."""
+
+    def __init__(self,path,source_hash=None):
+        self._views=[]
+        with open(path,"rb") as sf:
+            self._mm=mmap.mmap(sf.fileno(),0,access=mmap.ACCESS_READ)
+        try:
+            self._map(source_hash)
+        except BaseException:
+            self.close()
+            raise
+        self._reset()
+
+    def _map(self,source_hash):
+        """Check the header and take the sections from the mapping (raises
+        ValueError)"""
+        hs=struct.calcsize(_snap_header)
+        if len(self._mm)<hs:
+            raise ValueError("Truncated SATCAT snapshot")
+        magic,version,bom,shash,n,nstr,nblob,nnames,nkeys=\
+                struct.unpack_from(_snap_header,self._mm)
+        if magic!=_snap_magic or version!=_snap_version or bom!=_snap_bom:
+            raise ValueError("Unsupported SATCAT snapshot format")
+        if source_hash is not None and shash!=source_hash:
+            raise ValueError("SATCAT snapshot of a different source")
+        mv=memoryview(self._mm)
+        self._views.append(mv)
+        off=hs+(-hs%8)
+        def _section(nbytes,fmt=None):
+            nonlocal off
+            if off+nbytes>len(mv):
+                raise ValueError("Truncated SATCAT snapshot")
+            s=mv[off:off+nbytes]
+            off+=nbytes+(-nbytes%8)
+            if fmt is not None:
+                self._views.append(s)
+                s=s.cast(fmt)
+            self._views.append(s)
+            return s
+        self._stroffs=_section(4*(nstr+1),"i")
+        self._blob=_section(nblob)
+        self._cols={k:_section(4*n,"i") for k in _snap_columns}
+        self._inc=_section(8*n,"d")
+        self._allnames=_section(4*nnames,"i")
+        self._skeys=_section(4*nkeys,"i")
+        self._spos=_section(4*nkeys,"i")
+        self.entries=_SnapshotEntries(self,n)
+
+    def close(self):
+        # the views have to be released before the mapping can be closed
+        for v in reversed(self._views):
+            v.release()
+        self._views=[]
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+    def _str(self,i):
+        return bytes(self._blob[self._stroffs[i]:self._stroffs[i+1]]).\
+                decode("ascii")
+
+    def _entry(self,i):
+        c=self._cols
+        nn=c["nnames"][i]
+        return {"raw":{"orbc":self._str(c["orbc"][i])},
+                "launch":{"year":c["lyear"][i],"launch":c["llaunch"][i],
+                    "object":self._str(c["lobject"][i])} \
+                    if c["lyear"][i]!=_snap_none else None,
+                "nid":c["nid"][i] if c["nid"][i]!=_snap_none else None,
+                "names":[self._str(self._allnames[k]) for k in range(
+                    c["names"][i],c["names"][i]+nn)] if nn!=_snap_none else None,
+                "inc":self._inc[i] if self._inc[i]==self._inc[i] else None,
+                "apo":c["apo"][i] if c["apo"][i]!=_snap_none else None,
+                "peri":c["peri"][i] if c["peri"][i]!=_snap_none else None}
+
+    def add(self,entry):
+        raise TypeError("SATCAT snapshots are read only")
+
+    def _ids(self):
+        return [i if i!=_snap_none else None for i in self._cols["nid"].tolist()]
+
+    def field_arrays(self):
+        import numpy as np
+        arrays=[np.frombuffer(self._inc,dtype=np.float64)]
+        for f in ("apo","peri"):
+            col=np.frombuffer(self._cols[f],dtype=np.int32)
+            arrays.append(np.where(col==_snap_none,np.nan,col))
+        return tuple(arrays)
+
+    def rows(self):
+        c=self._cols
+        blob=bytes(self._blob).decode("ascii")
+        offs=self._stroffs.tolist()
+        strs=[blob[offs[i]:offs[i+1]] for i in range(len(offs)-1)]
+        names=self._allnames.tolist()
+        desigs=[(y,l,o) if y!=_snap_none else None for y,l,o in zip(
+                c["lyear"].tolist(),c["llaunch"].tolist(),c["lobject"].tolist())]
+        none=_snap_none
+        for nid,ns,nn,d,inc,apo,peri in zip(c["nid"].tolist(),
+                c["names"].tolist(),c["nnames"].tolist(),desigs,
+                self._inc.tolist(),c["apo"].tolist(),c["peri"].tolist()):
+            if d is not None:
+                d="%02d%03d%s" % (d[0]%100,d[1],strs[d[2]])
+            yield ([strs[k] for k in names[ns:ns+nn]] if nn!=none else (),
+                    nid if nid!=none else None,d,inc if inc==inc else None,
+                    apo if apo!=none else None,peri if peri!=none else None)
+
+    def _launches(self):
+        c=self._cols
+        objs={}
+        launches=[]
+        for y,l,o in zip(c["lyear"].tolist(),c["llaunch"].tolist(),
+                c["lobject"].tolist()):
+            if y==_snap_none:
+                launches.append(None)
+                continue
+            if o not in objs:
+                objs[o]=self._str(o)
+            launches.append((y%100,l,objs[o]))
+        return launches
+
+    def _name_index(self):
+        return [self._str(k) for k in self._skeys.tolist()],self._spos.tolist()
+
+class _SnapshotEntries:
+    """Sequence of the entry dicts of a SatcatSnapshot, built on access"""
+
+    def __init__(self,snapshot,n):
+        self._snapshot=snapshot
+        self._n=n
+        self._cache={}
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self,i):
+        if i<0:
+            i+=self._n
+        if not 0<=i<self._n:
+            raise IndexError("entry index out of range")
+        e=self._cache.get(i)
+        if e is None:
+            e=self._cache[i]=self._snapshot._entry(i)
+        return e
+
+    def __iter__(self):
+        for i in range(self._n):
+            yield self[i]
+
+def satcat_hash(satcat,annex):
+    """Hash identifying the sources of a SATCAT (bytes or mmaps)"""
+    import hashlib
+    h=hashlib.sha1(struct.pack("<Q",len(satcat)))
+    h.update(satcat)
+    h.update(annex)
+    return h.digest()
+
+def load_satcat(satcat,annex,snapshot=None,flt=None,hits=None):
+    """Load the SATCAT from the bodies of satcat.txt and satcat-annex.txt
+    (bytes or mmaps)
+
+    With a snapshot path the catalogue is taken from the snapshot if it was
+    made from the same sources, otherwise it is parsed and the snapshot is
+    (re)written. Without one a TleFilter can be given to only keep the
+    matching entries (see Satcat.from_lines)."""
+    if snapshot is None:
+        return Satcat.from_lines(_iter_lines(satcat),
+                parse_satcat_annex(_iter_lines(annex)),flt,hits)
+    shash=satcat_hash(satcat,annex)
+    try:
+        sc=SatcatSnapshot(snapshot,shash)
+        if _verbose:
+            print("SATCAT loaded from snapshot "+snapshot,file=sys.stderr)
+        return sc
+    except (IOError,ValueError) as e:
+        if _verbose:
+            print("Not using SATCAT snapshot ("+str(e)+")",file=sys.stderr)
+    sc=Satcat.from_lines(_iter_lines(satcat),parse_satcat_annex(_iter_lines(annex)))
+    try:
+        sc.save(snapshot,shash)
+    except IOError as ioe:
+        if not _quiet:
+            print("WARNING: Failed to write SATCAT snapshot "+snapshot+"! ("+\
+                    str(ioe)+")",file=sys.stderr)
+    return sc
+
+def _tle_desig(t):
+    """Launch designator of a tle like in the TLE ("98067A")"""
+    return "%02d%03d%s" % (t.desig_year%100,t.desig_launch,t.desig_object.upper())
+
+_re_filter_launch=re.compile(r"^~(?:(\d{2})|(\d{4})-)(\d{0,3})([a-zA-Z]{0,3})\s*$")
+_re_filter_field=re.compile(r"^%(inc|apo|peri)\s+{\s*([\d.eE+-]+)\s*,"\
+        r"\s*([\d.eE+-]+)\s*}\s*$")
+_re_filter_alt=re.compile(r"^%alt\s+{\s*([\d.eE+-]+)\s*,\s*([\d.eE+-]+)\s*}"\
+        r"(?:\s*{\s*([\d.eE+-]+)\s*,\s*([\d.eE+-]+)\s*})?\s*$")
+
+class TleFilter:
+    """Filter list compiled for matching TLEs and SATCAT entries alike
+
+    Name and launch designator prefixes share one prefix tree, which is
+    walked once per (upper case) name and designator; ids are kept in a dict
+    and the orbit parameter ranges as sorted, merged interval lists per
+    field. Matching collects the indices of the matching name, id and launch
+    filters in a hits set (to report filters without any match).
+
+    Altitude filters are evaluated by propagating tles with SGP4 (see
+    tle_sgp4) every alt_step seconds of their time window; SATCAT entries
+    only are candidates for them if their perigee to apogee span reaches
+    into the range (give or take alt_margin km)."""
+    alt_step=60.
+    alt_margin=50.
+
+    def __init__(self):
+        self.filters=[] # (kind, text) of the name, id and launch filters
+        self.ids={}
+        self.ranges={"inc":[],"apo":[],"peri":[]}
+        self.altitudes=[] # (low, high, start, end)
+        self._trie={}
+        self._lows={"inc":[],"apo":[],"peri":[]}
+
+    @classmethod
+    def parse(cls,lines,errors=None):
+        """Compile the lines of a filter file, invalid filters are reported
+        (or their messages appended to the list errors)"""
+        flt=cls()
+        def report(msg):
+            if errors is not None:
+                errors.append(msg)
+            elif not _quiet:
+                print("ERROR: "+msg,file=sys.stderr)
+        for l in lines:
+            l=l.rstrip(" \r\n")
+            if len(l)<1 or l[0]=="#":
+                continue
+            elif l[0]=="?" or l[0]=="\\":
+                if len(l[1:].strip())>0:
+                    flt.add_name(l[1:])
+                else:
+                    report("An empty name is not a valid filter!")
+            elif l[0]=="$":
+                if l[1:].strip().isdigit():
+                    flt.add_id(int(l[1:].strip()))
+                else:
+                    report("\""+l[1:]+"\" is not a valid NORAD ID!")
+            elif l[0]=="~":
+                match=_re_filter_launch.fullmatch(l)
+                if match is not None and (len(match.group(4))==0 or \
+                        len(match.group(3))==3):
+                    flt.add_launch(("%02d" % (int(match.group(1) or \
+                            match.group(2))%100))+match.group(3)+\
+                            match.group(4).upper())
+                else:
+                    report("\""+l[1:]+"\" is not a valid launch designator!")
+            elif l.startswith("%alt"):
+                match=_re_filter_alt.fullmatch(l)
+                try:
+                    flt.add_altitude(float(match.group(1)),float(match.group(2)),
+                            float(match.group(3) or 0.),
+                            float(match.group(4) or 24.))
+                except (AttributeError,ValueError):
+                    report("Invalid filter \""+l+"\"")
+                except ImportError:
+                    report("Altitude filters need NumPy! (\""+l+"\")")
+            elif l[0]=="%":
+                match=_re_filter_field.fullmatch(l)
+                try:
+                    flt.add_range(match.group(1),float(match.group(2)),
+                            float(match.group(3)))
+                except (AttributeError,ValueError):
+                    report("Invalid filter \""+l+"\"")
+            else:
+                flt.add_name(l)
+        return flt
+
+    def _add_prefix(self,key,kind,text):
+        node=self._trie
+        for c in key:
+            node=node.setdefault(c,{})
+        node.setdefault(None,[]).append(len(self.filters))
+        self.filters.append((kind,text))
+
+    def add_name(self,name):
+        """Match objects with a name starting with name (case insensitive)"""
+        self._add_prefix("N"+name.strip().upper(),"name",name)
+
+    def add_launch(self,desig):
+        """Match objects with a launch designator (like "98067A") starting with
+        desig"""
+        self._add_prefix("L"+desig,"launch designator",desig)
+
+    def add_id(self,nid):
+        """Match the object with the NORAD ID nid"""
+        if nid not in self.ids:
+            self.ids[nid]=len(self.filters)
+            self.filters.append(("id",str(nid)))
+
+    def add_range(self,field,lo,hi):
+        """Match objects with inc/apo/peri in [lo, hi] (apo, peri in km)"""
+        rs=sorted(self.ranges[field]+[[lo,hi]])
+        merged=[]
+        for r in rs:
+            if merged and r[0]<=merged[-1][1]:
+                merged[-1][1]=max(merged[-1][1],r[1])
+            else:
+                merged.append(list(r))
+        self.ranges[field]=merged
+        self._lows[field]=[r[0] for r in merged]
+
+    def add_altitude(self,lo,hi,start=0.,end=24.):
+        """Match tles with an altitude in [lo, hi] (km) at some time between
+        start and end hours from now (raises ImportError without NumPy)"""
+        import importlib.util
+        if importlib.util.find_spec("numpy") is None:
+            raise ImportError("No module named 'numpy'")
+        if end<start:
+            raise ValueError("End of the time window before its start")
+        self.altitudes.append((lo,hi,start,end))
+
+    def __len__(self):
+        return len(self.filters)+sum(len(r) for r in self.ranges.values())+\
+                len(self.altitudes)
+
+    def __str__(self):
+        return "\n".join([k+": "+t for k,t in self.filters]+[f+": "+str(r)
+                for f,rs in self.ranges.items() for r in rs]+["alt: "+\
+                str([lo,hi])+" in "+str([start,end])+" h"
+                for lo,hi,start,end in self.altitudes])
+
+    def _walk(self,key,hits):
+        node=self._trie
+        found=False
+        for c in key:
+            node=node.get(c)
+            if node is None:
+                break
+            if None in node:
+                hits.update(node[None])
+                found=True
+        return found
+
+    def in_range(self,field,v):
+        """Whether a value is in one of the ranges of a field"""
+        import bisect
+        k=bisect.bisect_right(self._lows[field],v)-1
+        return k>=0 and v<=self.ranges[field][k][1]
+
+    def match_keys(self,names,nid,desig,hits=None):
+        """Whether an object matches a name, id or launch filter"""
+        if hits is None:
+            hits=set()
+        found=False
+        if nid in self.ids:
+            hits.add(self.ids[nid])
+            found=True
+        if self._trie:
+            for n in names:
+                found=self._walk("N"+n.upper(),hits) or found
+            if desig is not None:
+                found=self._walk("L"+desig,hits) or found
+        return found
+
+    def match(self,names,nid,desig,inc,apo,peri,hits=None):
+        """Whether an object matches any filter (missing values are None)"""
+        if self.match_keys(names,nid,desig,hits):
+            return True
+        for field,v in (("inc",inc),("apo",apo),("peri",peri)):
+            if v is not None and self.ranges[field] and self.in_range(field,v):
+                return True
+        return False
+
+    def match_line(self,l,altnames,hits=None):
+        """Whether a (decoded) SATCAT line matches any filter, decided on its
+        columns without parsing the whole line"""
+        found=False
+        for field,start,end in _sc_range_columns:
+            if self.ranges[field]:
+                v=_satcat_value(l[start:end])
+                if v is not None and self.in_range(field,v):
+                    found=True
+                    break
+        if not found and self.altitudes:
+            found=self.altitude_candidate(_satcat_value(l[103:109]),
+                    _satcat_value(l[111:117]))
+        if len(self.filters)==0 or found and hits is None:
+            return found
+        return self.match_keys(*_satcat_keys(l,altnames),hits=hits) or found
+
+    def match_tle(self,t,hits=None):
+        """Whether a tle matches any filter"""
+        peri,apo=None,None
+        if self.ranges["apo"] or self.ranges["peri"]:
+            peri,apo=peri_apo_from_mm_ecc(t.mm,t.ecc)
+        if self.match((t.name,),t.id,_tle_desig(t),t.inc,apo,peri,hits):
+            return True
+        return bool(self.altitudes) and bool(self.altitude_mask([t])[0])
+
+    def altitude_candidate(self,apo,peri):
+        """Whether an object with apogee and perigee height (km, None if
+        unknown) may be in an altitude range"""
+        return apo is not None and peri is not None and \
+                any(peri<=hi+self.alt_margin and apo>=lo-self.alt_margin
+                for lo,hi,_,_ in self.altitudes)
+
+    def altitude_mask(self,tles,now=None):
+        """Boolean array of the tles in an altitude range during its time
+        window (from now, a Unix timestamp)"""
+        import numpy as np
+        import tle_sgp4
+        tles=list(tles)
+        mask=np.zeros(len(tles),dtype=bool)
+        if len(tles)==0 or not self.altitudes:
+            return mask
+        now=time.time() if now is None else now
+        windows={}
+        for lo,hi,start,end in self.altitudes:
+            windows.setdefault((start,end),[]).append((lo,hi))
+        with stats.timer("propagate"):
+            batch=tle_sgp4.Sgp4Batch(tles)
+            for (start,end),ranges in windows.items():
+                ts=np.append(np.arange(start*3600.,end*3600.,self.alt_step),
+                        end*3600.)+now
+                mask|=batch.altitude_mask(ranges,ts)
+        return mask
+
+    def range_mask(self,inc,apo,peri):
+        """Boolean array of the objects (given as arrays of their values, nan
+        if unknown) in one of the ranges"""
+        import numpy as np
+        mask=np.zeros(len(inc),dtype=bool)
+        for field,v in (("inc",inc),("apo",apo),("peri",peri)):
+            if self.ranges[field]:
+                k=np.searchsorted(self._lows[field],v,side="right")-1
+                highs=np.array([r[1] for r in self.ranges[field]])
+                mask|=(k>=0)&(v<=highs[np.maximum(k,0)])
+        return mask
+
+    def select_tles(self,tles,hits=None,now=None):
+        """The tles matching any filter (ranges are compared vectorised if
+        NumPy is available and there are enough tles, altitudes from now)"""
+        tles=list(tles)
+        if len(tles)<_numpy_min and not self.altitudes:
+            return [t for t in tles if self.match_tle(t,hits)]
+        try:
+            import numpy as np
+        except ImportError:
+            return [t for t in tles if self.match_tle(t,hits)]
+        sel=np.zeros(len(tles),dtype=bool)
+        if any(self.ranges.values()):
+            inc=np.array([t.inc for t in tles],dtype=float)
+            peri,apo=inc,inc
+            if self.ranges["apo"] or self.ranges["peri"]:
+                _,peri,apo,_=orbit_parameters([t.mm for t in tles],
+                        [t.ecc for t in tles])
+            sel|=self.range_mask(inc,apo,peri)
+        if len(self.filters)>0:
+            sel|=np.fromiter((self.match_keys((t.name,),t.id,_tle_desig(t),hits)
+                    for t in tles),dtype=bool,count=len(tles))
+        if self.altitudes:
+            rest=np.flatnonzero(~sel)
+            sel[rest]=self.altitude_mask([tles[i] for i in rest.tolist()],now)
+        return [tles[i] for i in np.flatnonzero(sel).tolist()]
+
+    def select(self,satcat,hits=None,altitudes=True):
+        """Entries of a Satcat matching any filter (the name, id and launch
+        filters in one pass, the ranges vectorised if NumPy is available;
+        with altitudes the candidates of the altitude filters); with only
+        name, id and launch filters the entries are looked up in the indices
+        of the Satcat instead"""
+        if not any(self.ranges.values()) and not (altitudes and self.altitudes):
+            return [satcat.entries[i] for i in self._indexed(satcat,hits)]
+        if len(satcat)<_numpy_min and not (altitudes and self.altitudes):
+            return [satcat.entries[i] for i,row in enumerate(satcat.rows())
+                    if self.match(*row,hits=hits)]
+        try:
+            import numpy as np
+        except ImportError:
+            return [satcat.entries[i] for i,row in enumerate(satcat.rows())
+                    if self.match(*row,hits=hits)]
+        sel=np.zeros(len(satcat),dtype=bool)
+        if any(self.ranges.values()) or altitudes and self.altitudes:
+            inc,apo,peri=satcat.field_arrays()
+            sel|=self.range_mask(inc,apo,peri)
+            for lo,hi,_,_ in self.altitudes if altitudes else ():
+                sel|=(peri<=hi+self.alt_margin)&(apo>=lo-self.alt_margin)
+        if len(self.filters)>0:
+            sel|=np.fromiter((self.match_keys(*row[:3],hits=hits)
+                    for row in satcat.rows()),dtype=bool,count=len(satcat))
+        return [satcat.entries[i] for i in np.flatnonzero(sel).tolist()]
+
+    def _indexed(self,satcat,hits=None):
+        """Sorted positions of the Satcat entries matching the name, id and
+        launch filters"""
+        found=set()
+        for k,(kind,text) in enumerate(self.filters):
+            if kind=="id":
+                i=satcat._id_position(int(text))
+                pos=[i] if i is not None else []
+            elif kind=="name":
+                pos=satcat._name_positions(text.strip())
+            else:
+                pos=satcat._desig_positions(text)
+            if pos and hits is not None:
+                hits.add(k)
+            found.update(pos)
+        return sorted(found)
+
+    def unmatched(self,hits):
+        """(kind, text) of the name, id and launch filters not in hits"""
+        return [f for i,f in enumerate(self.filters) if i not in hits]
+
+_mu_earth=398600.4418 # km^3/s^2
+_r_earth=6378.135 # km (equatorial radius, as used for the SATCAT heights)
+
+def peri_apo_from_mm_ecc(mm,ecc):
+    """Perigee and apogee height (km) from mean motion (revs/day) and
+    eccentricity"""
+    n=mm*2*pi/86400.
+    a=pow(_mu_earth/(n*n),1/3.)
+    return a*(1-ecc)-_r_earth, a*(1+ecc)-_r_earth
+
+def orbit_parameters(mm,ecc):
+    """Semi-major axis (km), perigee and apogee height (km) and period (min)
+    as arrays for arrays of mean motion (revs/day) and eccentricity"""
+    import numpy as np
+    mm=np.asarray(mm,dtype=float)
+    ecc=np.asarray(ecc,dtype=float)
+    with np.errstate(divide="ignore",invalid="ignore"):
+        n=mm*(2*pi/86400.)
+        a=np.power(_mu_earth/(n*n),1/3.)
+        return a, a*(1-ecc)-_r_earth, a*(1+ecc)-_r_earth, 1440./mm
+
+_tle_html=None
+
+def _tle_html_class():
+    """The TLE_HTML class, html.parser is only imported on first use"""
+    global _tle_html
+    if _tle_html is not None:
+        return _tle_html
+    from html.parser import HTMLParser
+
+    class TLE_HTML(HTMLParser):
+        """Collects the text in the <pre> elements of a TLE.pl answer"""
+        def __init__(self,*args,**kwargs):
+            self.read_tle_data=False
+            self.tle_data=[]
+            HTMLParser.__init__(self,*args,**kwargs)
+        def handle_starttag(self, tag, attr):
+            if tag=="pre":
+                self.read_tle_data=True
+        def handle_endtag(self, tag):
+            if tag=="pre":
+                self.read_tle_data=False
+        def handle_data(self, data):
+            if getattr(self,"read_tle_data",False):
+                self.tle_data.append(data)
+
+    TLE_HTML.__qualname__="TLE_HTML"
+    _tle_html=TLE_HTML
+    return _tle_html
+
+def __getattr__(name):
+    # classes built on modules imported lazily
+    if name=="TLE_HTML":
+        return _tle_html_class()
+    raise AttributeError("module "+__name__+" has no attribute "+name)
+
+def tle_dict(t):
+    """A tle as dict for JSON (epoch as ISO 8601 UTC)"""
+    lines=bytes(t).decode("ascii").split("\r\n")
+    return {"name":t.name, "id":t.id, "desig":_tle_desig(t),
+            "epoch":_omm_iso_epoch(t)+"Z", "line1":lines[1], "line2":lines[2]}
+
+@contextlib.contextmanager
+def atomic_file(fn):
+    """Context manager giving a binary file which replaces fn at once when
+    the block ends without an error (it is written to a temporary file in
+    the same directory, which is removed otherwise)"""
+    tfn=os.path.join(os.path.dirname(fn),"."+os.path.basename(fn)+"."+\
+            str(os.getpid())+".tmp")
+    try:
+        with open(tfn,"wb") as of:
+            yield of
+        os.replace(tfn,fn)
+    except BaseException:
+        try:
+            os.remove(tfn)
+        except OSError:
+            pass
+        raise
+
+def write_tles_file(tles,fn,fmt="tle"):
+    """Write tles (any iterable, streamed in batches) to a file atomically as
+    TLE text or OMM ("csv" or "json")"""
+    with atomic_file(fn) as of:
+        if fmt=="tle":
+            write_tles(tles,of)
+        else:
+            write_omm(tles,of,fmt)
+
+def tle_keys(tles):
+    """Dict of (epoch timestamp, element set number) by NORAD ID of tles, what
+    decides whether an output file changed"""
+    return {t.id:(t.epoch_timestamp(),t.nr) for t in tles}
+
+def tle_delta(old,tles):
+    """Changes from an output file with the tle_keys old to tles: (added and
+    updated tles, NORAD IDs of removed objects)"""
+    added=[]
+    updated=[]
+    for t in tles:
+        k=old.get(t.id)
+        if k is None:
+            added.append(t)
+        elif k!=(t.epoch_timestamp(),t.nr):
+            updated.append(t)
+    ids=set(t.id for t in tles)
+    return added,updated,[i for i in old if i not in ids]
+
+def write_delta_file(added,updated,removed,fn):
+    """Write the changes of an output file as JSON atomically: "added" and
+    "updated" as lists of tle_dict, "removed" as list of NORAD IDs"""
+    import json
+    with atomic_file(fn) as df:
+        df.write(json.dumps({"time":time.strftime("%Y-%m-%dT%H:%M:%SZ",
+                time.gmtime()), "added":[tle_dict(t) for t in added],
+                "updated":[tle_dict(t) for t in updated],
+                "removed":removed},indent=1).encode("utf-8"))
+
+class UpdateError(Exception):
+    """Error which aborts an update run"""
+
+@contextlib.contextmanager
+def _message_options(verbose,quiet):
+    """Apply the verbose and quiet options to the messages of the module
+    within a block (the previous ones are restored afterwards)"""
+    global _verbose, _quiet
+    previous=_verbose,_quiet
+    _verbose,_quiet=verbose,quiet
+    try:
+        yield
+    finally:
+        _verbose,_quiet=previous
+
+def _updater_messages(method):
+    """Decorator of TleUpdater methods applying the verbose and quiet options
+    of the updater while the method runs"""
+    @functools.wraps(method)
+    def wrapper(self,*args,**kwargs):
+        with _message_options(self.ns.verbose,self.ns.quiet):
+            return method(self,*args,**kwargs)
+    return wrapper
+
+class TleUpdater:
+    """The update pipeline with its state (command line options as parsed by
+    argparse)
+
+    The filter, the user tles, the SATCAT and the downloaded tles are kept
+    between runs, the filter and user tle files are only read again if their
+    modification time changed, the SATCAT only after satcat_interval hours and
+    all selected tles are downloaded again after tle_interval hours (objects
+    newly selected in between are downloaded in the next run).
+
+    run() loads the sources, selects the objects to download (select),
+    fetches them (fetch) and merges them with the user tles; the stages can
+    be used on their own too. The verbose and quiet options apply to the
+    messages of the module while the methods of the updater run."""
+    def __init__(self,ns):
+        self.ns=ns
+        self.flt=TleFilter()
+        self.filter_mtime=None
+        self.user=[]
+        self.user_mtime=None
+        self._seen={} # file -> mtime (None if missing) at the last read attempt
+        self.satcat=None
+        self.satcat_time=None
+        self._satcat_src=None
+        self._satcat_flt=None # filter the SATCAT was reduced with while reading
+        self._replaced=[] # replaced catalogues not closed yet
+        self.keep_replaced=False # keep them open until close_replaced()
+        self.known={}
+        self.tle_time=None
+        self.timings={}
+        self.cache=None
+        self.fetcher=None
+        self.archive=None
+        self.output=None # (tle_keys, format, mtime, size) of the output file
+        if not ns.no_online:
+            self._open()
+
+    @_updater_messages
+    def _open(self):
+        """Open the archive, the cache and the fetcher (online runs)"""
+        ns=self.ns
+        if ns.archive is not None:
+            try:
+                self.archive=TleArchive(ns.archive)
+            except (IOError,ValueError) as e:
+                raise UpdateError("Failed to open archive "+ns.archive+"! ("+\
+                        str(e)+")")
+        if ns.cache_dir is not None:
+            try:
+                self.cache=HttpCache(ns.cache_dir,ns.cache_max_age,
+                        int(ns.cache_size*2**20))
+            except IOError as ioe:
+                if not _quiet:
+                    print("WARNING: Failed to open cache "+ns.cache_dir+\
+                            "! Not caching! ("+str(ioe)+")",file=sys.stderr)
+        elif ns.offline:
+            raise UpdateError("Offline mode requires a cache directory!")
+        self.fetcher=Fetcher(ns.max_connections,ns.rate,ns.retries,
+                cache=self.cache,offline=ns.offline)
+
+    def close(self):
+        if self.fetcher is not None:
+            self.fetcher.close()
+        if self.archive is not None:
+            self.archive.close()
+        self._replace_satcat(None)
+        self.close_replaced()
+
+    def _replace_satcat(self,sc):
+        """Replace the catalogue, the previous one is closed (unless
+        keep_replaced is set, like when it may still be queried through a
+        TleService it was published to)"""
+        if self.satcat is not None and self.satcat is not sc:
+            self._replaced.append(self.satcat)
+        self.satcat=sc
+        if not self.keep_replaced:
+            self.close_replaced()
+
+    def close_replaced(self):
+        """Close the catalogues replaced since the last call"""
+        for sc in self._replaced:
+            sc.close()
+        self._replaced=[]
 
-def parse_tle_bytes(f):
-    """Read TLEs from multible byte lines"""
-    lines=f.splitlines()
+    def _mtime(self,fn):
+        try:
+            return os.stat(fn).st_mtime
+        except OSError:
+            return None
 
-    tles=[]
-    ctle=None
-    state="none"
-    for l in lines:
-        m_name=re.fullmatch(b"^\s*((\S.*)?\S)\s*$",l)
-        m_line1=re.fullmatch("^\s*(1)\s+(\d{1,5})(\w)\s+"\
-                "(\d{2})(\d{3})(\w{0,3})\s+(\d{2})(\s{0,2}\d{1,3}\.\d{8})\s+"\
-                "([-+ 0]\.\d{8})\s+([-+ ]\d{5}[-+]\d)\s+([-+ ]\d{5}[-+]\d)\s+"\
-                "(0)\s+(\d{1,4})(\d)\s*$",l.decode("ascii"))
-        m_line2=re.fullmatch("^\s*(2)\s+(\d{1,5})\s+"\
-                "(\d{1,3}\.\d{4})\s+(\d{1,3}\.\d{4})\s+(\d{1,7})\s+"\
-                "(\d{1,3}\.\d{4})\s+(\d{1,3}\.\d{4})\s+"\
-                "(\d{1,2}\.\d{8})(\s*\d{1,5})(\d)\s*$",l.decode("ascii"))
-        if (state=="name" and m_line1 is None) or (state=="line1" and m_line2 is None):
+    def _changed(self,fn):
+        """Whether a file changed since it was last read (or tried to, so a
+        missing or unreadable file is only tried again once it changes)"""
+        return fn not in self._seen or self._mtime(fn)!=self._seen[fn]
+
+    def due(self,now=None):
+        """Whether a source changed or is due to be refreshed"""
+        ns=self.ns
+        now=time.time() if now is None else now
+        if ns.filter is not None and self._changed(ns.filter):
+            return True
+        if ns.user_tles is not None and self._changed(ns.user_tles):
+            return True
+        if ns.no_online:
+            return False
+        return self.satcat_time is None or \
+                now-self.satcat_time>=ns.satcat_interval*3600. or \
+                self.tle_time is None or now-self.tle_time>=ns.tle_interval*3600.
+
+    @_updater_messages
+    def load_filter(self):
+        """Read the filter file if it changed, whether it was read (raises
+        IOError or UpdateError)"""
+        ns=self.ns
+        self._seen[ns.filter]=self._mtime(ns.filter)
+        mtime=os.stat(ns.filter).st_mtime
+        if mtime==self.filter_mtime:
+            return False
+        if _verbose:
+            print("Loading filter list from "+ns.filter+" ...",file=sys.stderr)
+        with open(ns.filter,"rt") as ff:
+            flt=TleFilter.parse(ff)
+        if len(flt)==0:
+            raise UpdateError("Filter list contains no valid filters!")
+        self.flt=flt
+        self.filter_mtime=mtime
+        if self._satcat_flt is not None:
+    # the catalogue only holds the entries matching the previous filter
+            self._replace_satcat(None)
+            self._satcat_src=None
+            self._satcat_flt=None
+        if _verbose:
+            print("Filter list successfull loaded. \n"+str(flt),file=sys.stderr)
+        return True
+
+    def _read_tles(self,f):
+        """Index of the tles of a file (TLE text or OMM CSV or JSON) by NORAD
+        ID (newest epoch); the file is mapped and streamed into the index, so
+        only one tle per object is kept in memory (unless parsed by several
+        processes or JSON)"""
+        ns=self.ns
+        mf=map_file(f)
+        try:
+            if ns.parse_workers!=1 and elements_format(mf)=="tle":
+                return index_tles(parse_tle_bytes(f,ns.strict,ns.parse_workers))
+            with stats.timer("tle_parse"):
+                return index_tles(iter_elements(mf,ns.strict))
+        finally:
+            if isinstance(mf,mmap.mmap):
+                mf.close()
+
+    @_updater_messages
+    def load_user_tles(self):
+        """Read the user tles if the file changed, whether it was read"""
+        ns=self.ns
+        if ns.user_tles is None:
+            if _verbose:
+                print("No file given for user tles. Skipping",file=sys.stderr)
+            return False
+        self._seen[ns.user_tles]=self._mtime(ns.user_tles)
+        try:
+            mtime=os.stat(ns.user_tles).st_mtime
+            if mtime==self.user_mtime:
+                return False
+            with open(ns.user_tles,"rb") as uf:
+                if _verbose:
+                    print("Reading user defined TLEs ...",file=sys.stderr)
+                self.user=list(self._read_tles(uf).values())
+            if _verbose:
+                print("Done reading user TLEs ("+str(len(self.user))+\
+                        " objects found)",file=sys.stderr)
+            self.user_mtime=mtime
+            return True
+        except (IOError,ValueError) as e:
             if not _quiet:
-                print("WARNING: Non consecutive TLE line ("+str(l)+\
-                        "), discards partial TLE (\""+str(ctle.name)+"\":"+\
-                        str(ctle.id)+")",file=sys.stderr)
-            ctle=None
-            state="none"
-
-        if state=="line1" and m_line2 is not None:
-                cksum=int(m_line2.group(10))
-                nsum=0
-                for c in l.strip(b" \r\n\t")[:-1].decode("ascii"):
-                    if c.isdigit():
-                        nsum+=int(c)
-                    elif c=="-":
-                        nsum+=1
-                nsum%=10
-                ctle.line2valid=cksum==nsum
-                if ((not _quiet) and (cksum!=nsum)):
-                    print("WARNING: checksum did not match [check(\""+\
-                            l.strip(b" \r\n\t").decode("ascii")+"\")="+\
-                            str(nsum)+"!="+str(cksum)+"]",file=sys.stderr)
-                newid=int(m_line2.group(2))
-                if newid!=ctle.id:
+                print("ERROR: Failed to read file "+ns.user_tles+"! Skipping! ("+\
+                        str(e)+")",file=sys.stderr)
+            return False
+
+    def _output_keys(self):
+        """tle_keys and format of the output file (None if it is missing),
+        read from the file only if it is not as written last"""
+        ns=self.ns
+        try:
+            st=os.stat(ns.output)
+        except OSError:
+            return None
+        if self.output is not None and self.output[2:]==(st.st_mtime_ns,
+                st.st_size):
+            return self.output[:2]
+        with open(ns.output,"rb") as pf:
+            mf=map_file(pf)
+            try:
+                fmt=elements_format(mf)
+                return tle_keys(iter_elements(mf)),fmt
+            finally:
+                if isinstance(mf,mmap.mmap):
+                    mf.close()
+
+    @_updater_messages
+    def write_output(self,tles):
+        """Write the tles to the output file (and the changes to the delta
+        file) unless it holds the same objects and epochs already, whether it
+        was written (raises IOError)"""
+        ns=self.ns
+        # TLEs only have 5 digits for the NORAD ID
+        if ns.format=="tle" and any(t.id>99999 for t in tles):
+            if not _quiet:
+                print("WARNING: Leaving out objects with a NORAD ID above "\
+                        "99999, use --format csv or json for them!",
+                        file=sys.stderr)
+            tles=[t for t in tles if t.id<=99999]
+        keys=tle_keys(tles)
+        try:
+            prev=self._output_keys()
+        except (IOError,ValueError) as e:
+            if _verbose:
+                print("Not comparing with the previous output ("+str(e)+")",
+                        file=sys.stderr)
+            prev=None
+        if prev==(keys,ns.format):
+            if _verbose:
+                print("Output unchanged, not rewriting "+ns.output,
+                        file=sys.stderr)
+            return False
+        if _verbose:
+            print("Writing "+str(len(tles))+" TLEs to "+ns.output+" ...",
+                    file=sys.stderr)
+        write_tles_file(tles,ns.output,ns.format)
+        st=os.stat(ns.output)
+        self.output=(keys,ns.format,st.st_mtime_ns,st.st_size)
+        if ns.delta is not None:
+            added,updated,removed=tle_delta(prev[0] if prev is not None else {},
+                    tles)
+            try:
+                write_delta_file(added,updated,removed,ns.delta)
+            except IOError as ioe:
+                if not _quiet:
+                    print("WARNING: Failed to write delta file "+ns.delta+"! ("+\
+                            str(ioe)+")",file=sys.stderr)
+            if _verbose:
+                print("Delta: "+str(len(added))+" added, "+str(len(updated))+\
+                        " updated, "+str(len(removed))+" removed",
+                        file=sys.stderr)
+        if _verbose:
+            print("Done writing!",file=sys.stderr)
+        return True
+
+    @_updater_messages
+    def load_previous(self):
+        """Read the tles of the previous output file (incremental mode)"""
+        ns=self.ns
+        try:
+            with open(ns.output,"rb") as pf:
+                if _verbose:
+                    print("Reading previous TLEs from "+ns.output+" ...",
+                            file=sys.stderr)
+                self.known=self._read_tles(pf)
+            if _verbose:
+                print("Done reading previous TLEs ("+str(len(self.known))+\
+                        " objects found)",file=sys.stderr)
+        except FileNotFoundError:
+            if _verbose:
+                print("No previous output file. Downloading all TLEs",
+                        file=sys.stderr)
+        except (IOError,ValueError) as e:
+            if not _quiet:
+                print("WARNING: Failed to read file "+ns.output+"! Downloading "\
+                        "all TLEs! ("+str(e)+")",file=sys.stderr)
+
+    @_updater_messages
+    def load_satcat(self,now):
+        """Download the SATCAT if it is due, whether it changed"""
+        ns=self.ns
+        if self.satcat is not None and \
+                now-self.satcat_time<ns.satcat_interval*3600.:
+            return False
+        if _verbose:
+            print("Reading SATCAT ...",file=sys.stderr)
+    # cached copies are mapped, not read
+        with stats.timer("satcat_download"):
+            bodies=self.fetcher.get_all([ns.source_url+"/pub/satcat-annex.txt",
+                    ns.source_url+"/pub/satcat.txt"],mapped=True)
+        try:
+            for body in bodies:
+                if isinstance(body,IOError):
+                    if self.satcat is None:
+                        raise UpdateError("Failed to read SATCAT! ("+str(body)+")")
                     if not _quiet:
-                        print("ERROR: unexpeced id in second line, skipping!",
-                                file=sys.stderr)
-                    ctle=None
-                    state="none"
-                    continue
-                ctle.inc=float(m_line2.group(3))
-                ctle.raan=float(m_line2.group(4))
-                ctle.ecc=float("0."+m_line2.group(5))
-                ctle.aop=float(m_line2.group(6))
-                ctle.ma=float(m_line2.group(7))
-                ctle.mm=float(m_line2.group(8))
-                ctle.revol=int(m_line2.group(9))
-                tles.append(copy.deepcopy(ctle))
+                        print("WARNING: Failed to read SATCAT! Using the "\
+                                "previous one! ("+str(body)+")",file=sys.stderr)
+    # tried again after satcat_interval, like after a successful download
+                    self.satcat_time=now
+                    return False
+            scabody,scbody=bodies
+            self.satcat_time=now
+            shash=satcat_hash(scbody,scabody)
+            if self._satcat_src==shash:
+                return False
+# read in satellite catalog (discard decayed satellites; single runs without
+# a snapshot only keep the entries matching the filter)
+            flt=self.flt if self.cache is None and not ns.daemon else None
+            with stats.timer("satcat_parse"):
+                self._replace_satcat(load_satcat(scbody,scabody,os.path.join(
+                        ns.cache_dir,"satcat.snapshot") if self.cache is not None \
+                        else None,flt))
+            self._satcat_src=shash
+            self._satcat_flt=flt
+        finally:
+            for body in bodies:
+                if isinstance(body,mmap.mmap):
+                    body.close()
+        if _verbose:
+            print("SATCAT loaded; "+str(len(self.satcat))+" not decayed "\
+                    "satellites "+("matching the filters " if flt is not None \
+                    else "")+"found!",file=sys.stderr)
+        return True
+
+    def _lap(self,phase,t):
+        now=time.perf_counter()
+        self.timings[phase]=self.timings.get(phase,0.)+now-t
+        stats.add_time(phase,now-t)
+        return now
+
+    @_updater_messages
+    def run(self):
+        """Update once, returns the list of tles (raises UpdateError)"""
+        ns=self.ns
+        now=time.time()
+        self.timings={}
+        t=time.perf_counter()
+        if ns.filter is not None:
+            try:
+                self.load_filter()
+            except (IOError,UpdateError) as e:
+                if self.filter_mtime is None:
+                    raise
+                if not _quiet:
+                    print("WARNING: Failed to reload filter list "+ns.filter+\
+                            "! Using the previous one! ("+str(e)+")",file=sys.stderr)
+        self.load_user_tles()
+        tles=self.user
+        t=self._lap("load",t)
+
+# filter user tles (if forced)
+        if ns.force_user_filtering:
+            if _verbose:
+                print("Filtering user supplied TLEs ...",file=sys.stderr)
+            tles=self.flt.select_tles(self.user,now=now)
+            if _verbose:
+                print("Done filtering user supplied TLEs ("+str(len(tles))+\
+                        "/"+str(len(self.user))+" selected)",file=sys.stderr)
+        t=self._lap("filter",t)
+        if ns.no_online:
+            return tles
+
+# load online tles
+        if _verbose:
+            print("Fetching online TLEs ...",file=sys.stderr)
+        self.load_satcat(now)
+        t=self._lap("satcat",t)
+        entries=self.select(tles,now)
+        t=self._lap("select",t)
+        dltles=self.fetch(entries,now,set(ut.id for ut in tles))
+        t=self._lap("download",t)
+
+# merge user and downloaded tles
+        otlecnt=len(tles)+len(dltles)
+        tles=merge_tles(tles,dltles,prefer_first=ns.merge=="user")
+        if _verbose:
+            print("Merged TLEs ("+str(otlecnt-len(tles))+" duplicates removed)",
+                    file=sys.stderr)
+        self._lap("merge",t)
+        return tles
+
+    @_updater_messages
+    def select(self,tles,now=None):
+        """SATCAT entries of the objects to download for the filter, one per
+        object (user tles satisfy the filters they match and their objects
+        are left out, unless merging by epoch); filters without any match
+        are reported"""
+        ns=self.ns
+        flt=self.flt
+        if _verbose:
+            print("Compiling list of TLEs to download...",file=sys.stderr)
+        hits=set()
+        usids=set(ut.id for ut in tles)
+        if ns.merge=="user":
+            flt.select_tles(tles,hits,now)
+        entries=list({scent["nid"]:scent for scent in flt.select(self.satcat,hits)
+                if ns.merge!="user" or scent["nid"] not in usids}.values())
+        if not _quiet:
+            for kind, text in flt.unmatched(hits):
+                print("WARNING: No entry found for \""+kind+"\" filter \""+\
+                        text+"\"!",file=sys.stderr)
+        if _verbose:
+            print("Added",len(entries),"IDs from filters",file=sys.stderr)
+        return entries
+
+    @_updater_messages
+    def fetch(self,entries,now=None,user_ids=()):
+        """tles of SATCAT entries (as returned by select): tles downloaded
+        before are kept until all are due again (in incremental mode only the
+        ones with a recent epoch), the others come from the bulk files or are
+        downloaded per ID; new tles are archived and altitude candidates not
+        reaching the altitudes are left out (user_ids, the objects of the
+        user tles, only count for the incremental report)"""
+        ns=self.ns
+        flt=self.flt
+        now=time.time() if now is None else now
+        dlids=[scent["nid"] for scent in entries]
+        refresh=self.tle_time is None or now-self.tle_time>=ns.tle_interval*3600.
+        stale=now-ns.max_epoch_age*3600.
+        kept={dlid:self.known[dlid] for dlid in dlids if dlid in self.known and \
+                (not refresh or (ns.incremental and \
+                self.known[dlid].epoch_timestamp()>=stale))}
+        if _verbose and len(kept)>0:
+            print("Keeping",len(kept),"previously downloaded TLEs",
+                    file=sys.stderr)
+    # how many objects to download
+        if len(dlids)==0 and not _quiet:
+            print("WARNING: No IDs to download!",file=sys.stderr)
+        elif _verbose:
+            print(len(dlids)-len(kept)," TLEs to download...",file=sys.stderr)
+
+# downloading TLEs
+        dltles=[]
+        fetchids=set(dlid for dlid in dlids if dlid not in kept)
+        bulk={}
+        if len(ns.bulk)>0 and len(fetchids)>0:
+            with stats.timer("bulk_download"):
+                bulk=fetch_bulk_tles([b if "://" in b else ns.source_url+\
+                        "/NORAD/elements/"+b+".txt" for b in ns.bulk],fetchids,
+                        ns.strict,self.fetcher,ns.parse_workers)
+            if _verbose:
+                print("Found",len(bulk),"of",len(fetchids),"TLEs in bulk data",
+                        file=sys.stderr)
+
+        missing=list(dict.fromkeys(dlid for dlid in dlids
+                if dlid not in bulk and dlid not in kept))
+        with stats.timer("tle_download"):
+            bodies=dict(zip(missing,self.fetcher.get_all([ns.source_url+\
+                    "/cgi-bin/TLE.pl?CATNR="+str(dlid) for dlid in missing])))
+
+        fetched=0
+        for dlid, dlentry in zip(dlids,entries):
+            if dlid in kept:
+                dltles.append(kept[dlid])
+                continue
+            fetched+=1
+            if dlid in bulk:
+                dltles.append(bulk[dlid])
+                continue
+            ts=None
+            if isinstance(bodies[dlid],IOError):
+                if not _quiet:
+                    print("ERROR: "+str(bodies[dlid]),file=sys.stderr)
+            else:
+                tp=_tle_html_class()()
+                tp.feed(bodies[dlid].decode())
+                ts=parse_tle_bytes("".join(tp.tle_data).lstrip().encode("ascii"),
+                        ns.strict)
+            if ts is not None and len(ts)>0:
+                dltles.extend(ts)
+            elif dlid in self.known:
+    # keep the stale tle rather than losing the object
+                fetched-=1
+                kept[dlid]=self.known[dlid]
+                dltles.append(self.known[dlid])
+            elif not _quiet:
+                print("WARNING: No TLE found for \""+str(dlentry["names"][0])+"\":"+\
+                        str(dlid)+" (Note: Orbit comment: \""+str(dlentry["raw"]\
+                        ["orbc"])+"\")!",file=sys.stderr)
+        if _verbose:
+            print("Downloaded",len(dltles)-len(kept),file=sys.stderr)
+        if ns.incremental and not _quiet:
+            print("Incremental update: "+str(fetched)+" fetched, "+\
+                    str(len(kept))+" kept, "+str(len(set(self.known)-set(dlids)-\
+                    set(user_ids)))+" dropped",file=sys.stderr)
+        stats.count("objects_selected",len(dlids))
+        stats.count("tles_fetched",fetched)
+        stats.count("tles_kept",len(kept))
+        if refresh:
+            self.tle_time=now
+        if self.archive is not None:
+            try:
+                with stats.timer("archive"):
+                    added=self.archive.add(dt for dt in dltles
+                            if kept.get(dt.id) is not dt)
+                stats.count("tles_archived",added)
                 if _verbose:
-                    print("Successfully read in TLE for \""+ctle.name+"\": "+str(ctle.id),
+                    print("Archived",added,"new TLEs",file=sys.stderr)
+            except IOError as ioe:
+                if not _quiet:
+                    print("WARNING: Failed to append to archive "+ns.archive+\
+                            "! ("+str(ioe)+")",file=sys.stderr)
+        self.known=index_tles(dltles)
+    # the SATCAT only gives the candidates of altitude filters, keep the tles
+    # that reach one (or match another filter)
+        if flt.altitudes and len(dltles)>0:
+            ids={e["nid"] for e in flt.select(Satcat(entries),altitudes=False)}
+            ids.update(dltles[i].id for i in
+                    flt.altitude_mask(dltles,now).nonzero()[0].tolist())
+            dltles=[dt for dt in dltles if dt.id in ids]
+            if _verbose:
+                print(str(len(dltles))+" TLEs in the altitude ranges",
                         file=sys.stderr)
-                ctle=None
-                state="none"
-        elif state=="name" and m_line1 is not None:
-                cksum=int(m_line1.group(14))
-                nsum=0
-                for c in l.strip(b" \r\n\t")[:-1].decode("ascii"):
-                    if c.isdigit():
-                        nsum+=int(c)
-                    elif c=="-":
-                        nsum+=1
-                nsum%=10
-                ctle.line1valid=cksum==nsum
-                if ((not _quiet) and (cksum!=nsum)):
-                    print("WARNING: checksum did not match [check(\""+\
-                            l.strip(b" \r\n\t").decode("ascii")+"\")="+\
-                            str(nsum)+"!="+str(cksum)+"]",file=sys.stderr)
-                ctle.id=int(m_line1.group(2))
-                ctle.desig["year"]=int(m_line1.group(4))
-                ctle.desig["launch"]=int(m_line1.group(5))
-                ctle.desig["object"]=m_line1.group(6)
-                ctle.epoch["year"]=int(m_line1.group(7))
-                ctle.epoch["day"]=float(m_line1.group(8))
-                fdmm_str=m_line1.group(9)
-                ctle.fdmm=float(fdmm_str[0]+"0"+fdmm_str[1:])
-                sdmm_str=m_line1.group(10)
-                ctle.sdmm=float(sdmm_str[0]+"0."+sdmm_str[1:6]+"e"+sdmm_str[6:])
-                bstar_str=m_line1.group(11)
-                ctle.bstar=float(bstar_str[0]+"0."+bstar_str[1:6]+"e"+bstar_str[6:])
-                ctle.nr=int(m_line1.group(13))
-                state="line1"
-        elif state=="none" and m_name is not None:
-                ctle=tle()
-                ctle.name=m_name.group(1).decode("ascii")
-                state="name"
-    return tles
+        return dltles
 
-def peri_apo_from_mm_ecc(mm,ecc):
-    mu_e=3.986004418e+14
-    r_e=6.371e+3
-    a=pow(mu_e/(mm*mm),1/3.)
-    return a*(1-ecc)-r_e, a*(1+ecc)-r_e
+class TleService:
+    """Local HTTP service answering filter queries on the loaded tles
 
-if __name__=="__main__":
+    GET /tles?q=<filter>&q=<filter>... returns the tles matching any of the
+    filters (in the filter file syntax, all tles without q) as TLE text or
+    with format=json as a JSON list. Names, ids and launches are matched with
+    the SATCAT (if published) as well as with the tles themselves. Invalid
+    filters are answered with 400 and their messages as text. Responses are
+    cached per query until new data is published (except for altitude
+    filters, which depend on the time)."""
+    max_cached=256
+
+    def __init__(self,host="127.0.0.1",port=0):
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+        from urllib.parse import urlsplit, parse_qs
+        self._lock=threading.Lock()
+        self._data=([],None)
+        self._cache={}
+        service=self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version="HTTP/1.1"
+            def log_message(self,fmt,*args):
+                if _verbose:
+                    print("Service: "+(fmt % args),file=sys.stderr)
+            def do_GET(self):
+                u=urlsplit(self.path)
+                q=parse_qs(u.query)
+                fmt=q.get("format",["txt"])[-1]
+                if u.path!="/tles":
+                    self.send_error(404)
+                elif fmt not in ("txt","json"):
+                    self.send_error(400,"Unknown format")
+                else:
+                    try:
+                        self.send_body(200,*service.query(q.get("q",[]),fmt))
+                    except ValueError as ve:
+                        self.send_body(400,"text/plain; charset=utf-8",
+                                (str(ve)+"\n").encode("utf-8"))
+            def send_body(self,code,ctype,body):
+                self.send_response(code)
+                self.send_header("Content-Type",ctype)
+                self.send_header("Content-Length",str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server=ThreadingHTTPServer((host,port),Handler)
+        self.server.daemon_threads=True
+        self.url="http://%s:%d" % self.server.server_address[:2]
+        self._thread=None
+
+    def start(self):
+        """Serve on a background thread"""
+        self._thread=threading.Thread(target=self.server.serve_forever,
+                daemon=True)
+        self._thread.start()
+
+    def close(self):
+        if self._thread is not None:
+            self.server.shutdown()
+        self.server.server_close()
+
+    def publish(self,tles,satcat=None):
+        """Replace the data queries are answered from"""
+        with self._lock:
+            self._data=(list(tles),satcat)
+            self._cache={}
+
+    def query(self,lines,fmt="txt"):
+        """(content type, body) of the tles matching the filter lines (raises
+        ValueError with the messages of invalid filters or if there is no
+        valid filter)"""
+        import json
+        key=(tuple(lines),fmt)
+        with self._lock:
+            data=self._data
+            resp=self._cache.get(key)
+        if resp is not None:
+            return resp
+        tles,satcat=data
+        cache=True
+        if len(lines)>0:
+            errors=[]
+            flt=TleFilter.parse(lines,errors)
+            if errors:
+                raise ValueError("\n".join(errors))
+            if len(flt)==0:
+                raise ValueError("No valid filter")
+            cache=not flt.altitudes
+            ids=set(t.id for t in flt.select_tles(tles))
+            if satcat is not None:
+                ids.update(e["nid"] for e in flt.select(satcat,altitudes=False))
+            tles=[t for t in tles if t.id in ids]
+        if fmt=="json":
+            resp=("application/json",json.dumps([tle_dict(t) for t in tles])\
+                    .encode("utf-8"))
+        else:
+            bf=io.BytesIO()
+            write_tles(tles,bf)
+            resp=("text/plain; charset=ascii",bf.getvalue())
+        with self._lock:
+            if cache and self._data is data:
+                if len(self._cache)>=self.max_cached:
+                    self._cache.clear()
+                self._cache[key]=resp
+        return resp
+
+def write_run_stats(fmt="json",fn=None,**extra):
+    """Write the stats of the run (and extra values) as text or JSON to a file
+    (replaced at once) or stderr"""
+    import json
+    if fmt=="json":
+        d=dict(extra)
+        d.update(stats.as_dict())
+        text=json.dumps(d,indent=1,sort_keys=True)+"\n"
+    else:
+        text="".join("%-24s %s\n" % i for i in sorted(extra.items()))+\
+                str(stats)+"\n"
+    if fn is None:
+        sys.stderr.write(text)
+        return
+    tfn=fn+"."+str(os.getpid())+".tmp"
+    with open(tfn,"wt") as sf:
+        sf.write(text)
+    os.replace(tfn,fn)
+
+def start_profile(kind):
+    """Start profiling ("cpu" with cProfile, "memory" with tracemalloc)"""
+    if kind=="cpu":
+        import cProfile
+        prof=cProfile.Profile()
+        prof.enable()
+        return prof
+    import tracemalloc
+    tracemalloc.start()
+    return tracemalloc
+
+def stop_profile(kind,prof,fn=None,top=30):
+    """Stop profiling and report the top entries to stderr, or for cpu
+    profiles write the pstats data to a file"""
+    if kind=="cpu":
+        import pstats
+        prof.disable()
+        if fn is not None:
+            prof.dump_stats(fn)
+        else:
+            pstats.Stats(prof,stream=sys.stderr).sort_stats("cumulative")\
+                    .print_stats(top)
+        return
+    snap=prof.take_snapshot()
+    cur,peak=prof.get_traced_memory()
+    prof.stop()
+    lines=["Peak traced memory: %.1f MiB (%.1f MiB still allocated)" % \
+            (peak/2**20,cur/2**20)]
+    lines.extend(str(st) for st in snap.statistics("lineno")[:top])
+    if fn is not None:
+        with open(fn,"wt") as pf:
+            pf.write("\n".join(lines)+"\n")
+    else:
+        print("\n".join(lines),file=sys.stderr)
+
+def arg_parser():
+    """The command line parser (its defaults are the defaults of options)"""
     import argparse
     ap=argparse.ArgumentParser(description=__doc__,add_help=False)
     ap.add_argument("--help",action="help",help="Print this help message")
@@ -194,75 +3217,149 @@ if __name__=="__main__":
                     "(if none is specified then online loading is disabled)")
     ap.add_argument("--output","-o",action="store",default="tles.txt",
             help="specify the output file (default is \"tles.txt\")")
+    ap.add_argument("--format",action="store",choices=("tle","csv","json"),
+            default="tle",
+            help="format of the output file: TLE text or OMM as CSV or JSON "\
+                    "(like celestrak's FORMAT=csv/json; OMM also holds NORAD IDs "\
+                    "above 99999; default is \"tle\")")
+    ap.add_argument("--delta",action="store",type=str,default=None,
+            help="whenever the output file is written, also write the added, "\
+                    "updated and removed objects to this file as JSON (the "\
+                    "output is only rewritten if an object or epoch changed)")
     ap.add_argument("--user-tles","-u",action="store",type=str,default=None,
-            help="specify the list of manual tles, which will always be included")
+            help="specify the list of manual tles, which will always be "\
+                    "included (TLE text or OMM CSV or JSON)")
     ap.add_argument("--no-online","-n",action="store_true",
             help="disable reading online tles, only use user defined tles")
     ap.add_argument("--force-user-filtering",action="store_true",
             help="force the user tles to be filtered by the filter as well")
+    ap.add_argument("--bulk","-b",action="append",default=[],metavar="GROUP",
+            help="fetch the selected TLEs from a whole TLE file (a celestrak "\
+                    "group name like \"active\" or an URL) and only fetch TLEs "\
+                    "missing there one by one (can be given multiple times)")
+    ap.add_argument("--source-url",action="store",
+            default="http://www.celestrak.com",
+            help="base URL of the SATCAT and TLE sources (default is "\
+                    "\"http://www.celestrak.com\")")
+    ap.add_argument("--max-connections",action="store",type=int,default=4,
+            help="maximum number of concurrent requests (default is 4)")
+    ap.add_argument("--rate",action="store",type=float,default=5.,
+            help="maximum number of requests started per second, 0 for no "\
+                    "limit (default is 5)")
+    ap.add_argument("--retries",action="store",type=int,default=3,
+            help="number of retries of a failed request (default is 3)")
+    ap.add_argument("--cache-dir",action="store",type=str,default=None,
+            help="keep downloaded files in this directory and only download "\
+                    "them again if they changed")
+    ap.add_argument("--cache-max-age",action="store",type=float,default=0.,
+            help="use cached files younger than this many seconds without "\
+                    "asking the server (default is 0)")
+    ap.add_argument("--cache-size",action="store",type=float,default=100.,
+            help="maximum size of the cache in MiB, least recently used files "\
+                    "are removed (default is 100)")
+    ap.add_argument("--offline",action="store_true",
+            help="only use files from the cache, never access the network")
+    ap.add_argument("--merge",action="store",choices=("user","newest"),
+            default="user",
+            help="how to handle objects with several TLEs: \"user\" always "\
+                    "uses the user tles and does not download these objects, "\
+                    "\"newest\" downloads them as well and uses the TLE with the "\
+                    "newest epoch (default is \"user\")")
+    ap.add_argument("--incremental","-i",action="store_true",
+            help="only download TLEs of objects which are not in the output "\
+                    "file yet or whose epoch there is too old, keep the others")
+    ap.add_argument("--max-epoch-age",action="store",type=float,default=24.,
+            help="age in hours of the epoch of a TLE in the output file after "\
+                    "which it is downloaded again in incremental mode (default "\
+                    "is 24)")
+    ap.add_argument("--archive",action="store",type=str,default=None,
+            help="append every downloaded TLE to this archive file (with an "\
+                    "index by NORAD ID and epoch in FILE.idx), TLEs already in "\
+                    "it are skipped")
+    ap.add_argument("--daemon","-d",action="store_true",
+            help="keep running and update the output file whenever the filter "\
+                    "or user tle file changes or a source is due to be refreshed")
+    ap.add_argument("--satcat-interval",action="store",type=float,default=24.,
+            help="hours after which the SATCAT is downloaded again in daemon "\
+                    "mode (default is 24)")
+    ap.add_argument("--tle-interval",action="store",type=float,default=4.,
+            help="hours after which the selected TLEs are downloaded again in "\
+                    "daemon mode (default is 4)")
+    ap.add_argument("--poll-interval",action="store",type=float,default=10.,
+            help="seconds between checks of the filter and user tle files in "\
+                    "daemon mode (default is 10)")
+    ap.add_argument("--serve",action="store",type=str,default=None,
+            metavar="[HOST:]PORT",
+            help="answer filter queries on the loaded tles via HTTP (GET "\
+                    "/tles?q=FILTER[&format=json]) on this port (of localhost "\
+                    "if no host is given), implies --daemon")
+    ap.add_argument("--stats",action="store",choices=("text","json"),
+            default=None,
+            help="write timers and counters of every run (download, parsing, "\
+                    "bytes fetched, checksum failures, ...) as text or JSON")
+    ap.add_argument("--stats-file",action="store",type=str,default=None,
+            help="file to write the stats to (default is stderr)")
+    ap.add_argument("--profile",action="store",choices=("cpu","memory"),
+            default=None,
+            help="profile the (first) run with cProfile or tracemalloc and "\
+                    "report the top entries")
+    ap.add_argument("--profile-file",action="store",type=str,default=None,
+            help="file to write the profile to (the pstats data for cpu "\
+                    "profiles, default is a report to stderr)")
+    ap.add_argument("--parse-workers",action="store",type=int,default=1,
+            help="parse large TLE files (user tles, bulk files) in this many "\
+                    "processes, 0 for one per CPU (default is 1)")
+    ap.add_argument("--strict",action="store_true",
+            help="only accept TLE lines in the exact fixed column layout "\
+                    "(faster, but rejects hand edited tles)")
     apvg=ap.add_mutually_exclusive_group()
     apvg.add_argument("--verbose","-v",action="store_true",
             help="print progess messages to stderr")
     apvg.add_argument("--quiet","-q",action="store_true",
             help="suppress even error and warning messages")
-    ns=ap.parse_args()
+    return ap
+
+def options(**kwargs):
+    """Options for a TleUpdater: the command line defaults, overridden by
+    keyword arguments named like the long options (e.g. user_tles)"""
+    ns=arg_parser().parse_args([])
+    for k,v in kwargs.items():
+        if not hasattr(ns,k):
+            raise TypeError("Unknown option "+k)
+        setattr(ns,k,v)
+    return ns
+
+def main(argv=None):
+    """Run TLEup with command line arguments (default sys.argv[1:])"""
+    global _verbose, _quiet
+    ns=arg_parser().parse_args(argv)
     _verbose=ns.verbose
     _quiet=ns.quiet
 
 # read filter
-    filterlist={"name":[],"id":[],"launch":[],"field":[]}
+    if ns.filter is None and ns.user_tles is None:
+        if not _quiet:
+            print("ERROR: A filter is required if no user tles are provided!",
+                    file=sys.stderr)
+        sys.exit(1)
+    elif ns.filter is None:
+        if not _quiet:
+            print("WARNING: If no filter is specified, online loading is disabled!",
+                    file=sys.stderr)
+        ns.no_online=True
+    try:
+        up=TleUpdater(ns)
+    except UpdateError as ue:
+        if not _quiet:
+            print("ERROR: "+str(ue),file=sys.stderr)
+        sys.exit(1)
     if ns.filter is not None:
-        if _verbose:
-            print("Loading filter list from "+ns.filter+" ...",file=sys.stderr)
         try:
-            with open(ns.filter,"rt") as ff:
-                for l in ff:
-                    l=l.rstrip(" \r\n")
-                    if len(l)<1 or l[0]=="#":
-                        continue
-                    elif l[0]=="?" or l[0]=="\\":
-                        if len(l[1:].strip())>0:
-                            filterlist["name"].append(l[1:])
-                        elif not _quiet:
-                            print("ERROR: An empty name is not a valid filter!",
-                                    file=sys.stderr)
-                    elif l[0]=="$":
-                        if all(c.isdigit() for c in l[1:].strip()):
-                            filterlist["id"].append(int(l[1:].strip()))
-                        elif not _quiet:
-                            print("ERROR: \""+l[1:]+"\" is not a valid NORAD "\
-                                    "ID!",file=sys.stderr)
-                    elif l[0]=="~":
-                        match=re.fullmatch("^~(\d{1,2}\d{,2}?)-?((\d{,3})"\
-                                "([a-zA-Z]{,3})?)?\s*$",l)
-                        if match is not None:
-                            filterlist["launch"].append({
-                                "year":int(match.group(1)) if match.group(1) \
-                                        is not None else None,
-                                "launch":int(match.group(3)) if match.group(3) \
-                                        is not None else None,
-                                "object":match.group(4)
-                                })
-                        elif not _quiet:
-                            print("ERROR: \""+l[1:]+"\" is not a valid launch "\
-                                    "designator!",file=sys.stderr)
-                    elif l[0]=="%":
-                        match=re.fullmatch("^%(inc|apo|peri)\s+{\s*([\d.+-eE]+)\s*,"\
-                                "\s*([\d.+-eE]+)\s*}\s*$",l)
-                        if match:
-                            filterlist["field"].append({"field":match.group(1),
-                                "min":float(match.group(2)),"max":float(match.group(3))})
-                        elif not _quiet:
-                            print("ERROR: Invalid filter \""+l+"\"",file=sys.stderr)
-                    else:
-                        filterlist["name"].append(l)
-            if not any(len(filterlist[k])>0 for k in filterlist.keys()):
-                if not _quiet:
-                    print("ERROR: Filter list contains no valid filters!",file=sys.stderr)
-                sys.exit(1)
-            if _verbose:
-                print("Filter list successfull loaded. \n"+str(filterlist),
-                        file=sys.stderr)
+            up.load_filter()
+        except UpdateError as ue:
+            if not _quiet:
+                print("ERROR: "+str(ue),file=sys.stderr)
+            sys.exit(1)
         except FileNotFoundError as fnf:
             if not _quiet:
                 print("WARNING: Filter file does not exist, creating a template "\
@@ -307,7 +3404,15 @@ if __name__=="__main__":
                             "(inclusiv) bounds of the range.\n"\
                             "#%inc {40,60}\n"\
                             "# ^^Matches all satellites with a inclination between "\
-                            "40° and 60°\n\n\n")
+                            "40° and 60°\n\n"\
+                            "# Altitude filter (needs NumPy):\n"\
+                            "# All satellites whose height above the equatorial "\
+                            "radius is in the range in the first braces at some "\
+                            "time in the window in the second braces (hours from "\
+                            "now, default {0,24}), computed with SGP4 every minute\n"\
+                            "#%alt {400,450} {0,24}\n"\
+                            "# ^^Matches all satellites between 400 and 450 km "\
+                            "within the next day\n\n\n")
                 if _verbose:
                     print("Template filter successfully created",file=sys.stderr)
                 sys.exit(0)
@@ -321,306 +3426,120 @@ if __name__=="__main__":
                 print("ERROR: Failed to read file "+ns.filter+"! ("+str(ioe)+")",
                         file=sys.stderr)
             sys.exit(1)
-    elif ns.filter is None and ns.user_tles is None:
+    if ns.serve is not None:
+        ns.daemon=True
+    if ns.daemon and ns.list:
         if not _quiet:
-            print("ERROR: A filter is required if no user tles are provided!",
-                    file=sys.stderr)
+            print("ERROR: Listing is not possible in daemon mode!",file=sys.stderr)
         sys.exit(1)
-    else:
-        if not _quiet:
-            print("WARNING: If no filter is specified, online loading is disabled!",
-                    file=sys.stderr)
-        ns.no_online=True
 
-    tles=[]
-# load user tles
-    try:
-        if ns.user_tles is not None:
-            with open(ns.user_tles,"rb") as uf:
-                if _verbose:
-                    print("Reading user defined TLEs ...",file=sys.stderr)
-                    oc=len(tles)
-                tles.extend(parse_tle_bytes(uf.read()))
-                if _verbose:
-                    print("Done reading user TLEs ("+str(len(tles)-oc)+" tles found)",
-                            file=sys.stderr)
-        elif _verbose:
-            print("No file given for user tles. Skipping",file=sys.stderr)
-    except IOError as ioe:
-        if not _quiet:
-            print("ERROR: Failed to read file "+ns.user_tles+"! Skipping! ("+str(ioe)+")",
-                    file=sys.stderr)
+# load previous output (incremental mode)
+    if ns.incremental and not ns.no_online:
+        up.load_previous()
 
-# filter user tles (if forced)
-    if ns.force_user_filtering:
-        if _verbose:
-            print("Filtering user supplied TLEs ...",file=sys.stderr)
-        told=tles
-        tles=[]
-        for tle in told:
-            found=False
-            for nf in filterlist["name"]:
-                if tle.name.upper().startswith(nf.upper()):
-                    tles.append(tle)
-                    found=True
-                    break
-            if found:
-                continue
-            for launf in filterlist["launch"]:
-                if ("%(year)02d%(launch)03d%(object)-s" % tle.desig).upper()\
-                        .startswith(launf.upper()):
-                    tles.append(tle)
-                    found=True
-                    break
-            if found:
-                continue
-            for idf in filterlist["id"]:
-                if all(c.isdigit() for c in idf) and tle.id==int(idf):
-                    tles.append(tle)
-                    found=True
-                    break
-            if found:
-                continue
-            for ff in filterlist["field"]:
-                peri, apo = peri_apo_from_mm_ecc(tle.mm, tle.ecc)
-                if ff["field"]=="inc":
-                    if tle.inc<=ff["max"] and tle.inc>=ff["min"]:
-                        tles.append(tle)
-                        found=True
-                        break
-                elif ff["field"]=="peri":
-                    if peri<=ff["max"] and peri>=ff["min"]:
-                        tles.append(tle)
-                        found=True
-                        break
-                elif ff["field"]=="apo":
-                    if apo<=ff["max"] and apo>=ff["min"]:
-                        tles.append(tle)
-                        found=True
-                        break
+# start query service
+    service=None
+    if ns.serve is not None:
+        host,_,port=ns.serve.rpartition(":")
+        try:
+            service=TleService(host or "127.0.0.1",int(port))
+        except (ValueError,IOError) as e:
+            if not _quiet:
+                print("ERROR: Failed to start service on "+ns.serve+"! ("+str(e)+\
+                        ")",file=sys.stderr)
+            up.close()
+            sys.exit(1)
+        service.start()
+        up.keep_replaced=True
         if _verbose:
-            print("Done filtering user supplied TLEs ("+str(len(tles))+\
-                    "/"+str(len(told))+" selected)",file=sys.stderr)
+            print("Serving queries at "+service.url+"/tles",file=sys.stderr)
 
-# load online tles
-    if not ns.no_online:
-        if _verbose:
-            print("Fetching online TLEs ...",file=sys.stderr)
-            print("Reading SATCAT ...",file=sys.stderr)
-        altsatnames=[]
-        with rq.urlopen("http://www.celestrak.com/pub/satcat-annex.txt") as scar:
-            for bl in scar:
-                l=bl.decode("ascii").rstrip("\r\n")
-                le=l.split("|")
-                if len(le)>1 and all(c.isdigit() for c in le[0]):
-                    altsatnames.append({
-                        "id":int(le[0]),
-                        "names":[n.strip() for n in le[1:]]})
-# read in satellite catalog (discard decayed satellites)
-        satcat=[]
-        with rq.urlopen("http://www.celestrak.com/pub/satcat.txt") as scr:
-            for bl in scr:
-                l=bl.decode("ascii").rstrip("\r\n")
-                if l[21]=="D":
-                    continue
-                launch_s=l[0:11]
-                if re.match("\s*[-\+\d]+-[-\+\d]+\a*",launch_s) is not None:
-                    launch={"year":int(launch_s.split("-")[0]),
-                            "launch":int(launch_s.split("-")[1][0:3]),
-                             "object":launch_s.split("-")[1][3:].strip()}
-                nid_s=l[13:18]
-                if re.match("\s*[-\+\d\.eE]+",nid_s) is not None:
-                    nid=int(nid_s)
-                name_s=l[23:47]
-                names=[name_s.strip()]
-                if "&" in name_s:
-                    names=[n.strip() for n in name_s.split("&")]
-                if "nid" in locals() and nid in [an["id"] for an in altsatnames]:
-                    names.extend(altsatnames[[an["id"] for an in altsatnames].\
-                            index(nid)]["names"])
-                inc_s=l[96:101]
-                if re.match("\s*[-\+\d\.eE]+",inc_s) is not None:
-                    inc=float(inc_s)
-                apo_s=l[103:109]
-                if re.match("\s*[-\+\d\.eE]+",apo_s) is not None:
-                    apo=int(apo_s)
-                peri_s=l[111:117]
-                if re.match("\s*[-\+\d\.eE]+",peri_s) is not None:
-                    prei=int(peri_s)
-                orbc_s=l[129:132]
-                satcat.append({
-                    "raw":{"launch":launch_s, "nid":nid_s, "name":name_s,
-                        "inc":inc_s, "apo":apo_s, "peri":peri_s, "orbc":orbc_s},
-                    "launch":launch if "launch" in locals() else None,
-                    "nid":nid if "nid" in locals() else None,
-                    "names":names if len(names)>1 or len(names[0])>0 else None,
-                    "inc":inc if "inc" in locals() else None,
-                    "apo":apo if "apo" in locals() else None,
-                    "peri":peri if "peri" in locals() else None })
-        if _verbose:
-            print("SATCAT loaded; "+str(len(satcat))+" not decayed satellites "\
-                    "found!",file=sys.stderr)
-            print("Compiling list of TLEs to download...",file=sys.stderr)
-# compile list of TLEs to download
-        dlids=[]
-        dlscentry=[]
-    # check name filters
-        idcnt=len(dlids)
-        for nf in filterlist["name"]:
-            found=False
-            for usn in [tle["name"] for tle in tles]:
-                if usn.upper().startswith(nf.strip().upper()):
-                    found=True
-                    break
-            if found==True:
-                continue
-            for scent in satcat:
-                for satn in scent["names"]:
-                    if satn.upper().startswith(nf.strip().upper()):
-                        dlids.append(scent["nid"])
-                        dlscentry.append(scent)
-                        found=True
-                        break
-                if found==True:
-                    break
-            else:
-                if not _quiet:
-                    print("WARNING: No entry found for \"name\" filter \""+\
-                            str(nf)+"\"!",file=sys.stderr)
-        if _verbose:
-            print("Added",len(dlids)-idcnt,"IDs from \"name\" filters",
-                    file=sys.stderr)
-    # check id filters
-        idcnt=len(dlids)
-        for idf in filterlist["id"]:
-            found=False
-            for usid in [tle["id"] for tle in tles]:
-                if usid==idf:
-                    found=True
-                    break
-            if found==True:
-                continue
-            for scent in satcat:
-                if scent["nid"]==idf:
-                    dlids.append(scent["nid"])
-                    dlscentry.append(scent)
-                    found=True
-                    break
-            else:
+    def end_run(prof,t0,tles):
+        if prof is not None:
+            stop_profile(ns.profile,prof,ns.profile_file)
+        if ns.stats is not None:
+            try:
+                write_run_stats(ns.stats,ns.stats_file,
+                        time=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        run_seconds=time.perf_counter()-t0,
+                        tles_output=len(tles) if tles is not None else None)
+            except IOError as ioe:
                 if not _quiet:
-                    print("WARNING: No entry found for \"id\" filter \""+str(idf)+\
-                            "\"!",file=sys.stderr)
-        if _verbose:
-            print("Added",len(dlids)-idcnt,"IDs from \"id\" filters",
-                    file=sys.stderr)
-    # check launch designator filters
-        idcnt=len(dlids)
-        for lf in filterlist["launch"]:
-            found=False
-            for ul in [tle["id"] for tle in tles]:
-                if ul["launch"]["year"]==(lf["year"]%100) and \
-                        (lf["launch"] is None or ul["launch"]["launch"]==\
-                        lf["launch"]) and (lf["object"] is None or \
-                        ul["launch"]["object"]==lf["object"]):
-                    found=True
-                    break
-            if found==True:
-                continue
-            for scent in satcat:
-                if scent["launch"] is not None and \
-                        (scent["launch"]["year"]%100)==(lf["year"]%100) and \
-                        (lf["launch"] is None or scent["launch"]["launch"]==\
-                        lf["launch"]) and (lf["object"] is None or scent["launch"]\
-                        ["object"]==lf["object"]):
-                    dlids.append(scent["nid"])
-                    dlscentry.append(scent)
-                    found=True
-                    break
-            else:
+                    print("ERROR: Failed to write stats to "+ns.stats_file+\
+                            "! ("+str(ioe)+")",file=sys.stderr)
+
+    prof=None
+    if ns.profile is not None:
+        prof=start_profile(ns.profile)
+# runs until interrupted in daemon mode (Ctrl-C also ends a run in progress)
+    try:
+        while True:
+            stats.reset()
+            t0=time.perf_counter()
+            try:
+                tles=up.run()
+            except UpdateError as ue:
                 if not _quiet:
-                    print("WARNING: No entry found for \"launch designator\" "\
-                            "filter \""+str(lf)+"\"!",file=sys.stderr)
-        if _verbose:
-            print("Added",len(dlids)-idcnt,"IDs from \"launch designator\" "\
-                    "filters",file=sys.stderr)
-    # check field filters
-        idcnt=len(dlids)
-        for ff in filterlist["field"]:
-            for scent in satcat:
-                if scent[ff["field"]]<=ff["max"] and scent[ff["field"]]>=ff["min"]:
-                    dlids.append(scent["nid"])
-                    dlscentry.append(scent)
-        if _verbose:
-            print("Added",len(dlids)-idcnt,"IDs from \"orbit parameter\" filters",
-                    file=sys.stderr)
-    # how many objects to download
-        if len(dlids)==0 and not _quiet:
-            print("WARNING: No IDs to download!",file=sys.stderr)
-        elif _verbose:
-            print(len(dlids)," TLEs to download...",file=sys.stderr)
-        
-# downloading TLEs
-        otlecnt=len(tles)
+                    print("ERROR: "+str(ue),file=sys.stderr)
+                if not ns.daemon:
+                    sys.exit(1)
+                tles=None
 
-        from html.parser import HTMLParser
+            if _verbose and tles is not None:
+                print("A total of "+str(len(tles))+" TLEs have been loaded",
+                        file=sys.stderr)
 
-        class TLE_HTML(HTMLParser):
-            def __init__(self,*args,**kwargs):
-                self.read_tle_data=False
-                self.tle_data=""
-                HTMLParser.__init__(self,*args,**kwargs)
-            def handle_starttag(self, tag, attr):
-                if tag=="pre":
-                    self.read_tle_data=True
-            def handle_endtag(self, tag):
-                if tag=="pre":
-                    self.read_tle_data=False
-            def handle_data(self, data):
-                if "read_tle_data" in dir(self) and self.read_tle_data:
-                    self.tle_data+=data
-
-
-        for dlid, dlentry in zip(dlids,dlscentry):
-            ts=None
-            with rq.urlopen("http://www.celestrak.com/cgi-bin/TLE.pl?CATNR="+\
-                    str(dlid)) as tlr:
-                tp=TLE_HTML()
-                tp.feed(tlr.read().decode())
-                ts=parse_tle_bytes(tp.tle_data.lstrip().encode("ascii"))
-            if ts is not None and len(ts)>0:
-                tles.extend(ts)
-            elif not _quiet:
-                print("WARNING: No TLE found for \""+str(dlentry["names"][0])+"\":"+\
-                        str(dlid)+" (Note: Orbit comment: \""+str(dlentry["raw"]\
-                        ["orbc"])+"\")!",file=sys.stderr)
-        if _verbose:
-            print("Downloaded",len(tles)-otlecnt,file=sys.stderr)
+# list tles
+            if ns.list:
+                up.close()
+                if _verbose:
+                    print("Listing TLE objects ...",file=sys.stderr)
+                for tle in tles:
+                    print("\""+tle.name+"\": "+str(tle.id))
+                if _verbose:
+                    print("Done listing TLE objects ...",file=sys.stderr)
+                end_run(prof,t0,tles)
+                sys.exit(0)
 
-    if _verbose:
-        print("A total of "+str(len(tles))+" TLEs have been loaded",file=sys.stderr)
+# save tles to file (replacing it at once, readers never see a partial file)
+            if tles is not None:
+                t=time.perf_counter()
+                written=False
+                try:
+                    written=up.write_output(tles)
+                except IOError as ioe:
+                    if not _quiet:
+                        print("ERROR: Failed to write file "+ns.output+"! ("+\
+                                str(ioe)+")",file=sys.stderr)
+                    if not ns.daemon:
+                        sys.exit(1)
+                up.timings["write"]=time.perf_counter()-t
+                stats.add_time("write",up.timings["write"])
+            end_run(prof,t0,tles)
+            prof=None
 
-# list tles
-    if ns.list:
-        if _verbose:
-            print("Listing TLE objects ...",file=sys.stderr)
-        for tle in tles:
-            print("\""+tle.name+"\": "+str(tle.id))
-        if _verbose:
-            print("Done listing TLE objects ...",file=sys.stderr)
-        sys.exit(0)
+            if service is not None and tles is not None:
+                service.publish(tles,up.satcat)
+                # the replaced catalogues are not queried anymore
+                up.close_replaced()
+            if not ns.daemon:
+                break
+            if not _quiet and tles is not None:
+                print(time.strftime("%Y-%m-%d %H:%M:%S")+(" Updated " \
+                        if written else " Unchanged ")+ns.output+\
+                        " with "+str(len(tles))+" TLEs in %.3f s (" % \
+                        sum(up.timings.values())+", ".join("%s %.3f s" % pt
+                        for pt in up.timings.items())+")",file=sys.stderr)
+# wait for a change or the next refresh
+            while not up.due():
+                time.sleep(ns.poll_interval)
+    except KeyboardInterrupt:
+        if not ns.daemon:
+            raise
+    finally:
+        if service is not None:
+            service.close()
+        up.close()
 
-# save tles to file
-    try:
-        with open(ns.output,"wb") as of:
-            if _verbose:
-                print("Writing "+str(len(tles))+" TLEs to "+ns.output+" ...",
-                        file=sys.stderr)
-            for tle in tles:
-                of.write(bytes(tle))
-        if _verbose:
-            print("Done writing!",file=sys.stderr)
-    except IOError as ioe:
-        if not _quiet:
-            print("ERROR: Failed to write file "+ns.output+"! ("+str(ioe)+")",
-                    file=sys.stderr)
-        sys.exit(1)
+if __name__=="__main__":
+    main()